@@ -18,14 +18,16 @@ import logging
 import random
 import sys
 import time
-from collections.abc import Awaitable, Iterable, Mapping
+from collections import deque
+from collections.abc import Awaitable, Iterable, Mapping, Sequence
+from functools import partial
 from typing import Any, Final, Literal
 
 import orjson as json
 from emoji import EMOJI_DATA, demojize, emoji_list, emojize, purely_emoji
 from redis.asyncio import Redis
 from tornado.web import Application, HTTPError
-from tornado.websocket import WebSocketHandler
+from tornado.websocket import WebSocketClosedError, WebSocketHandler
 
 from .. import EPOCH_MS, EVENT_REDIS, EVENT_SHUTDOWN, NAME, ORJSON_OPTIONS
 from ..utils.base_request_handler import BaseRequestHandler
@@ -45,6 +47,11 @@ MAX_MESSAGE_SAVE_COUNT: Final = 200
 MAX_MESSAGE_LENGTH: Final = 20
 REDIS_CHANNEL: Final = f"{NAME}:emoji_chat_channel"
 
+# frames that may wait for a connection before it gets closed for being slow
+SEND_QUEUE_SIZE: Final = 64
+# seconds to wait for more users to join or leave before sending the users
+PRESENCE_UPDATE_DELAY: Final = 0.5
+
 
 def get_ms_timestamp() -> int:
     """Get the current time in ms."""
@@ -55,7 +62,8 @@ async def subscribe_to_redis_channel(
     app: Application, worker: int | None
 ) -> None:
     """Subscribe to the Redis channel and handle incoming messages."""
-    get_pubsub = PubSubProvider((REDIS_CHANNEL,), app.settings, worker)
+    settings = app.settings
+    get_pubsub = PubSubProvider((REDIS_CHANNEL,), settings, worker)
     del app
 
     while not EVENT_SHUTDOWN.is_set():  # pylint: disable=while-used
@@ -79,9 +87,10 @@ async def subscribe_to_redis_channel(
             } if (
                 channel == REDIS_CHANNEL
             ):
-                await asyncio.gather(
-                    *[conn.write_message(data) for conn in OPEN_CONNECTIONS]
-                )
+                CHAT_HUB.broadcast(data.encode("UTF-8"))
+                match json.loads(data):
+                    case {"type": "message", "message": dict() as msg}:
+                        MESSAGE_HISTORY.add(msg)
             case {
                 "type": "subscribe",
                 "data": 1,
@@ -94,6 +103,18 @@ async def subscribe_to_redis_channel(
                     channel,
                     worker,
                 )
+                # (re)load the history, messages may have been missed
+                try:
+                    MESSAGE_HISTORY.seed(
+                        await get_messages(
+                            settings["REDIS"],
+                            settings.get("REDIS_PREFIX", NAME),
+                        )
+                    )
+                except Exception:  # pylint: disable=broad-exception-caught
+                    LOGGER.exception(
+                        "Failed to load messages on worker %s", worker
+                    )
             case _:
                 logging.error(
                     "Got unexpected message %s on worker %s",
@@ -108,31 +129,86 @@ async def save_new_message(
     message: str,
     redis: Redis[str],
     redis_prefix: str,
-) -> None:
-    """Save a new message."""
+    *,
+    batch_delay: float = 0,
+) -> dict[str, Any]:
+    """Save a new message and return it.
+
+    If batch_delay is positive, the messages saved within that many seconds
+    get written together.
+    """
     message_dict = {
         "author": [data["emoji"] for data in emoji_list(author)],
         "content": [data["emoji"] for data in emoji_list(message)],
         "timestamp": get_ms_timestamp(),
     }
-    await redis.rpush(
-        f"{redis_prefix}:emoji-chat:message-list",
-        json.dumps(message_dict, option=ORJSON_OPTIONS),
-    )
-    await redis.ltrim(
-        f"{redis_prefix}:emoji-chat:message-list", -MAX_MESSAGE_SAVE_COUNT, -1
-    )
     LOGGER.info("GOT new message %s", message_dict)
-    await redis.publish(
-        REDIS_CHANNEL,
-        json.dumps(
-            {
-                "type": "message",
-                "message": message_dict,
-            },
-            option=ORJSON_OPTIONS,
-        ),
-    )
+    serialized = json.dumps(message_dict, option=ORJSON_OPTIONS)
+    if batch_delay > 0:
+        await MESSAGE_BATCHER.write(
+            redis, redis_prefix, serialized, batch_delay
+        )
+    else:
+        await write_messages(redis, redis_prefix, (serialized,))
+    MESSAGE_HISTORY.add(message_dict)
+    return message_dict
+
+
+async def write_messages(
+    redis: Redis[str], redis_prefix: str, messages: Sequence[bytes]
+) -> None:
+    """Save and publish serialized messages in one transaction."""
+    key = f"{redis_prefix}:emoji-chat:message-list"
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, *messages)
+        pipe.ltrim(key, -MAX_MESSAGE_SAVE_COUNT, -1)
+        for message in messages:
+            pipe.publish(
+                REDIS_CHANNEL, b'{"type":"message","message":%b}' % message
+            )
+        await pipe.execute()
+
+
+class MessageBatcher:
+    """Collect messages for a while and write them together."""
+
+    __slots__ = ("_batches",)
+
+    _batches: dict[
+        tuple[Redis[str], str], tuple[list[bytes], asyncio.Task[None]]
+    ]
+
+    def __init__(self) -> None:
+        """Initialize the batcher without batches."""
+        self._batches = {}
+
+    async def _write_later(
+        self, key: tuple[Redis[str], str], delay: float
+    ) -> None:
+        """Write the batch after the delay."""
+        await asyncio.sleep(delay)
+        messages, _ = self._batches.pop(key)
+        await write_messages(*key, messages)
+
+    async def write(
+        self,
+        redis: Redis[str],
+        redis_prefix: str,
+        message: bytes,
+        delay: float,
+    ) -> None:
+        """Add a message to the batch and wait until it is written."""
+        key = redis, redis_prefix
+        if key not in self._batches:
+            self._batches[key] = [], asyncio.create_task(
+                self._write_later(key, delay)
+            )
+        messages, task = self._batches[key]
+        messages.append(message)
+        await asyncio.shield(task)
+
+
+MESSAGE_BATCHER: Final = MessageBatcher()
 
 
 async def get_messages(
@@ -149,6 +225,72 @@ async def get_messages(
     return [json.loads(message) for message in messages]
 
 
+class MessageHistory:
+    """The last MAX_MESSAGE_SAVE_COUNT messages of the chat.
+
+    It is seeded from Redis once and then kept up to date with the messages
+    from the Redis channel, so loading the history needs no Redis requests.
+    """
+
+    __slots__ = ("_frame", "messages", "seeded")
+
+    messages: deque[dict[str, Any]]
+    _frame: None | bytes
+
+    def __init__(self) -> None:
+        """Initialize an empty history."""
+        self.messages = deque(maxlen=MAX_MESSAGE_SAVE_COUNT)
+        self.seeded = False
+        self._frame = None
+
+    def add(self, message: dict[str, Any]) -> None:
+        """Add a message, if it isn't in the history yet."""
+        if message in self.messages:
+            return
+        if self.messages and (
+            message["timestamp"] < self.messages[-1]["timestamp"]
+        ):
+            # a message from another worker arrived late
+            self._replace([*self.messages, message])
+            return
+        self.messages.append(message)
+        self._frame = None
+
+    def _replace(self, messages: Iterable[dict[str, Any]]) -> None:
+        """Replace the messages with the newest of the messages."""
+        self.messages = deque(
+            sorted(messages, key=lambda message: message["timestamp"]),
+            maxlen=MAX_MESSAGE_SAVE_COUNT,
+        )
+        self._frame = None
+
+    def seed(self, messages: Iterable[dict[str, Any]]) -> None:
+        """Replace the history with the messages."""
+        self._replace(messages)
+        self.seeded = True
+
+    def get_messages_frame(self) -> bytes:
+        """Get the UTF-8 encoded JSON frame with the messages."""
+        if self._frame is None:
+            self._frame = json.dumps(
+                {"type": "messages", "messages": list(self.messages)},
+                option=ORJSON_OPTIONS,
+            )
+        return self._frame
+
+
+MESSAGE_HISTORY: Final = MessageHistory()
+
+
+async def get_history(
+    redis: Redis[str], redis_prefix: str
+) -> Iterable[dict[str, Any]]:
+    """Get the messages from the history, or from Redis if it isn't seeded."""
+    if MESSAGE_HISTORY.seeded:
+        return tuple(MESSAGE_HISTORY.messages)
+    return await get_messages(redis, redis_prefix)
+
+
 def check_message_invalid(message: str) -> Literal[False] | str:
     """Check if a message is an invalid message."""
     if not message:
@@ -208,9 +350,7 @@ class ChatHandler(BaseRequestHandler):
         if head:
             return
 
-        await self.render_chat(
-            await get_messages(self.redis, self.redis_prefix)
-        )
+        await self.render_chat(await get_history(self.redis, self.redis_prefix))
 
     async def get_name(self) -> str:
         """Get the name of the user."""
@@ -265,11 +405,10 @@ class ChatHandler(BaseRequestHandler):
             message,
             redis=self.redis,
             redis_prefix=self.redis_prefix,
+            batch_delay=self.settings.get("EMOJI_CHAT_WRITE_BATCH_DELAY", 0),
         )
 
-        await self.render_chat(
-            await get_messages(self.redis, self.redis_prefix)
-        )
+        await self.render_chat(await get_history(self.redis, self.redis_prefix))
 
     async def render_chat(self, messages: Iterable[Mapping[str, Any]]) -> None:
         """Render the chat."""
@@ -301,7 +440,123 @@ class APIChatHandler(ChatHandler, APIRequestHandler):
         )
 
 
-OPEN_CONNECTIONS: list[ChatWebSocketHandler] = []
+class ChatHub:
+    """Send frames to all open chat WebSocket connections.
+
+    Every connection has at most one write in progress, the frames sent in the
+    meantime are queued. Connections that fall more than SEND_QUEUE_SIZE frames
+    behind get closed, so slow clients don't hold up anyone else. The frames
+    are serialized once and shared by all connections.
+    """
+
+    __slots__ = ("_presence_handle", "_sending", "_stale_presence", "queues")
+
+    queues: dict[ChatWebSocketHandler, deque[bytes]]
+    _sending: set[ChatWebSocketHandler]
+    _stale_presence: set[ChatWebSocketHandler]
+    _presence_handle: None | asyncio.TimerHandle
+
+    def __init__(self) -> None:
+        """Initialize the hub without connections."""
+        self.queues = {}
+        self._sending = set()
+        self._stale_presence = set()
+        self._presence_handle = None
+
+    def __len__(self) -> int:
+        """Return the number of open connections."""
+        return len(self.queues)
+
+    def add(self, conn: ChatWebSocketHandler) -> None:
+        """Add a connection to the hub."""
+        self.queues[conn] = deque()
+        self.schedule_presence_update()
+
+    def remove(self, conn: ChatWebSocketHandler) -> None:
+        """Remove a connection from the hub, if it is in it."""
+        if self.queues.pop(conn, None) is None:
+            return
+        self._sending.discard(conn)
+        self._stale_presence.discard(conn)
+        self.schedule_presence_update()
+
+    def broadcast(self, frame: bytes) -> None:
+        """Send a UTF-8 encoded JSON frame to all connections."""
+        for conn in tuple(self.queues):
+            self.send(conn, frame)
+
+    def send(self, conn: ChatWebSocketHandler, frame: bytes) -> None:
+        """Send a frame to a connection or queue it."""
+        if (queue := self.queues.get(conn)) is None:
+            return
+        if conn not in self._sending:
+            self._write(conn, frame)
+        elif len(queue) < SEND_QUEUE_SIZE:
+            queue.append(frame)
+        else:
+            LOGGER.info("Closing WebSocket of slow client")
+            self.remove(conn)
+            conn.close(1013, "Too slow")
+
+    def _write(self, conn: ChatWebSocketHandler, frame: bytes) -> None:
+        """Write a frame and continue with the queue when it is written."""
+        try:
+            future = conn.write_message(frame)
+        except WebSocketClosedError:
+            self.remove(conn)
+            return
+        self._sending.add(conn)
+        future.add_done_callback(partial(self._on_written, conn))
+
+    def _on_written(
+        self, conn: ChatWebSocketHandler, future: asyncio.Future[None]
+    ) -> None:
+        """Write the next frame of the connection, if there is one."""
+        self._sending.discard(conn)
+        if future.cancelled() or future.exception():
+            self.remove(conn)
+        elif queue := self.queues.get(conn):
+            self._write(conn, queue.popleft())
+        elif conn in self._stale_presence:
+            self._stale_presence.discard(conn)
+            self._write(conn, self.get_users_frame())
+
+    def get_users_frame(self) -> bytes:
+        """Get the frame with all current users."""
+        return json.dumps(
+            {
+                "type": "users",
+                "users": [
+                    {"name": conn.name, "joined_at": conn.connection_time}
+                    for conn in self.queues
+                ],
+            },
+            option=ORJSON_OPTIONS,
+        )
+
+    def schedule_presence_update(self) -> None:
+        """Send the users to all connections after PRESENCE_UPDATE_DELAY."""
+        if sys.flags.dev_mode and self._presence_handle is None:
+            self._presence_handle = asyncio.get_running_loop().call_later(
+                PRESENCE_UPDATE_DELAY, self.send_presence_update
+            )
+
+    def send_presence_update(self) -> None:
+        """Send the users to all connections.
+
+        Busy connections get the users after their queue is empty, so at most
+        one users frame per connection is outstanding.
+        """
+        self._presence_handle = None
+        frame = self.get_users_frame()
+        for conn in tuple(self.queues):
+            if conn in self._sending:
+                self._stale_presence.add(conn)
+            else:
+                self._write(conn, frame)
+
+
+CHAT_HUB: Final = ChatHub()
 
 
 class ChatWebSocketHandler(WebSocketHandler, ChatHandler):
@@ -312,9 +567,7 @@ class ChatWebSocketHandler(WebSocketHandler, ChatHandler):
 
     def on_close(self) -> None:  # noqa: D102
         LOGGER.info("WebSocket closed")
-        OPEN_CONNECTIONS.remove(self)
-        for conn in OPEN_CONNECTIONS:
-            conn.send_users()
+        CHAT_HUB.remove(self)
 
     def on_message(self, message: str | bytes) -> Awaitable[None] | None:
         """Respond to an incoming message."""
@@ -349,9 +602,7 @@ class ChatWebSocketHandler(WebSocketHandler, ChatHandler):
         )
 
         self.connection_time = get_ms_timestamp()
-        OPEN_CONNECTIONS.append(self)
-        for conn in OPEN_CONNECTIONS:
-            conn.send_users()
+        CHAT_HUB.add(self)
 
         await self.send_messages()
 
@@ -363,8 +614,7 @@ class ChatWebSocketHandler(WebSocketHandler, ChatHandler):
 
         self.name = await self.get_name()
 
-        if not await self.ratelimit(True):
-            await self.ratelimit()
+        await self.ratelimit(True, True)
 
     async def render_chat(self, messages: Iterable[Mapping[str, Any]]) -> None:
         """Render the chat."""
@@ -398,31 +648,24 @@ class ChatWebSocketHandler(WebSocketHandler, ChatHandler):
                     {"type": "ratelimit", "retry_after": headers["Retry-After"]}
                 )
 
-        return await save_new_message(
-            self.name, msg_text, self.redis, self.redis_prefix
+        await save_new_message(
+            self.name,
+            msg_text,
+            self.redis,
+            self.redis_prefix,
+            batch_delay=self.settings.get("EMOJI_CHAT_WRITE_BATCH_DELAY", 0),
         )
+        return None
 
     async def send_messages(self) -> None:
         """Send this WebSocket all current messages."""
+        if MESSAGE_HISTORY.seeded:
+            return await self.write_message(
+                MESSAGE_HISTORY.get_messages_frame()
+            )
         return await self.write_message(
             {
                 "type": "messages",
                 "messages": await get_messages(self.redis, self.redis_prefix),
             },
         )
-
-    def send_users(self) -> None:
-        """Send this WebSocket all current users."""
-        if sys.flags.dev_mode:
-            self.write_message(  # type: ignore[unused-awaitable]
-                {
-                    "type": "users",
-                    "users": [
-                        {
-                            "name": conn.name,
-                            "joined_at": conn.connection_time,
-                        }
-                        for conn in OPEN_CONNECTIONS
-                    ],
-                }
-            )
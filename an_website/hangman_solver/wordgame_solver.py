@@ -13,13 +13,40 @@
 
 """The module for the wordgame solver."""
 
-from collections.abc import Collection
+import asyncio
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from functools import cache
+from importlib.metadata import version
+from itertools import accumulate, chain
+from pathlib import Path
+from typing import Final
 
 from hangman_solver import Language, read_words_with_length
 from typed_stream import Stream
 
+from .. import CACHE_DIR
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
-from ..utils.utils import ModuleInfo, bounded_edit_distance
+from ..utils.utils import ModuleInfo
+
+if sys.platform != "win32":
+    import fcntl
+
+LOGGER: Final = logging.getLogger(__name__)
+
+MAX_WORD_LENGTH: Final = 100
+
+GRAPH_MAGIC: Final = b"WGGRAPH1"
+GRAPH_HEADER: Final = struct.Struct("=8sIIII")
+GRAPH_PATH: Final = (
+    CACHE_DIR / f"wordgame-graph-{version('hangman-solver-rs')}.bin"
+)
 
 
 def get_module_info() -> ModuleInfo:
@@ -40,22 +67,214 @@ def get_module_info() -> ModuleInfo:
     )
 
 
+def get_edits(word: str, alphabet: str) -> set[str]:
+    """Get all strings that are one edit away from the word."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    return {
+        *(start + end[1:] for start, end in splits if end),
+        *(
+            start + char + end[1:]
+            for start, end in splits
+            if end
+            for char in alphabet
+            if char != end[0]
+        ),
+        *(start + char + end for start, end in splits for char in alphabet),
+    }
+
+
+def build_neighbour_graph(words: Iterable[str]) -> bytes:
+    """Build the graph of words that differ by only one letter.
+
+    Words with a substitution share a wildcard bucket (the word with the
+    letter replaced by a NUL character), words with an insertion or a deletion
+    are found by looking up every deletion of a word.
+    """
+    sorted_words = sorted(set(words))
+    indices = {word: index for index, word in enumerate(sorted_words)}
+    neighbours: list[set[int]] = [set() for _ in sorted_words]
+    buckets: dict[str, list[int]] = {}
+
+    for index, word in enumerate(sorted_words):
+        for pos in range(len(word)):
+            buckets.setdefault(f"{word[:pos]}\0{word[pos + 1:]}", []).append(
+                index
+            )
+            shorter = indices.get(word[:pos] + word[pos + 1 :])
+            if shorter is not None:
+                neighbours[index].add(shorter)
+                neighbours[shorter].add(index)
+
+    for bucket in buckets.values():
+        if len(bucket) > 1:
+            for index in bucket:
+                neighbours[index].update(bucket)
+                neighbours[index].discard(index)
+
+    encoded = [word.encode("UTF-8") for word in sorted_words]
+    alphabet = "".join(sorted({char for word in sorted_words for char in word}))
+    sorted_neighbours = [sorted(ids) for ids in neighbours]
+    word_offsets = array("I", accumulate(map(len, encoded), initial=0))
+    neighbour_offsets = array(
+        "I", accumulate(map(len, sorted_neighbours), initial=0)
+    )
+    return b"".join(
+        (
+            GRAPH_HEADER.pack(
+                GRAPH_MAGIC,
+                len(sorted_words),
+                neighbour_offsets[-1],
+                word_offsets[-1],
+                len(alphabet.encode("UTF-8")),
+            ),
+            word_offsets.tobytes(),
+            neighbour_offsets.tobytes(),
+            array("I", chain.from_iterable(sorted_neighbours)).tobytes(),
+            *encoded,
+            alphabet.encode("UTF-8"),
+        )
+    )
+
+
+class NeighbourGraph:
+    """A graph of words that differ by only one letter.
+
+    The words are sorted by their UTF-8 encoding, so they can be found with a
+    binary search without decoding them. Nothing gets copied out of the buffer,
+    so all workers mapping the same file share the same memory.
+    """
+
+    __slots__ = (
+        "_buffer",
+        "_words_start",
+        "alphabet",
+        "neighbour_offsets",
+        "neighbours",
+        "word_offsets",
+    )
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        """Initialize the graph from the output of build_neighbour_graph."""
+        magic, word_count, edge_count, words_size, alphabet_size = (
+            GRAPH_HEADER.unpack_from(buffer)
+        )
+        if magic != GRAPH_MAGIC:
+            raise ValueError("Invalid neighbour graph")
+        start = GRAPH_HEADER.size
+        sizes = (4 * (word_count + 1), 4 * (word_count + 1), 4 * edge_count)
+        if len(buffer) != start + sum(sizes) + words_size + alphabet_size:
+            raise ValueError("Truncated neighbour graph")
+
+        views: list[memoryview] = []
+        for size in sizes:
+            views.append(memoryview(buffer)[start : start + size].cast("I"))
+            start += size
+        self.word_offsets, self.neighbour_offsets, self.neighbours = views
+        self._buffer = buffer
+        self._words_start = start
+        self.alphabet = buffer[start + words_size :].decode("UTF-8")
+
+    def __len__(self) -> int:
+        """Return the number of words in the graph."""
+        return len(self.word_offsets) - 1
+
+    def _get_word_bytes(self, index: int) -> bytes:
+        """Get the UTF-8 encoded word with the index."""
+        start = self._words_start
+        return self._buffer[
+            start
+            + self.word_offsets[index] : start
+            + self.word_offsets[index + 1]
+        ]
+
+    def get_word(self, index: int) -> str:
+        """Get the word with the index."""
+        return self._get_word_bytes(index).decode("UTF-8")
+
+    def index(self, word: str) -> None | int:
+        """Get the index of the word or None if it isn't in the graph."""
+        encoded = word.encode("UTF-8")
+        index = bisect.bisect_left(
+            range(len(self)), encoded, key=self._get_word_bytes
+        )
+        if index < len(self) and self._get_word_bytes(index) == encoded:
+            return index
+        return None
+
+    def get_neighbours(self, index: int) -> Sequence[int]:
+        """Get the indices of the neighbours of the word with the index."""
+        return self.neighbours[
+            self.neighbour_offsets[index] : self.neighbour_offsets[index + 1]
+        ]
+
+    def find_neighbours(self, word: str) -> Iterator[int]:
+        """Find the indices of the words one edit away from the word."""
+        if (index := self.index(word)) is not None:
+            return iter(self.get_neighbours(index))
+        return iter(
+            sorted(
+                index
+                for edit in get_edits(word, self.alphabet)
+                if (index := self.index(edit)) is not None
+            )
+        )
+
+
+def load_neighbour_graph(path: Path) -> None | NeighbourGraph:
+    """Load the neighbour graph from a file, if it exists and is valid."""
+    try:
+        with path.open("rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return NeighbourGraph(buffer)
+    except OSError, ValueError, struct.error:
+        return None
+
+
+@cache
+def get_neighbour_graph() -> NeighbourGraph:
+    """Get the neighbour graph for Language.DeBasicUmlauts.
+
+    The graph is built by the first worker that needs it and memory-mapped by
+    all others.
+    """
+    if graph := load_neighbour_graph(GRAPH_PATH):
+        return graph
+
+    GRAPH_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with GRAPH_PATH.with_suffix(".lock").open("wb") as lock_file:
+        if sys.platform != "win32":
+            # wait for the worker that is already building the graph
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if graph := load_neighbour_graph(GRAPH_PATH):
+            return graph
+
+        LOGGER.info("Building the neighbour graph for the wordgame solver")
+        data = build_neighbour_graph(
+            chain.from_iterable(
+                read_words_with_length(Language.DeBasicUmlauts, length)
+                for length in range(1, MAX_WORD_LENGTH + 1)
+            )
+        )
+        try:
+            temp_path = GRAPH_PATH.with_suffix(f".{os.getpid()}.tmp")
+            temp_path.write_bytes(data)
+            os.replace(temp_path, GRAPH_PATH)
+        except OSError:
+            LOGGER.exception("Saving the neighbour graph failed")
+            return NeighbourGraph(data)
+
+    return load_neighbour_graph(GRAPH_PATH) or NeighbourGraph(data)
+
+
 def find_solutions(word: str, ignore: Collection[str]) -> Stream[str]:
     """Find words that have only one different letter."""
-    word_len = len(word)
+    graph = get_neighbour_graph()
     ignore = {*ignore, word}
 
     return (
-        Stream((word_len - 1, word_len, word_len + 1))
-        .flat_map(
-            lambda length: read_words_with_length(
-                Language.DeBasicUmlauts, length
-            )
-        )
+        Stream(graph.find_neighbours(word))
+        .map(graph.get_word)
         .exclude(ignore.__contains__)
-        .filter(
-            lambda test_word: bounded_edit_distance(word, test_word, 2) == 1
-        )
     )
 
 
@@ -65,11 +284,23 @@ def get_ranked_solutions(
     """Find solutions for the word and rank them."""
     if not word:
         return []
-    before_with_word = {*before, word}
+    graph = get_neighbour_graph()
+    ignored = {
+        index
+        for ignored_word in {*before, word}
+        if (index := graph.index(ignored_word)) is not None
+    }
     return sorted(
         (
-            (find_solutions(sol, before_with_word).count(), sol)
-            for sol in find_solutions(word, before)
+            (
+                sum(
+                    neighbour not in ignored
+                    for neighbour in graph.get_neighbours(solution)
+                ),
+                graph.get_word(solution),
+            )
+            for solution in graph.find_neighbours(word)
+            if solution not in ignored
         ),
         reverse=True,
     )
@@ -92,7 +323,7 @@ class WordgameSolver(HTMLRequestHandler):
         await self.render(
             "pages/wordgame_solver.html",
             word=word,
-            words=get_ranked_solutions(word, before),
+            words=await asyncio.to_thread(get_ranked_solutions, word, before),
             before=", ".join(before),
             new_before=", ".join(new_before),
         )
@@ -114,5 +345,7 @@ class WordgameSolverAPI(APIRequestHandler):
         return await self.finish_dict(
             before=before,
             word=word,
-            solutions=get_ranked_solutions(word, before),
+            solutions=await asyncio.to_thread(
+                get_ranked_solutions, word, before
+            ),
         )
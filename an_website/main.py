@@ -42,7 +42,6 @@ from multiprocessing.process import _children  # type: ignore[attr-defined]
 from pathlib import Path
 from socket import socket
 from typing import Any, Final, TypedDict, TypeGuard, cast
-from warnings import catch_warnings, simplefilter
 from zoneinfo import ZoneInfo
 
 import regex
@@ -75,6 +74,7 @@ from . import (
 )
 from .contact.contact import apply_contact_stuff_to_app
 from .utils import background_tasks, static_file_handling
+from .utils.app_search import AppSearchClient
 from .utils.base_request_handler import BaseRequestHandler, request_ctx_var
 from .utils.better_config_parser import BetterConfigParser
 from .utils.elasticsearch_setup import setup_elasticsearch
@@ -309,6 +309,7 @@ def get_all_handlers(module_infos: Iterable[ModuleInfo]) -> list[Handler]:
             {
                 "root": Path(".well-known"),
                 "headers": (("Access-Control-Allow-Origin", "*"),),
+                "cache": False,  # the files can change at any time
             },
         )
     )
@@ -428,6 +429,26 @@ def apply_config_to_app(app: Application, config: BetterConfigParser) -> None:
     else:
         app.settings["ONION_PROTOCOL"] = onion_address.split("://")[0]
 
+    app.settings["QUOTE_IMAGE_CACHE_SIZE"] = config.getint(
+        "QUOTES", "IMAGE_CACHE_SIZE", fallback=32 * 1024**2
+    )
+
+    app.settings["QUOTE_IMAGE_CACHE_DISK_SIZE"] = config.getint(
+        "QUOTES", "IMAGE_CACHE_DISK_SIZE", fallback=0
+    )
+
+    app.settings["QUOTE_IMAGE_RENDER_PROCESSES"] = config.getint(
+        "QUOTES", "IMAGE_RENDER_PROCESSES", fallback=0
+    )
+
+    app.settings["QUOTE_IMAGE_RENDER_QUEUE_SIZE"] = config.getint(
+        "QUOTES", "IMAGE_RENDER_QUEUE_SIZE", fallback=16
+    )
+
+    app.settings["EMOJI_CHAT_WRITE_BATCH_DELAY"] = config.getfloat(
+        "EMOJI_CHAT", "WRITE_BATCH_DELAY", fallback=0
+    )
+
     app.settings["RATELIMITS"] = config.getboolean(
         "GENERAL",
         "RATELIMITS",
@@ -683,6 +704,11 @@ def setup_apm(app: Application) -> None:  # pragma: no cover
             "elasticapm.processors.sanitize_http_wsgi_env",
             "elasticapm.processors.sanitize_http_request_body",
         ],
+        "METRICS_SETS": [
+            "elasticapm.metrics.sets.cpu.CPUMetricSet",
+            "an_website.quotes.image.RenderQueueMetricSet",
+            "an_website.reporting.reporting.ReportBufferMetricSet",
+        ],
         "RUM_SERVER_URL": config.get(
             "ELASTIC_APM", "RUM_SERVER_URL", fallback=None
         ),
@@ -729,25 +755,21 @@ def setup_apm(app: Application) -> None:  # pragma: no cover
 
 def setup_app_search(app: Application) -> None:  # pragma: no cover
     """Setup Elastic App Search."""  # noqa: D401
-    with catch_warnings():
-        simplefilter("ignore", DeprecationWarning)
-        # pylint: disable-next=import-outside-toplevel
-        from elastic_enterprise_search import (  # type: ignore[import-untyped]
-            AppSearch,
-        )
-
     config: BetterConfigParser = app.settings["CONFIG"]
     host = config.get("APP_SEARCH", "HOST", fallback=None)
     key = config.get("APP_SEARCH", "SEARCH_KEY", fallback=None)
-    verify_certs = config.getboolean(
-        "APP_SEARCH", "VERIFY_CERTS", fallback=True
-    )
     app.settings["APP_SEARCH"] = (
-        AppSearch(
+        AppSearchClient(
             host,
             bearer_auth=key,
-            verify_certs=verify_certs,
-            ca_certs=CA_BUNDLE_PATH,
+            verify_certs=config.getboolean(
+                "APP_SEARCH", "VERIFY_CERTS", fallback=True
+            ),
+            max_concurrency=config.getint(
+                "APP_SEARCH", "MAX_CONCURRENCY", fallback=8
+            ),
+            timeout=config.getfloat("APP_SEARCH", "TIMEOUT", fallback=5),
+            cache_ttl=config.getfloat("APP_SEARCH", "CACHE_TTL", fallback=60),
         )
         if host
         else None
@@ -1043,16 +1065,6 @@ def main(  # noqa: C901  # pragma: no cover
         # yeet all children (there should be none, but do it regardless, just in case)
         _children.clear()
 
-        if "an_website.quotes" in sys.modules:
-            from .quotes.utils import (  # pylint: disable=import-outside-toplevel
-                AUTHORS_CACHE,
-                QUOTES_CACHE,
-                WRONG_QUOTES_CACHE,
-            )
-
-            del AUTHORS_CACHE.control.created_by_ultra  # type: ignore[attr-defined]
-            del QUOTES_CACHE.control.created_by_ultra  # type: ignore[attr-defined]
-            del WRONG_QUOTES_CACHE.control.created_by_ultra  # type: ignore[attr-defined]
         del (geoip.__kwdefaults__ or {})["caches"].control.created_by_ultra
 
         if unix_socket_path:
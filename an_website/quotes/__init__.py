@@ -13,25 +13,34 @@
 
 """A page with wrong quotes."""
 
-from tornado.web import RedirectHandler
-
 from ..utils.utils import ModuleInfo, PageInfo
-from .create import CreatePage1, CreatePage2
-from .generator import QuoteGenerator, QuoteGeneratorAPI
-from .image import QuoteAsImage
-from .info import AuthorsInfoPage, QuotesInfoPage
-from .quote_of_the_day import (
-    QuoteOfTheDayAPI,
-    QuoteOfTheDayRedirect,
-    QuoteOfTheDayRSS,
-)
-from .quotes import QuoteAPIHandler, QuoteById, QuoteMainPage, QuoteRedirectAPI
-from .share import ShareQuote
-from .utils import update_cache_periodically
 
 
 def get_module_info() -> ModuleInfo:
     """Create and return the ModuleInfo for this module."""
+    # the processes that render the images import .rendering, which has to
+    # work without loading the wrong quotes in .utils
+    # pylint: disable=import-outside-toplevel
+    from tornado.web import RedirectHandler
+
+    from .create import CreatePage1, CreatePage2
+    from .generator import QuoteGenerator, QuoteGeneratorAPI
+    from .image import QuoteAsImage
+    from .info import AuthorsInfoPage, QuotesInfoPage
+    from .quote_of_the_day import (
+        QuoteOfTheDayAPI,
+        QuoteOfTheDayRedirect,
+        QuoteOfTheDayRSS,
+    )
+    from .quotes import (
+        QuoteAPIHandler,
+        QuoteById,
+        QuoteMainPage,
+        QuoteRedirectAPI,
+    )
+    from .share import ShareQuote
+    from .utils import update_cache_periodically
+
     return ModuleInfo(
         handlers=(
             (r"/zitate", QuoteMainPage),
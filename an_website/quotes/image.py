@@ -14,59 +14,42 @@
 """A module that generates an image from a wrong quote."""
 
 import asyncio
-import io
+import hashlib
 import logging
 import math
+import multiprocessing
 import os
-import sys
-import textwrap
+import threading
 import time
-from collections import ChainMap
-from collections.abc import Iterable, Mapping, Set
-from itertools import pairwise
-from tempfile import TemporaryDirectory
-from typing import Any, ClassVar, Final
-
-import qoi_rs
-from PIL import Image, ImageDraw, ImageFont
-from PIL.Image import new as create_empty_image
+from collections import ChainMap, OrderedDict
+from collections.abc import Mapping, Set
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import cache, partial
+from pathlib import Path
+from typing import ClassVar, Final
+
+import orjson as json
+from elasticapm.metrics.base_metrics import MetricSet
 from tornado.web import HTTPError
 
-from .. import EPOCH
+from .. import CACHE_DIR
 from ..utils import static_file_handling
-from .utils import (
-    DIR,
-    QuoteReadyCheckHandler,
-    get_wrong_quote,
-    get_wrong_quotes,
-)
-
-try:
-    from unexpected_isaves.save_image import (  # type: ignore[import, unused-ignore]
-        to_excel,
-    )
-except ModuleNotFoundError:
-    to_excel = None  # pylint: disable=invalid-name
+from .rendering import IMAGE_HEIGHT, IMAGE_WIDTH, create_image, to_excel
+from .utils import QuoteReadyCheckHandler, get_wrong_quote, get_wrong_quotes
 
 LOGGER: Final = logging.getLogger(__name__)
 
-AUTHOR_MAX_WIDTH: Final[int] = 686
-QUOTE_MAX_WIDTH: Final[int] = 900
-DEBUG_COLOR: Final[tuple[int, int, int]] = 245, 53, 170
-DEBUG_COLOR2: Final[tuple[int, int, int]] = 224, 231, 34
-TEXT_COLOR: Final[tuple[int, int, int]] = 230, 230, 230
-
-
-_FONT_BYTES = (DIR / "files/oswald.regular.ttf").read_bytes()
+IMAGE_CACHE_DIR: Final = CACHE_DIR / "quote-images"
 
-FONT: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=50)
-FONT_SMALLER: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=44)
-FONT_SMALLEST: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=32)
-HOST_NAME_FONT: Final = ImageFont.truetype(
-    font=io.BytesIO(_FONT_BYTES), size=23
-)
-
-del _FONT_BYTES
+# rendering these takes longer than the DEFAULT_RENDER_TIMEOUT
+RENDER_TIMEOUTS: Final[Mapping[str, float]] = {
+    "4-color-gif": 20,
+    "gif": 20,
+    "jxl": 20,
+    "pdf": 20,
+    "xlsx": 60,
+}
+DEFAULT_RENDER_TIMEOUT: Final[float] = 10
 
 FILE_EXTENSIONS: Final[Mapping[str, str]] = {
     "bmp": "bmp",
@@ -108,264 +91,301 @@ IMAGE_CONTENT_TYPES_WITHOUT_TXT: Final[tuple[str, ...]] = tuple(
 )
 
 
-def load_png(filename: str) -> Image.Image:
-    """Load a PNG image into memory."""
-    with (DIR / "files" / f"{filename}.png").open("rb") as file:  # noqa: SIM117
-        with Image.open(file, formats=("PNG",)) as image:
-            return image.copy()
-
-
-BACKGROUND_IMAGE: Final = load_png("bg")
-IMAGE_WIDTH, IMAGE_HEIGHT = BACKGROUND_IMAGE.size
-WITZIG_IMAGE: Final = load_png("StempelWitzig")
-NICHT_WITZIG_IMAGE: Final = load_png("StempelNichtWitzig")
-
-
-def get_lines_and_max_height(
-    text: str,
-    max_width: int,
-    font: ImageFont.FreeTypeFont,
-) -> tuple[list[str], int]:
-    """Get the lines of the text and the max line height."""
-    column_count = 80
-    lines: list[str] = []
-
-    max_line_length: float = max_width + 1
-    while max_line_length > max_width:  # pylint: disable=while-used
-        lines = textwrap.wrap(text, width=column_count)
-        max_line_length = max(font.getlength(line) for line in lines)
-        column_count -= 1
-
-    return lines, int(max(font.getbbox(line)[3] for line in lines))
-
-
-def draw_text(  # pylint: disable=too-many-arguments
-    image: ImageDraw.ImageDraw,
-    text: str,
-    x: int,
-    y: int,
-    font: ImageFont.FreeTypeFont,
-    stroke_width: int = 0,
-    *,
-    display_bounds: bool = sys.flags.dev_mode,
-) -> None:
-    """Draw a text on an image."""
-    image.text(
-        (x, y),
-        text,
-        font=font,
-        fill=TEXT_COLOR,
-        align="right",
-        stroke_width=stroke_width,
-        spacing=54,
+class RenderedImageCache:
+    """A bounded LRU cache for rendered quote images.
+
+    Images are kept in memory and, if max_disk_size is positive, also on disk.
+    The keys start with the ID of the wrong quote, so that all renders of a
+    wrong quote can be dropped when its rating changes. The ratings of the
+    max_ratings most recently checked wrong quotes are remembered for that.
+    """
+
+    __slots__ = (
+        "_disk_entries",
+        "_disk_size",
+        "_entries",
+        "_lock",
+        "_ratings",
+        "_size",
+        "directory",
+        "max_disk_size",
+        "max_ratings",
+        "max_size",
     )
-    if display_bounds:
-        x_off, y_off, right, bottom = font.getbbox(
-            text, stroke_width=stroke_width
-        )
-        image.rectangle((x, y, x + right, y + bottom), outline=DEBUG_COLOR)
-        image.rectangle(
-            (x + x_off, y + y_off, x + right, y + bottom), outline=DEBUG_COLOR2
+
+    def __init__(
+        self,
+        max_size: int,
+        max_disk_size: int = 0,
+        directory: Path = IMAGE_CACHE_DIR,
+        max_ratings: int = 2**14,
+    ) -> None:
+        """Initialize the cache."""
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self.max_ratings = max_ratings
+        self.directory = directory
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._disk_entries: OrderedDict[str, int] = OrderedDict()
+        self._disk_size = 0
+        self._ratings: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        if max_disk_size > 0:
+            self._scan_directory()
+
+    def __len__(self) -> int:
+        """Return the number of images in memory."""
+        return len(self._entries)
+
+    def _scan_directory(self) -> None:
+        """Register the images already on disk, oldest first."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (entry.stat().st_mtime, entry.name, entry.stat().st_size)
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.endswith(".tmp")
         )
+        for _, name, size in files:
+            self._disk_entries[name] = size
+            self._disk_size += size
+        self._evict_from_disk()
+
+    def _evict_from_disk(self) -> None:
+        """Remove the least recently used images from disk."""
+        while self._disk_size > self.max_disk_size and self._disk_entries:
+            name, size = self._disk_entries.popitem(last=False)
+            self._disk_size -= size
+            (self.directory / name).unlink(missing_ok=True)
+
+    def check_rating(self, wq_id: str, rating: int) -> None:
+        """Drop all images of a wrong quote if its rating has changed."""
+        prefix = f"{wq_id}-"
+        with self._lock:
+            old_rating = self._ratings.pop(wq_id, None)
+            self._ratings[wq_id] = rating
+            if len(self._ratings) > self.max_ratings:
+                # the rating is part of the keys, so the images of the
+                # forgotten wrong quote are only evicted later
+                self._ratings.popitem(last=False)
+            if old_rating is None or old_rating == rating:
+                return
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= len(self._entries.pop(key))
+            for name in [
+                name for name in self._disk_entries if name.startswith(prefix)
+            ]:
+                self._disk_size -= self._disk_entries.pop(name)
+                (self.directory / name).unlink(missing_ok=True)
+
+    def get(self, key: str) -> None | bytes:
+        """Get an image from memory."""
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def get_from_disk(self, key: str) -> None | bytes:
+        """Get an image from disk and keep it in memory (blocking)."""
+        with self._lock:
+            if key not in self._disk_entries:
+                return None
+            self._disk_entries.move_to_end(key)
+        try:
+            image = (self.directory / key).read_bytes()
+        except FileNotFoundError:  # removed by another process
+            with self._lock:
+                self._disk_size -= self._disk_entries.pop(key, 0)
+            return None
+        self.put(key, image)
+        return image
+
+    def put_on_disk(self, key: str, image: bytes) -> None:
+        """Put an image on disk (blocking)."""
+        if self.max_disk_size <= 0 or len(image) > self.max_disk_size:
+            return
+        temp_path = self.directory / f"{key}.{threading.get_ident()}.tmp"
+        temp_path.write_bytes(image)
+        os.replace(temp_path, self.directory / key)
+        with self._lock:
+            self._disk_size += len(image) - self._disk_entries.pop(key, 0)
+            self._disk_entries[key] = len(image)
+            self._evict_from_disk()
+
+    def put(self, key: str, image: bytes) -> None:
+        """Put an image into memory and evict the least recently used ones."""
+        if len(image) > self.max_size:
+            return
+        with self._lock:
+            if (old_image := self._entries.pop(key, None)) is not None:
+                self._size -= len(old_image)
+            self._entries[key] = image
+            self._size += len(image)
+            while self._size > self.max_size:  # pylint: disable=while-used
+                self._size -= len(self._entries.popitem(last=False)[1])
 
 
-def draw_lines(  # pylint: disable=too-many-arguments
-    image: ImageDraw.ImageDraw,
-    lines: Iterable[str],
-    y_start: int,
-    max_w: int,
-    max_h: int,
-    font: ImageFont.FreeTypeFont,
-    padding_left: int = 0,
-    stroke_width: int = 0,
-) -> int:
-    """Draw the lines on the image and return the last y position."""
-    for line in lines:
-        width = font.getlength(line)
-        draw_text(
-            image,
-            line,
-            padding_left + math.ceil((max_w - width) / 2),
-            y_start,
-            font,
-            stroke_width,
-        )
-        y_start += max_h
-    return y_start
+@cache
+def get_image_cache(max_size: int, max_disk_size: int) -> RenderedImageCache:
+    """Get the rendered image cache of this process."""
+    return RenderedImageCache(max_size, max_disk_size)
 
 
-def create_image(  # noqa: C901  # pylint: disable=too-complex
-    # pylint: disable=too-many-arguments, too-many-branches
-    # pylint: disable=too-many-locals, too-many-statements
+def get_image_cache_key(  # pylint: disable=too-many-arguments
+    wq_id: str,
     quote: str,
     author: str,
     rating: None | int,
     source: None | str,
-    file_type: str = "png",
-    font: ImageFont.FreeTypeFont = FONT,
+    file_type: str,
     *,
-    include_kangaroo: bool = True,
-    wq_id: None | str = None,
-) -> bytes:
-    """Create an image with the given quote and author."""
-    image = (
-        BACKGROUND_IMAGE.copy()
-        if include_kangaroo
-        else create_empty_image("RGB", BACKGROUND_IMAGE.size, 0)
-    )
-    draw = ImageDraw.Draw(image, mode="RGB")
-
-    max_width = IMAGE_WIDTH if font is FONT_SMALLEST else QUOTE_MAX_WIDTH
-
-    # draw quote
-    quote_str = f"»{quote}«"
-    width, max_line_height = font.getbbox(quote_str)[2:]
-    if width <= AUTHOR_MAX_WIDTH:
-        quote_lines = [quote_str]
-    else:
-        quote_lines, max_line_height = get_lines_and_max_height(
-            quote_str, max_width, font
+    include_kangaroo: bool,
+) -> str:
+    """Get the content-addressed key of a rendered image."""
+    digest = hashlib.sha256(
+        json.dumps(
+            [
+                quote,
+                author,
+                rating,
+                source,
+                file_type,
+                include_kangaroo,
+                IMAGE_WIDTH,
+                IMAGE_HEIGHT,
+            ]
         )
-    if len(quote_lines) < 3:
-        y_start = 175
-    elif len(quote_lines) < 4:
-        y_start = 125
-    elif len(quote_lines) < 6:
-        y_start = 75
-    else:
-        y_start = 50
-    y_text = draw_lines(
-        draw,
-        quote_lines,
-        y_start,
-        max_width,
-        int(max_line_height),
-        font,
-        padding_left=0,
-        stroke_width=1 if file_type == "4-color-gif" else 0,
-    )
+    ).hexdigest()
+    return f"{wq_id}-{digest}"
 
-    # draw author
-    author_str = f"- {author}"
-    width, max_line_height = font.getbbox(author_str)[2:]
-    if width <= AUTHOR_MAX_WIDTH:
-        author_lines = [author_str]
-    else:
-        author_lines, max_line_height = get_lines_and_max_height(
-            author_str, AUTHOR_MAX_WIDTH, font
-        )
-    y_text = draw_lines(
-        draw,
-        author_lines,
-        max(
-            y_text + 20, IMAGE_HEIGHT - (220 if len(author_lines) < 3 else 280)
-        ),
-        AUTHOR_MAX_WIDTH,
-        int(max_line_height),
-        font,
-        padding_left=10,
-        stroke_width=1 if file_type == "4-color-gif" else 0,
+
+class RenderQueueFullError(Exception):
+    """Raised if too many images are waiting to be rendered."""
+
+    def __init__(self, retry_after: int) -> None:
+        """Initialize the exception."""
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class ImageRenderer:
+    """Render quote images outside of the event loop with a bounded queue.
+
+    With processes > 0 the images are rendered in a process pool, otherwise
+    in the default thread pool of the event loop.
+    """
+
+    __slots__ = (
+        "average_duration",
+        "executor",
+        "max_queue_size",
+        "pending",
+        "processes",
+        "rejected",
+        "rendered",
+        "timed_out",
     )
 
-    if y_text > IMAGE_HEIGHT:
-        for prev, smaller in pairwise((FONT, FONT_SMALLER, FONT_SMALLEST)):
-            if font is not prev:
-                continue
+    def __init__(self, processes: int, max_queue_size: int) -> None:
+        """Initialize the renderer."""
+        self.processes = processes
+        self.max_queue_size = max_queue_size
+        self.executor: None | Executor = (
+            ProcessPoolExecutor(
+                processes,
+                # don't fork the (multithreaded) Tornado worker
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            if processes > 0
+            else None
+        )
+        self.average_duration: float = 1
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def get_retry_after(self) -> int:
+        """Estimate the seconds until the queue has room again."""
+        return max(
+            1,
+            math.ceil(
+                self.pending * self.average_duration / max(self.processes, 1)
+            ),
+        )
 
-            LOGGER.info(
-                "Using smaller font (%s) for quote %s", smaller.size, source
+    async def render(  # pylint: disable=too-many-arguments
+        self,
+        quote: str,
+        author: str,
+        rating: None | int,
+        source: None | str,
+        file_type: str,
+        *,
+        include_kangaroo: bool,
+        wq_id: str,
+    ) -> bytes:
+        """Render an image or raise RenderQueueFullError or TimeoutError."""
+        if self.pending >= self.max_queue_size:
+            self.rejected += 1
+            raise RenderQueueFullError(self.get_retry_after())
+        start = time.monotonic()
+
+        def done(_: asyncio.Future[bytes]) -> None:
+            # the render keeps its place in the queue until it really finished
+            self.pending -= 1
+            self.rendered += 1
+            self.average_duration = 0.9 * self.average_duration + 0.1 * (
+                time.monotonic() - start
             )
-            return create_image(
+
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            partial(
+                create_image,
                 quote,
                 author,
                 rating,
                 source,
                 file_type,
-                smaller,
+                include_kangaroo=include_kangaroo,
                 wq_id=wq_id,
-            )
-
-        LOGGER.error("Quote doesn't fit on the image %r", quote)
-
-    # draw rating
-    if rating:
-        _, y_off, width, height = FONT_SMALLER.getbbox(str(rating))
-        y_rating = IMAGE_HEIGHT - 25 - int(height)
-        draw_text(
-            draw,
-            str(rating),
-            25,
-            y_rating,
-            FONT_SMALLER,  # always use same font for rating
-            1,
-        )
-        # draw rating image
-        icon = NICHT_WITZIG_IMAGE if rating < 0 else WITZIG_IMAGE
-        image.paste(
-            icon,
-            box=(
-                25 + 5 + int(width),
-                y_rating + int(y_off / 2),
             ),
-            mask=icon,
         )
+        future.add_done_callback(done)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                RENDER_TIMEOUTS.get(file_type, DEFAULT_RENDER_TIMEOUT),
+            )
+        except TimeoutError:
+            self.timed_out += 1
+            LOGGER.warning("Rendering %s as %s timed out", wq_id, file_type)
+            raise
 
-    # draw host name
-    if source:
-        width, height = HOST_NAME_FONT.getbbox(source)[2:]
-        draw_text(
-            draw,
-            source,
-            IMAGE_WIDTH - 5 - int(width),
-            IMAGE_HEIGHT - 5 - int(height),
-            HOST_NAME_FONT,
-            0,
-        )
 
-    if file_type == "qoi":
-        return qoi_rs.encode_pillow(image)
-
-    if to_excel and file_type == "xlsx":
-        with TemporaryDirectory() as tempdir_name:
-            filepath = os.path.join(tempdir_name, f"{wq_id or '0-0'}.xlsx")
-            to_excel(image, filepath, lower_image_size_by=10)
-            with open(filepath, "rb") as file:
-                return file.read()
-
-    kwargs: dict[str, Any] = {
-        "format": file_type,
-        "optimize": True,
-        "save_all": False,
-    }
-
-    if file_type == "4-color-gif":
-        colors: list[tuple[int, tuple[int, int, int]]]
-        colors = image.getcolors(2**16)  # type: ignore[assignment]
-        colors.sort(reverse=True)
-        palette = bytearray()
-        for _, color in colors[:4]:
-            palette.extend(color)
-        kwargs.update(format="gif", palette=palette)
-    elif file_type == "jxl":
-        kwargs.update(lossless=True)
-    elif file_type == "pdf":
-        timestamp = time.gmtime(EPOCH)
-        kwargs.update(
-            title=wq_id or "0-0",
-            author=author,
-            subject=quote,
-            creationDate=timestamp,
-            modDate=timestamp,
-        )
-    elif file_type == "tga":
-        kwargs.update(compression="tga_rle")
-    elif file_type == "tiff":
-        kwargs.update(compression="zlib")
-    elif file_type == "webp":
-        kwargs.update(lossless=True)
+RENDERERS: Final[list[ImageRenderer]] = []
+
 
-    image.save(buffer := io.BytesIO(), **kwargs)
-    return buffer.getvalue()
+@cache
+def get_image_renderer(processes: int, max_queue_size: int) -> ImageRenderer:
+    """Get the image renderer of this process."""
+    renderer = ImageRenderer(processes, max_queue_size)
+    RENDERERS.append(renderer)
+    return renderer
+
+
+class RenderQueueMetricSet(MetricSet):  # type: ignore[misc]
+    """Report the state of the image render queue to Elastic APM."""
+
+    def before_collect(self) -> None:
+        """Update the gauges before the metrics get collected."""
+        for name in ("pending", "rendered", "rejected", "timed_out"):
+            self.gauge(f"quotes.image.render.{name}").val = sum(
+                getattr(renderer, name) for renderer in RENDERERS
+            )
 
 
 class QuoteAsImage(QuoteReadyCheckHandler):
@@ -431,33 +451,71 @@ class QuoteAsImage(QuoteReadyCheckHandler):
         if file_type == "gif" and self.get_bool_argument("small", False):
             file_type = "4-color-gif"
 
-        return await self.finish(
-            await asyncio.to_thread(
-                create_image,
-                (
-                    self.sub_stanley(wrong_quote.quote.quote)
-                    if self.stanley()
-                    else wrong_quote.quote.quote
-                ),
-                (
-                    self.sub_stanley(wrong_quote.author.name)
-                    if self.stanley()
-                    else wrong_quote.author.name
-                ),
-                rating=(
-                    None
-                    if self.get_bool_argument("no_rating", False)
-                    else wrong_quote.rating
-                ),
-                source=(
-                    None
-                    if self.get_bool_argument("no_source", False)
-                    else f"{self.request.host_name}/z/{wrong_quote.get_id_as_str(True)}"
-                ),
-                file_type=file_type,
-                include_kangaroo=not self.get_bool_argument(
-                    "no_kangaroo", False
-                ),
-                wq_id=wrong_quote.get_id_as_str(),
-            )
+        quote = (
+            self.sub_stanley(wrong_quote.quote.quote)
+            if self.stanley()
+            else wrong_quote.quote.quote
         )
+        author = (
+            self.sub_stanley(wrong_quote.author.name)
+            if self.stanley()
+            else wrong_quote.author.name
+        )
+        rating = (
+            None
+            if self.get_bool_argument("no_rating", False)
+            else wrong_quote.rating
+        )
+        source = (
+            None
+            if self.get_bool_argument("no_source", False)
+            else f"{self.request.host_name}/z/{wrong_quote.get_id_as_str(True)}"
+        )
+        include_kangaroo = not self.get_bool_argument("no_kangaroo", False)
+        wq_id = wrong_quote.get_id_as_str()
+
+        image_cache = get_image_cache(
+            self.settings.get("QUOTE_IMAGE_CACHE_SIZE", 32 * 1024**2),
+            self.settings.get("QUOTE_IMAGE_CACHE_DISK_SIZE", 0),
+        )
+        image_cache.check_rating(wq_id, wrong_quote.rating)
+        key = get_image_cache_key(
+            wq_id,
+            quote,
+            author,
+            rating,
+            source,
+            file_type,
+            include_kangaroo=include_kangaroo,
+        )
+        image = image_cache.get(key)
+        if image is None and image_cache.max_disk_size > 0:
+            image = await asyncio.to_thread(image_cache.get_from_disk, key)
+        if image is None:
+            renderer = get_image_renderer(
+                self.settings.get("QUOTE_IMAGE_RENDER_PROCESSES", 0),
+                self.settings.get("QUOTE_IMAGE_RENDER_QUEUE_SIZE", 16),
+            )
+            try:
+                image = await renderer.render(
+                    quote,
+                    author,
+                    rating,
+                    source,
+                    file_type,
+                    include_kangaroo=include_kangaroo,
+                    wq_id=wq_id,
+                )
+            except RenderQueueFullError as exc:
+                self.set_header("Retry-After", str(exc.retry_after))
+                raise HTTPError(
+                    503, reason="Too many images are being rendered"
+                ) from exc
+            except TimeoutError as exc:
+                self.set_header("Retry-After", str(renderer.get_retry_after()))
+                raise HTTPError(503, reason="Rendering took too long") from exc
+            image_cache.put(key, image)
+            if image_cache.max_disk_size > 0:
+                await asyncio.to_thread(image_cache.put_on_disk, key, image)
+
+        return await self.finish(image)
@@ -31,12 +31,14 @@ from .. import EVENT_REDIS
 from ..utils.data_parsing import parse_args
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
 from ..utils.utils import hash_ip
-from .image import IMAGE_CONTENT_TYPES, create_image
+from .image import IMAGE_CONTENT_TYPES
 from .quote_of_the_day import QuoteOfTheDayBaseHandler
+from .rendering import create_image
 from .utils import (
     WRONG_QUOTES_CACHE,
     QuoteReadyCheckHandler,
     WrongQuote,
+    choose_wrong_quote_id,
     create_wq_and_vote,
     get_authors,
     get_random_id,
@@ -96,21 +98,19 @@ def get_next_id(rating_filter: RatingFilter) -> tuple[int, int]:
             return ids
         case "all":
             return get_random_id()
-        case "w":
-            wrong_quotes = get_wrong_quotes(lambda wq: wq.rating > 0)
-        case "n":
-            wrong_quotes = get_wrong_quotes(lambda wq: wq.rating < 0)
-        case "rated":
-            wrong_quotes = get_wrong_quotes(lambda wq: wq.id not in {-1, None})
+        case "w" | "n" | "rated":
+            wrong_quote_id = choose_wrong_quote_id(
+                WRONG_QUOTES_CACHE.get_rating_filter_ids(rating_filter)
+            )
         case _:
             LOGGER.error("Invalid rating filter %s", rating_filter)
             return get_random_id()
 
-    if not wrong_quotes:
-        # invalid rating filter or no wrong quotes with that filter
+    if wrong_quote_id is None:
+        # no wrong quotes with that filter
         return get_random_id()
 
-    return random.choice(wrong_quotes).get_id()  # nosec: B311
+    return wrong_quote_id
 
 
 class QuoteBaseHandler(QuoteReadyCheckHandler):
@@ -202,15 +202,13 @@ class QuoteMainPage(QuoteBaseHandler, QuoteOfTheDayBaseHandler):
             self.redirect(self.fix_url(f"/zitate/{quote}-{author}"))
             return
 
-        wrong_quotes = (
-            get_wrong_quotes(lambda wq: wq.rating > 0) or get_wrong_quotes()
+        funny_quote_id = (
+            choose_wrong_quote_id(WRONG_QUOTES_CACHE.get_rating_filter_ids("w"))
+            or random.choice(get_wrong_quotes()).get_id()
         )
         await self.render(
             "pages/quotes/main_page.html",
-            funny_quote_url=self.id_to_url(
-                *random.choice(wrong_quotes).get_id(),
-                rating_param="w",
-            ),
+            funny_quote_url=self.id_to_url(*funny_quote_id, rating_param="w"),
             random_quote_url=self.id_to_url(*self.next_id),
             quote_of_the_day=self.redis and await self.get_quote_of_today(),  # type: ignore[truthy-bool]
             one_stone_url=self.get_author_url("Albert Einstein"),
@@ -0,0 +1,399 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Render wrong quotes as images.
+
+This module is imported by the processes that render the images, so it must
+not import the modules that load the wrong quotes.
+"""
+
+import io
+import logging
+import math
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable
+from functools import lru_cache
+from itertools import pairwise
+from tempfile import TemporaryDirectory
+from typing import Any, Final
+
+import qoi_rs
+import regex
+from PIL import Image, ImageDraw, ImageFont
+from PIL.Image import new as create_empty_image
+
+from .. import DIR as ROOT_DIR, EPOCH
+
+try:
+    from unexpected_isaves.save_image import (  # type: ignore[import, unused-ignore]
+        to_excel,
+    )
+except ModuleNotFoundError:
+    to_excel = None  # pylint: disable=invalid-name
+
+LOGGER: Final = logging.getLogger(__name__)
+
+DIR: Final = ROOT_DIR / "quotes"
+
+AUTHOR_MAX_WIDTH: Final[int] = 686
+QUOTE_MAX_WIDTH: Final[int] = 900
+DEBUG_COLOR: Final[tuple[int, int, int]] = 245, 53, 170
+DEBUG_COLOR2: Final[tuple[int, int, int]] = 224, 231, 34
+TEXT_COLOR: Final[tuple[int, int, int]] = 230, 230, 230
+
+# break after hyphens between letters, like textwrap does
+HYPHEN_BREAK: Final = regex.compile(r"(?<=[^\d\W]{2}-)(?=[^\d\W])")
+
+_FONT_BYTES = (DIR / "files/oswald.regular.ttf").read_bytes()
+
+FONT: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=50)
+FONT_SMALLER: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=44)
+FONT_SMALLEST: Final = ImageFont.truetype(font=io.BytesIO(_FONT_BYTES), size=32)
+HOST_NAME_FONT: Final = ImageFont.truetype(
+    font=io.BytesIO(_FONT_BYTES), size=23
+)
+
+del _FONT_BYTES
+
+
+def load_png(filename: str) -> Image.Image:
+    """Load a PNG image into memory."""
+    with (DIR / "files" / f"{filename}.png").open("rb") as file:  # noqa: SIM117
+        with Image.open(file, formats=("PNG",)) as image:
+            return image.copy()
+
+
+BACKGROUND_IMAGE: Final = load_png("bg")
+IMAGE_WIDTH, IMAGE_HEIGHT = BACKGROUND_IMAGE.size
+WITZIG_IMAGE: Final = load_png("StempelWitzig")
+NICHT_WITZIG_IMAGE: Final = load_png("StempelNichtWitzig")
+
+
+@lru_cache(2**14)
+def get_text_length(font: ImageFont.FreeTypeFont, text: str) -> float:
+    """Get the length of a text, cached per font."""
+    return font.getlength(text)
+
+
+def split_long_word(
+    word: str, max_width: float, font: ImageFont.FreeTypeFont
+) -> tuple[str, str]:
+    """Split a word into the longest prefix that fits and the rest."""
+    low, high = 0, len(word) - 1
+    while low < high:  # pylint: disable=while-used
+        middle = (low + high + 1) // 2
+        if font.getlength(word[:middle]) <= max_width:
+            low = middle
+        else:
+            high = middle - 1
+    return word[:low], word[low:]
+
+
+def join_chunks(chunks: Iterable[tuple[str, bool]]) -> str:
+    """Join the chunks of a line, new words are separated by spaces."""
+    return "".join(
+        f" {chunk}" if new_word and index else chunk
+        for index, (chunk, new_word) in enumerate(chunks)
+    )
+
+
+def wrap_text(
+    text: str, max_width: int, font: ImageFont.FreeTypeFont
+) -> list[str]:
+    """Greedily wrap the text into as few lines as possible.
+
+    Like textwrap.wrap lines are broken at spaces and hyphens, and words that
+    are too long for a line are split.
+    """
+    space_length = get_text_length(font, " ")
+    chunks: deque[tuple[str, bool]] = deque(
+        (chunk, not index)
+        for word in text.split()
+        for index, chunk in enumerate(HYPHEN_BREAK.split(word))
+    )
+    lines: list[str] = []
+    while chunks:  # pylint: disable=while-used
+        chunk, new_word = chunks.popleft()
+        if get_text_length(font, chunk) > max_width and len(chunk) > 1:
+            # at least one character has to be on every line
+            head = split_long_word(chunk, max_width, font)[0] or chunk[0]
+            chunks.appendleft((chunk[len(head) :], False))
+            chunk = head
+        line = [(chunk, new_word)]
+        length = get_text_length(font, chunk)
+        while chunks:  # pylint: disable=while-used
+            chunk, new_word = chunks[0]
+            separator_length = space_length if new_word else 0
+            chunk_length = get_text_length(font, chunk)
+            if length + separator_length + chunk_length <= max_width:
+                length += separator_length + chunk_length
+                line.append(chunks.popleft())
+                continue
+            if chunk_length > max_width:
+                # fill the rest of the line with the start of the long word
+                head, tail = split_long_word(
+                    chunk, max_width - length - separator_length, font
+                )
+                if head:
+                    line.append((head, new_word))
+                    chunks[0] = (tail, False)
+            break
+        # the sum of the chunk lengths ignores kerning, so verify the line
+        while (  # pylint: disable=while-used
+            len(line) > 1 and font.getlength(join_chunks(line)) > max_width
+        ):
+            chunks.appendleft(line.pop())
+        lines.append(join_chunks(line))
+    return lines
+
+
+def get_lines_and_max_height(
+    text: str,
+    max_width: int,
+    font: ImageFont.FreeTypeFont,
+) -> tuple[list[str], int]:
+    """Get the lines of the text and the max line height."""
+    lines = wrap_text(text, max_width, font)
+    return lines, int(max(font.getbbox(line)[3] for line in lines))
+
+
+def draw_text(  # pylint: disable=too-many-arguments
+    image: ImageDraw.ImageDraw,
+    text: str,
+    x: int,
+    y: int,
+    font: ImageFont.FreeTypeFont,
+    stroke_width: int = 0,
+    *,
+    display_bounds: bool = sys.flags.dev_mode,
+) -> None:
+    """Draw a text on an image."""
+    image.text(
+        (x, y),
+        text,
+        font=font,
+        fill=TEXT_COLOR,
+        align="right",
+        stroke_width=stroke_width,
+        spacing=54,
+    )
+    if display_bounds:
+        x_off, y_off, right, bottom = font.getbbox(
+            text, stroke_width=stroke_width
+        )
+        image.rectangle((x, y, x + right, y + bottom), outline=DEBUG_COLOR)
+        image.rectangle(
+            (x + x_off, y + y_off, x + right, y + bottom), outline=DEBUG_COLOR2
+        )
+
+
+def draw_lines(  # pylint: disable=too-many-arguments
+    image: ImageDraw.ImageDraw,
+    lines: Iterable[str],
+    y_start: int,
+    max_w: int,
+    max_h: int,
+    font: ImageFont.FreeTypeFont,
+    padding_left: int = 0,
+    stroke_width: int = 0,
+) -> int:
+    """Draw the lines on the image and return the last y position."""
+    for line in lines:
+        width = font.getlength(line)
+        draw_text(
+            image,
+            line,
+            padding_left + math.ceil((max_w - width) / 2),
+            y_start,
+            font,
+            stroke_width,
+        )
+        y_start += max_h
+    return y_start
+
+
+def create_image(  # noqa: C901  # pylint: disable=too-complex
+    # pylint: disable=too-many-arguments, too-many-branches
+    # pylint: disable=too-many-locals, too-many-statements
+    quote: str,
+    author: str,
+    rating: None | int,
+    source: None | str,
+    file_type: str = "png",
+    font: ImageFont.FreeTypeFont = FONT,
+    *,
+    include_kangaroo: bool = True,
+    wq_id: None | str = None,
+) -> bytes:
+    """Create an image with the given quote and author."""
+    image = (
+        BACKGROUND_IMAGE.copy()
+        if include_kangaroo
+        else create_empty_image("RGB", BACKGROUND_IMAGE.size, 0)
+    )
+    draw = ImageDraw.Draw(image, mode="RGB")
+
+    max_width = IMAGE_WIDTH if font is FONT_SMALLEST else QUOTE_MAX_WIDTH
+
+    # draw quote
+    quote_str = f"»{quote}«"
+    width, max_line_height = font.getbbox(quote_str)[2:]
+    if width <= AUTHOR_MAX_WIDTH:
+        quote_lines = [quote_str]
+    else:
+        quote_lines, max_line_height = get_lines_and_max_height(
+            quote_str, max_width, font
+        )
+    if len(quote_lines) < 3:
+        y_start = 175
+    elif len(quote_lines) < 4:
+        y_start = 125
+    elif len(quote_lines) < 6:
+        y_start = 75
+    else:
+        y_start = 50
+    y_text = draw_lines(
+        draw,
+        quote_lines,
+        y_start,
+        max_width,
+        int(max_line_height),
+        font,
+        padding_left=0,
+        stroke_width=1 if file_type == "4-color-gif" else 0,
+    )
+
+    # draw author
+    author_str = f"- {author}"
+    width, max_line_height = font.getbbox(author_str)[2:]
+    if width <= AUTHOR_MAX_WIDTH:
+        author_lines = [author_str]
+    else:
+        author_lines, max_line_height = get_lines_and_max_height(
+            author_str, AUTHOR_MAX_WIDTH, font
+        )
+    y_text = draw_lines(
+        draw,
+        author_lines,
+        max(
+            y_text + 20, IMAGE_HEIGHT - (220 if len(author_lines) < 3 else 280)
+        ),
+        AUTHOR_MAX_WIDTH,
+        int(max_line_height),
+        font,
+        padding_left=10,
+        stroke_width=1 if file_type == "4-color-gif" else 0,
+    )
+
+    if y_text > IMAGE_HEIGHT:
+        for prev, smaller in pairwise((FONT, FONT_SMALLER, FONT_SMALLEST)):
+            if font is not prev:
+                continue
+
+            LOGGER.info(
+                "Using smaller font (%s) for quote %s", smaller.size, source
+            )
+            return create_image(
+                quote,
+                author,
+                rating,
+                source,
+                file_type,
+                smaller,
+                wq_id=wq_id,
+            )
+
+        LOGGER.error("Quote doesn't fit on the image %r", quote)
+
+    # draw rating
+    if rating:
+        _, y_off, width, height = FONT_SMALLER.getbbox(str(rating))
+        y_rating = IMAGE_HEIGHT - 25 - int(height)
+        draw_text(
+            draw,
+            str(rating),
+            25,
+            y_rating,
+            FONT_SMALLER,  # always use same font for rating
+            1,
+        )
+        # draw rating image
+        icon = NICHT_WITZIG_IMAGE if rating < 0 else WITZIG_IMAGE
+        image.paste(
+            icon,
+            box=(
+                25 + 5 + int(width),
+                y_rating + int(y_off / 2),
+            ),
+            mask=icon,
+        )
+
+    # draw host name
+    if source:
+        width, height = HOST_NAME_FONT.getbbox(source)[2:]
+        draw_text(
+            draw,
+            source,
+            IMAGE_WIDTH - 5 - int(width),
+            IMAGE_HEIGHT - 5 - int(height),
+            HOST_NAME_FONT,
+            0,
+        )
+
+    if file_type == "qoi":
+        return qoi_rs.encode_pillow(image)
+
+    if to_excel and file_type == "xlsx":
+        with TemporaryDirectory() as tempdir_name:
+            filepath = os.path.join(tempdir_name, f"{wq_id or '0-0'}.xlsx")
+            to_excel(image, filepath, lower_image_size_by=10)
+            with open(filepath, "rb") as file:
+                return file.read()
+
+    kwargs: dict[str, Any] = {
+        "format": file_type,
+        "optimize": True,
+        "save_all": False,
+    }
+
+    if file_type == "4-color-gif":
+        colors: list[tuple[int, tuple[int, int, int]]]
+        colors = image.getcolors(2**16)  # type: ignore[assignment]
+        colors.sort(reverse=True)
+        palette = bytearray()
+        for _, color in colors[:4]:
+            palette.extend(color)
+        kwargs.update(format="gif", palette=palette)
+    elif file_type == "jxl":
+        kwargs.update(lossless=True)
+    elif file_type == "pdf":
+        timestamp = time.gmtime(EPOCH)
+        kwargs.update(
+            title=wq_id or "0-0",
+            author=author,
+            subject=quote,
+            creationDate=timestamp,
+            modDate=timestamp,
+        )
+    elif file_type == "tga":
+        kwargs.update(compression="tga_rle")
+    elif file_type == "tiff":
+        kwargs.update(compression="zlib")
+    elif file_type == "webp":
+        kwargs.update(lossless=True)
+
+    image.save(buffer := io.BytesIO(), **kwargs)
+    return buffer.getvalue()
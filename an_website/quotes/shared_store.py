@@ -0,0 +1,806 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Columnar stores that are shared between the worker processes.
+
+Every store consists of two shared memory segments. The control segment has
+a fixed size, is created before forking and contains the name of the data
+segment, a generation counter and a ring buffer with the keys of the rows
+that changed recently. The data segment contains a header, one int64 array
+per column, an open addressing hash index over the key column and an arena
+with the UTF-8 encoded strings. If the data segment gets too small a bigger
+one is created and the generation counter is incremented, so the other
+processes attach to the new one the next time they access the store.
+
+Every process keeps the objects it materialised and only re-reads the rows
+whose keys are in the ring buffer, so reading doesn't deserialise anything.
+"""
+
+import abc
+import atexit
+import logging
+import multiprocessing
+import multiprocessing.synchronize
+import os
+import random
+import struct
+from collections.abc import (
+    Callable,
+    ItemsView,
+    Iterable,
+    Iterator,
+    KeysView,
+    Mapping,
+    MutableMapping,
+    Sequence,
+    ValuesView,
+)
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, ClassVar, Final, overload
+
+LOGGER: Final = logging.getLogger(__name__)
+
+MAGIC: Final[int] = int.from_bytes(b"an-store", "little")
+
+HEADER_SIZE: Final[int] = 8
+H_MAGIC: Final[int] = 0
+H_ROWS: Final[int] = 1
+H_ROW_CAPACITY: Final[int] = 2
+H_INDEX_CAPACITY: Final[int] = 3
+H_ARENA_USED: Final[int] = 4
+H_ARENA_CAPACITY: Final[int] = 5
+H_COLUMNS: Final[int] = 6
+
+C_GENERATION: Final[int] = 0
+C_LOG_HEAD: Final[int] = 1
+C_NAME_LENGTH: Final[int] = 2
+CONTROL_HEADER_SIZE: Final[int] = 4
+NAME_SIZE: Final[int] = 64
+LOG_SIZE: Final[int] = 4096
+
+SNAPSHOT_MAGIC: Final[bytes] = b"an-snap\0"
+SNAPSHOT_VERSION: Final[int] = 1
+# magic, version, number of stores
+SNAPSHOT_HEADER: Final = struct.Struct("<8sII")
+# length of the name, length of the int64 arrays, length of the arena
+SNAPSHOT_STORE_HEADER: Final = struct.Struct("<HQQ")
+
+FIBONACCI_MULTIPLIER: Final[int] = 0x9E3779B97F4A7C15
+NONE_LENGTH: Final[int] = -1
+
+
+def index_slot(packed_key: int, index_capacity: int) -> int:
+    """Get the preferred slot of a key in an index with the given capacity."""
+    return ((packed_key * FIBONACCI_MULTIPLIER) & 0xFFFF_FFFF_FFFF_FFFF) >> (
+        64 - index_capacity.bit_length() + 1
+    )
+
+
+class RandomChoiceSet[T]:
+    """A set that supports choosing a random element in O(1)."""
+
+    __slots__ = ("_items", "_positions")
+
+    _items: list[T]
+    _positions: dict[T, int]
+
+    def __init__(self) -> None:
+        """Create an empty set."""
+        self._items = []
+        self._positions = {}
+
+    def __contains__(self, item: object) -> bool:
+        """Check whether the item is in the set."""
+        return item in self._positions
+
+    def __len__(self) -> int:
+        """Get the number of items in the set."""
+        return len(self._items)
+
+    def add(self, item: T) -> None:
+        """Add an item to the set."""
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def choice(self) -> T:
+        """Choose a random item, raise IndexError if the set is empty."""
+        return self._items[random.randrange(len(self._items))]  # nosec: B311
+
+    def discard(self, item: T) -> None:
+        """Remove an item from the set if it is present."""
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+
+class SharedColumnarStore[K, V](MutableMapping[K, V], abc.ABC):
+    """A mapping that stores its values in columns in shared memory."""
+
+    INT_COLUMNS: ClassVar[tuple[str, ...]]
+    STR_COLUMNS: ClassVar[tuple[str, ...]]
+
+    lock: multiprocessing.synchronize.RLock
+
+    _control: SharedMemory
+    _control_ints: memoryview
+    _log: memoryview
+    _segment: SharedMemory
+    _ints: memoryview
+    _arena: memoryview
+    _generation: int
+    _log_seen: int
+    _objects: dict[K, V]
+    _keys: RandomChoiceSet[K]
+    _rows: dict[int, int]
+    _retired: list[SharedMemory]
+    _listeners: list[Callable[[K, None | V], object]]
+
+    def __init__(
+        self, row_capacity: int = 1024, arena_capacity: int = 64 * 1024
+    ) -> None:
+        """Create the shared memory segments."""
+        self.lock = multiprocessing.RLock()
+        self._owner_pid = os.getpid()
+        self._closed = False
+        self._column_count = (
+            1 + len(self.INT_COLUMNS) + 2 * len(self.STR_COLUMNS)
+        )
+        self._control = SharedMemory(
+            create=True,
+            size=(CONTROL_HEADER_SIZE + LOG_SIZE) * 8 + NAME_SIZE,
+            track=False,
+        )
+        self._control_ints = self._control.buf[: CONTROL_HEADER_SIZE * 8].cast(
+            "q"
+        )
+        self._log = self._control.buf[
+            CONTROL_HEADER_SIZE * 8 + NAME_SIZE :
+        ].cast("q")
+        self._objects = {}
+        self._keys = RandomChoiceSet()
+        self._rows = {}
+        self._retired = []
+        self._listeners = []
+        self._generation = 0
+        self._log_seen = 0
+        self._use_segment(
+            self._create_segment(
+                max(16, 1 << (row_capacity - 1).bit_length()), arena_capacity
+            )
+        )
+        self._publish_segment()
+        atexit.register(self.close)
+
+    @abc.abstractmethod
+    def pack_key(self, key: K, /) -> int:
+        """Pack a key into an int64."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def unpack_key(self, packed_key: int, /) -> K:
+        """Unpack a key packed with pack_key."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def dump(self, value: V, /) -> tuple[Sequence[int], Sequence[None | str]]:
+        """Get the values of the int and string columns of a value."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load(
+        self,
+        key: K,
+        ints: Sequence[int],
+        strs: Sequence[None | str],
+        value: None | V,
+        /,
+    ) -> V:
+        """Create a value from a row or update an existing value in place."""
+        raise NotImplementedError
+
+    def on_change(self, key: K, value: None | V, /) -> None:
+        """Handle a changed (or deleted if value is None) value."""
+
+    def _create_segment(
+        self, row_capacity: int, arena_capacity: int
+    ) -> SharedMemory:
+        """Create a new empty data segment."""
+        int_count = (
+            HEADER_SIZE + self._column_count * row_capacity + 2 * row_capacity
+        )
+        segment = SharedMemory(
+            create=True, size=int_count * 8 + arena_capacity, track=False
+        )
+        header = segment.buf[: HEADER_SIZE * 8].cast("q")
+        header[H_MAGIC] = MAGIC
+        header[H_ROW_CAPACITY] = row_capacity
+        header[H_INDEX_CAPACITY] = 2 * row_capacity
+        header[H_ARENA_CAPACITY] = arena_capacity
+        header[H_COLUMNS] = self._column_count
+        header.release()
+        return segment
+
+    def _map_segment(
+        self, segment: SharedMemory
+    ) -> tuple[memoryview, memoryview]:
+        """Create views of the int64 arrays and the arena of a data segment."""
+        header = segment.buf[: HEADER_SIZE * 8].cast("q")
+        if header[H_MAGIC] != MAGIC or header[H_COLUMNS] != self._column_count:
+            header.release()
+            raise ValueError(f"{segment.name} is not a valid data segment")
+        int_count = (
+            HEADER_SIZE
+            + self._column_count * header[H_ROW_CAPACITY]
+            + header[H_INDEX_CAPACITY]
+        )
+        arena_capacity = header[H_ARENA_CAPACITY]
+        header.release()
+        return (
+            segment.buf[: int_count * 8].cast("q"),
+            segment.buf[int_count * 8 : int_count * 8 + arena_capacity],
+        )
+
+    def _use_segment(self, segment: SharedMemory) -> None:
+        """Map the given data segment."""
+        ints, arena = self._map_segment(segment)
+        if hasattr(self, "_segment"):
+            self._retire_segment()
+        self._segment, self._ints, self._arena = segment, ints, arena
+
+    def _retire_segment(self) -> None:
+        """Stop using the current data segment."""
+        self._ints.release()
+        self._arena.release()
+        self._retired.append(self._segment)
+        for segment in tuple(self._retired):
+            try:
+                segment.close()
+            except BufferError:
+                continue
+            self._retired.remove(segment)
+
+    def _publish_segment(self) -> None:
+        """Make the current data segment the one used by all processes."""
+        old_name: None | str = None
+        if self._control_ints[C_NAME_LENGTH]:
+            old_name = self._read_segment_name()
+        name = self._segment.name.encode("UTF-8")
+        if len(name) > NAME_SIZE:
+            raise ValueError(f"Name of segment too long: {name!r}")
+        start = CONTROL_HEADER_SIZE * 8
+        self._control.buf[start : start + len(name)] = name
+        self._control_ints[C_NAME_LENGTH] = len(name)
+        self._control_ints[C_GENERATION] += 1
+        self._generation = self._control_ints[C_GENERATION]
+        if old_name and old_name != self._segment.name:
+            # processes that still use it keep their mapping
+            _unlink_segment(old_name)
+
+    def _read_segment_name(self) -> str:
+        """Read the name of the current data segment."""
+        start = CONTROL_HEADER_SIZE * 8
+        return str(
+            self._control.buf[
+                start : start + self._control_ints[C_NAME_LENGTH]
+            ],
+            "UTF-8",
+        )
+
+    def _attach(self) -> None:
+        """Map the data segment that is currently used by all processes."""
+        self._use_segment(SharedMemory(self._read_segment_name(), track=False))
+        self._generation = self._control_ints[C_GENERATION]
+
+    def _find_row(self, packed_key: int) -> int:
+        """Find the row of a key using the index in the data segment."""
+        ints = self._ints
+        row_capacity = ints[H_ROW_CAPACITY]
+        index_capacity = ints[H_INDEX_CAPACITY]
+        index_start = HEADER_SIZE + self._column_count * row_capacity
+        mask = index_capacity - 1
+        slot = index_slot(packed_key, index_capacity)
+        while entry := ints[index_start + slot]:  # pylint: disable=while-used
+            if ints[HEADER_SIZE + entry - 1] == packed_key:
+                return entry - 1
+            slot = (slot + 1) & mask
+        return -1
+
+    def _insert_into_index(self, packed_key: int, row: int) -> None:
+        """Insert the row of a key into the index of the data segment."""
+        ints = self._ints
+        index_start = HEADER_SIZE + self._column_count * ints[H_ROW_CAPACITY]
+        index_capacity = ints[H_INDEX_CAPACITY]
+        mask = index_capacity - 1
+        slot = index_slot(packed_key, index_capacity)
+        while ints[index_start + slot]:  # pylint: disable=while-used
+            slot = (slot + 1) & mask
+        ints[index_start + slot] = row + 1
+
+    def _read_row(self, row: int) -> tuple[list[int], list[None | str]]:
+        """Read the int and string columns of a row."""
+        ints = self._ints
+        row_capacity = ints[H_ROW_CAPACITY]
+        int_values = [
+            ints[HEADER_SIZE + column * row_capacity + row]
+            for column in range(1, 1 + len(self.INT_COLUMNS))
+        ]
+        str_values: list[None | str] = []
+        for column in range(1 + len(self.INT_COLUMNS), self._column_count, 2):
+            offset = ints[HEADER_SIZE + column * row_capacity + row]
+            length = ints[HEADER_SIZE + (column + 1) * row_capacity + row]
+            str_values.append(
+                None
+                if length == NONE_LENGTH
+                else str(self._arena[offset : offset + length], "UTF-8")
+            )
+        return int_values, str_values
+
+    def _write_row(
+        self,
+        row: int,
+        packed_key: int,
+        int_values: Sequence[int],
+        encoded: Sequence[None | bytes],
+        *,
+        new: bool,
+    ) -> bool:
+        """Write a row, return False if nothing changed."""
+        # pylint: disable=too-many-arguments
+        ints = self._ints
+        arena = self._arena
+        row_capacity = ints[H_ROW_CAPACITY]
+        changed = new
+        for column, value in enumerate(int_values, 1):
+            position = HEADER_SIZE + column * row_capacity + row
+            if new or ints[position] != value:
+                ints[position] = value
+                changed = True
+        for column, data in zip(
+            range(1 + len(self.INT_COLUMNS), self._column_count, 2),
+            encoded,
+            strict=True,
+        ):
+            offset_pos = HEADER_SIZE + column * row_capacity + row
+            length_pos = offset_pos + row_capacity
+            if not new:
+                length = ints[length_pos]
+                if data is None and length == NONE_LENGTH:
+                    continue
+                if data is not None and length == len(data):
+                    offset = ints[offset_pos]
+                    if arena[offset : offset + length] == data:
+                        continue
+            changed = True
+            if data is None:
+                ints[length_pos] = NONE_LENGTH
+                continue
+            offset = ints[H_ARENA_USED]
+            arena[offset : offset + len(data)] = data
+            ints[H_ARENA_USED] = offset + len(data)
+            ints[offset_pos] = offset
+            ints[length_pos] = len(data)
+        if new:
+            ints[HEADER_SIZE + row] = packed_key
+        return changed
+
+    def _rebuild(
+        self,
+        row_capacity: int,
+        arena_capacity: int,
+        skip: Iterable[int] = (),
+    ) -> None:
+        """Copy all rows into a new data segment and use it."""
+        skip = frozenset(skip)
+        segment = self._create_segment(row_capacity, arena_capacity)
+        old_ints, old_arena = self._ints, self._arena
+        old_row_capacity = old_ints[H_ROW_CAPACITY]
+        new_ints, new_arena = self._map_segment(segment)
+        # _write_row and _insert_into_index work on the current views
+        self._ints, self._arena = new_ints, new_arena
+        rows: dict[int, int] = {}
+        str_columns = range(1 + len(self.INT_COLUMNS), self._column_count, 2)
+        for old_row in range(old_ints[H_ROWS]):
+            packed_key = old_ints[HEADER_SIZE + old_row]
+            if packed_key in skip:
+                continue
+            row = len(rows)
+            encoded: list[None | bytes] = []
+            for column in str_columns:
+                position = HEADER_SIZE + column * old_row_capacity + old_row
+                offset = old_ints[position]
+                length = old_ints[position + old_row_capacity]
+                encoded.append(
+                    None
+                    if length == NONE_LENGTH
+                    else bytes(old_arena[offset : offset + length])
+                )
+            self._write_row(
+                row,
+                packed_key,
+                [
+                    old_ints[HEADER_SIZE + column * old_row_capacity + old_row]
+                    for column in range(1, 1 + len(self.INT_COLUMNS))
+                ],
+                encoded,
+                new=True,
+            )
+            self._insert_into_index(packed_key, row)
+            rows[packed_key] = row
+        new_ints[H_ROWS] = len(rows)
+        self._ints, self._arena = old_ints, old_arena
+        self._retire_segment()
+        self._segment, self._ints, self._arena = segment, new_ints, new_arena
+        self._publish_segment()
+        self._rows = rows
+
+    def _live_arena_size(self) -> int:
+        """Get the number of bytes in the arena that are still used."""
+        ints = self._ints
+        row_capacity = ints[H_ROW_CAPACITY]
+        return sum(
+            max(0, ints[HEADER_SIZE + (column + 1) * row_capacity + row])
+            for column in range(
+                1 + len(self.INT_COLUMNS), self._column_count, 2
+            )
+            for row in range(ints[H_ROWS])
+        )
+
+    def _reserve(self, rows: int, arena_needed: int) -> None:
+        """Make sure that the data segment has enough space."""
+        ints = self._ints
+        if rows > ints[H_ROW_CAPACITY] or (
+            ints[H_ARENA_USED] + arena_needed > ints[H_ARENA_CAPACITY]
+        ):
+            self._grow(rows, arena_needed)
+
+    def _grow(self, rows: int, arena_needed: int) -> None:
+        """Create a bigger data segment and compact the arena."""
+        row_capacity = self._ints[H_ROW_CAPACITY]
+        while row_capacity < rows:  # pylint: disable=while-used
+            row_capacity *= 2
+        arena_needed += self._live_arena_size()
+        arena_capacity = self._ints[H_ARENA_CAPACITY]
+        while arena_capacity < 2 * arena_needed:  # pylint: disable=while-used
+            arena_capacity *= 2
+        LOGGER.debug(
+            "Growing %s to %d rows and %d bytes",
+            type(self).__name__,
+            row_capacity,
+            arena_capacity,
+        )
+        self._rebuild(row_capacity, arena_capacity)
+
+    def _log_change(self, packed_key: int) -> None:
+        """Tell the other processes that a row changed."""
+        head = self._control_ints[C_LOG_HEAD]
+        self._log[head % LOG_SIZE] = packed_key
+        self._control_ints[C_LOG_HEAD] = head + 1
+        self._log_seen = head + 1
+
+    def _load_row(self, packed_key: int, row: int) -> None:
+        """Update the materialised object of a row."""
+        key = self.unpack_key(packed_key)
+        int_values, str_values = self._read_row(row)
+        self._set_object(
+            key,
+            self.load(key, int_values, str_values, self._objects.get(key)),
+        )
+
+    def _set_object(self, key: K, value: V) -> None:
+        """Set the materialised object of a key."""
+        self._objects[key] = value
+        self._keys.add(key)
+        self.on_change(key, value)
+        for listener in self._listeners:
+            listener(key, value)
+
+    def _delete_object(self, key: K) -> None:
+        """Delete the materialised object of a key."""
+        del self._objects[key]
+        self._keys.discard(key)
+        self.on_change(key, None)
+        for listener in self._listeners:
+            listener(key, None)
+
+    def _reload(self) -> None:
+        """Update all the materialised objects."""
+        ints = self._ints
+        self._rows = {
+            ints[HEADER_SIZE + row]: row for row in range(ints[H_ROWS])
+        }
+        for packed_key, row in self._rows.items():
+            self._load_row(packed_key, row)
+        if len(self._objects) != len(self._rows):
+            for key in tuple(self._objects):
+                if self.pack_key(key) not in self._rows:
+                    self._delete_object(key)
+
+    def _sync(self) -> None:
+        """Apply the changes made by the other processes."""
+        control = self._control_ints
+        if (
+            control[C_GENERATION] == self._generation
+            and control[C_LOG_HEAD] == self._log_seen
+        ):
+            return
+        with self.lock:
+            head = control[C_LOG_HEAD]
+            if control[C_GENERATION] != self._generation:
+                self._attach()
+                self._reload()
+            elif head - self._log_seen > LOG_SIZE:
+                self._reload()
+            else:
+                for position in range(self._log_seen, head):
+                    packed_key = self._log[position % LOG_SIZE]
+                    row = self._rows.get(packed_key)
+                    if row is None:
+                        row = self._find_row(packed_key)
+                        if row < 0:
+                            continue
+                        self._rows[packed_key] = row
+                    self._load_row(packed_key, row)
+            self._log_seen = head
+
+    def __contains__(self, key: object) -> bool:
+        """Check whether the key is in the store."""
+        self._sync()
+        return key in self._objects
+
+    def __delitem__(self, key: K) -> None:
+        """Delete the value of a key."""
+        if not self.delete_many((key,)):
+            raise KeyError(key)
+
+    def __getitem__(self, key: K) -> V:
+        """Get the value of a key."""
+        self._sync()
+        return self._objects[key]
+
+    def __iter__(self) -> Iterator[K]:
+        """Iterate over the keys."""
+        self._sync()
+        return iter(self._objects)
+
+    def __len__(self) -> int:
+        """Get the number of keys in the store."""
+        self._sync()
+        return len(self._objects)
+
+    def __setitem__(self, key: K, value: V) -> None:
+        """Set the value of a key."""
+        packed_key = self.pack_key(key)
+        int_values, str_values = self.dump(value)
+        encoded = [None if s is None else s.encode("UTF-8") for s in str_values]
+        with self.lock:
+            self._sync()
+            row = self._rows.get(packed_key)
+            self._reserve(
+                len(self._rows) + (row is None),
+                sum(len(data) for data in encoded if data),
+            )
+            if row is None:
+                row = self._ints[H_ROWS]
+                self._write_row(row, packed_key, int_values, encoded, new=True)
+                self._insert_into_index(packed_key, row)
+                self._ints[H_ROWS] = row + 1
+                self._rows[packed_key] = row
+                self._log_change(packed_key)
+            elif self._write_row(
+                row, packed_key, int_values, encoded, new=False
+            ):
+                self._log_change(packed_key)
+            self._set_object(key, value)
+
+    @overload
+    def get(self, key: K, /) -> None | V: ...
+
+    @overload
+    def get[D](self, key: K, default: D, /) -> V | D: ...
+
+    def get[D](self, key: K, default: None | D = None, /) -> None | V | D:
+        """Get the value of a key or the default."""
+        self._sync()
+        return self._objects.get(key, default)
+
+    def items(self) -> ItemsView[K, V]:
+        """Get a view of the items without copying them."""
+        self._sync()
+        return self._objects.items()
+
+    def keys(self) -> KeysView[K]:
+        """Get a view of the keys without copying them."""
+        self._sync()
+        return self._objects.keys()
+
+    def values(self) -> ValuesView[V]:
+        """Get a view of the values without copying them."""
+        self._sync()
+        return self._objects.values()
+
+    def dump_segment(self) -> tuple[bytes, bytes]:
+        """Dump the int64 arrays and the used part of the arena."""
+        with self.lock:
+            self._sync()
+            return (
+                bytes(self._ints),
+                bytes(self._arena[: self._ints[H_ARENA_USED]]),
+            )
+
+    def check_segment(self, ints: memoryview, arena: memoryview) -> int:
+        """Check data dumped with dump_segment and return the arena capacity.
+
+        Raise ValueError if the data can't be loaded into this store.
+        """
+        if len(ints) < HEADER_SIZE * 8:
+            raise ValueError("Dump is too short")
+        with ints[: HEADER_SIZE * 8].cast("q") as header:
+            arena_capacity: int = header[H_ARENA_CAPACITY]
+            valid = (
+                header[H_MAGIC] == MAGIC
+                and header[H_COLUMNS] == self._column_count
+                and len(ints)
+                == 8
+                * (
+                    HEADER_SIZE
+                    + self._column_count * header[H_ROW_CAPACITY]
+                    + header[H_INDEX_CAPACITY]
+                )
+                and len(arena) == header[H_ARENA_USED] <= arena_capacity
+            )
+        if not valid:
+            raise ValueError(f"Dump is not compatible with {self!r}")
+        return arena_capacity
+
+    def load_segment(self, ints: memoryview, arena: memoryview) -> None:
+        """Replace all the data with data dumped with dump_segment."""
+        arena_capacity = self.check_segment(ints, arena)
+        segment = SharedMemory(
+            create=True, size=len(ints) + arena_capacity, track=False
+        )
+        segment.buf[: len(ints)] = ints
+        segment.buf[len(ints) : len(ints) + len(arena)] = arena
+        with self.lock:
+            self._use_segment(segment)
+            self._publish_segment()
+            self._reload()
+            self._log_seen = self._control_ints[C_LOG_HEAD]
+
+    def add_listener(self, listener: Callable[[K, None | V], object]) -> None:
+        """Call the listener with every changed (or deleted) key and value."""
+        self._listeners.append(listener)
+
+    def sync(self) -> None:
+        """Apply the changes made by the other processes."""
+        self._sync()
+
+    def random_key(self) -> K:
+        """Choose a random key in O(1), raise IndexError if it is empty."""
+        self._sync()
+        return self._keys.choice()
+
+    def delete_many(self, keys: Iterable[K]) -> int:
+        """Delete many keys at once and return the number of deleted keys."""
+        with self.lock:
+            self._sync()
+            packed_keys = {
+                packed_key
+                for packed_key in map(self.pack_key, keys)
+                if packed_key in self._rows
+            }
+            if not packed_keys:
+                return 0
+            ints = self._ints
+            self._rebuild(
+                ints[H_ROW_CAPACITY], ints[H_ARENA_CAPACITY], packed_keys
+            )
+            for packed_key in packed_keys:
+                self._delete_object(self.unpack_key(packed_key))
+            self._log_seen = self._control_ints[C_LOG_HEAD]
+            return len(packed_keys)
+
+    def close(self) -> None:
+        """Unmap the segments and remove them if this process created them."""
+        with self.lock:
+            if self._closed:
+                return
+            self._closed = True
+            name = self._read_segment_name()
+            self._retire_segment()
+            self._control_ints.release()
+            self._log.release()
+            self._control.close()
+            if os.getpid() == self._owner_pid:
+                _unlink_segment(name)
+                self._control.unlink()
+
+
+def dump_snapshot(stores: Mapping[str, SharedColumnarStore[Any, Any]]) -> bytes:
+    """Create a snapshot of the stores."""
+    parts = [
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(stores))
+    ]
+    for name, store in stores.items():
+        ints, arena = store.dump_segment()
+        encoded_name = name.encode("UTF-8")
+        parts.append(
+            SNAPSHOT_STORE_HEADER.pack(len(encoded_name), len(ints), len(arena))
+        )
+        parts.extend((encoded_name, ints, arena))
+    return b"".join(parts)
+
+
+def load_snapshot(
+    stores: Mapping[str, SharedColumnarStore[Any, Any]],
+    snapshot: bytes | memoryview,
+) -> bool:
+    """Load a snapshot into the stores, return whether it was compatible."""
+    with memoryview(snapshot) as view:
+        if len(view) < SNAPSHOT_HEADER.size:
+            return False
+        magic, version, count = SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            return False
+        offset = SNAPSHOT_HEADER.size
+        dumps: dict[str, tuple[int, int, int]] = {}
+        try:
+            for _ in range(count):
+                name_length, ints_length, arena_length = (
+                    SNAPSHOT_STORE_HEADER.unpack_from(view, offset)
+                )
+                offset += SNAPSHOT_STORE_HEADER.size
+                name = str(view[offset : offset + name_length], "UTF-8")
+                offset += name_length
+                dumps[name] = (offset, ints_length, arena_length)
+                offset += ints_length + arena_length
+        except struct.error, UnicodeDecodeError:
+            return False
+        if offset != len(view) or dumps.keys() != stores.keys():
+            return False
+        # check all the stores first, so none of them gets replaced if the
+        # snapshot can't be loaded into one of them
+        for name, (offset, ints_length, arena_length) in dumps.items():
+            ints_end = offset + ints_length
+            with (
+                view[offset:ints_end] as ints,
+                view[ints_end : ints_end + arena_length] as arena,
+            ):
+                try:
+                    stores[name].check_segment(ints, arena)
+                except ValueError:
+                    LOGGER.exception("Loading %s from snapshot failed", name)
+                    return False
+        for name, (offset, ints_length, arena_length) in dumps.items():
+            ints_end = offset + ints_length
+            with (
+                view[offset:ints_end] as ints,
+                view[ints_end : ints_end + arena_length] as arena,
+            ):
+                stores[name].load_segment(ints, arena)
+    return True
+
+
+def _unlink_segment(name: str) -> None:
+    """Unlink a data segment by its name."""
+    try:
+        segment = SharedMemory(name, track=False)
+    except FileNotFoundError:
+        return
+    segment.unlink()
+    segment.close()
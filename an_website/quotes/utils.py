@@ -15,35 +15,29 @@
 
 import abc
 import asyncio
+import base64
 import contextlib
 import logging
-import multiprocessing.synchronize
+import os
 import random
 import sys
 import time
-from collections.abc import (
-    Callable,
-    Iterable,
-    Mapping,
-    MutableMapping,
-    Sequence,
-)
-from dataclasses import dataclass
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
 from datetime import date
 from typing import Any, Final, Literal, cast
 from urllib.parse import urlencode
 
-import dill  # type: ignore[import-untyped]  # nosec: B403
 import elasticapm
 import orjson as json
 import typed_stream
 from redis.asyncio import Redis
 from tornado.httpclient import AsyncHTTPClient
 from tornado.web import Application, HTTPError
-from UltraDict import UltraDict  # type: ignore[import-untyped]
 
 from .. import (
     CA_BUNDLE_PATH,
+    CACHE_DIR,
     DIR as ROOT_DIR,
     EVENT_REDIS,
     EVENT_SHUTDOWN,
@@ -52,6 +46,12 @@ from .. import (
 )
 from ..utils.request_handler import HTMLRequestHandler
 from ..utils.utils import ModuleInfo, Permission, ratelimit
+from .shared_store import (
+    RandomChoiceSet,
+    SharedColumnarStore,
+    dump_snapshot,
+    load_snapshot,
+)
 
 DIR: Final = ROOT_DIR / "quotes"
 
@@ -63,23 +63,36 @@ API_URL: str = "https://zitate.prapsschnalinen.de/api"
 WRONGQUOTE_DELETED: Final[int] = -2
 WRONGQUOTE_UNKNOWN: Final[int] = -1
 
+# yield to the event loop after parsing this many items
+PARSE_BATCH_SIZE: Final[int] = 256
 
-# pylint: disable-next=too-few-public-methods
-class UltraDictType[K, V](MutableMapping[K, V], abc.ABC):
-    """The type of the shared dictionaries."""
 
-    lock: multiprocessing.synchronize.RLock
+@dataclass(slots=True)
+class SyncState:
+    """The state of the synchronisation of an endpoint."""
 
+    # id -> hash of the JSON data of the item
+    fingerprints: dict[int, int] = field(default_factory=dict)
 
-QUOTES_CACHE: Final[UltraDictType[int, Quote]] = UltraDict(
-    buffer_size=1024**2, serializer=dill
-)
-AUTHORS_CACHE: Final[UltraDictType[int, Author]] = UltraDict(
-    buffer_size=1024**2, serializer=dill
-)
-WRONG_QUOTES_CACHE: Final[UltraDictType[tuple[int, int], WrongQuote]] = (
-    UltraDict(buffer_size=1024**2, serializer=dill)
-)
+
+@dataclass(slots=True)
+class SyncReport:
+    """Statistics about the synchronisation of an endpoint."""
+
+    endpoint: str
+    # whether there was nothing to compare to, so that every item was parsed
+    full: bool
+    fetched: int = 0
+    changed: int = 0
+    deleted: int = 0
+    duration: float = 0
+    # all ids that exist
+    ids: frozenset[int] = frozenset()
+    # the ids that existed at the last synchronisation, but not anymore
+    removed: frozenset[int] = frozenset()
+
+
+SYNC_STATES: Final[dict[str, SyncState]] = {}
 
 
 @dataclass(init=False, slots=True)
@@ -343,6 +356,159 @@ class WrongQuote(QuotesObjBase):
         )
 
 
+class AuthorStore(SharedColumnarStore[int, Author]):
+    """The store containing the authors."""
+
+    INT_COLUMNS = ()
+    STR_COLUMNS = ("name",)
+
+    def pack_key(self, key: int, /) -> int:  # noqa: D102
+        return key
+
+    def unpack_key(self, packed_key: int, /) -> int:  # noqa: D102
+        return packed_key
+
+    def dump(self, value: Author, /) -> tuple[tuple[()], tuple[str]]:
+        """Get the name of the author."""
+        return (), (value.name,)
+
+    def load(
+        self,
+        key: int,
+        ints: Sequence[int],
+        strs: Sequence[None | str],
+        value: None | Author,
+        /,
+    ) -> Author:
+        """Create or update an author."""
+        name = cast(str, strs[0])
+        if value is None:
+            # pylint: disable-next=too-many-function-args
+            return Author(key, name, None)
+        if value.name != name:
+            value.name = name
+            value.info = None  # reset info
+        return value
+
+
+class QuoteStore(SharedColumnarStore[int, Quote]):
+    """The store containing the quotes."""
+
+    INT_COLUMNS = ("author_id",)
+    STR_COLUMNS = ("quote",)
+
+    def pack_key(self, key: int, /) -> int:  # noqa: D102
+        return key
+
+    def unpack_key(self, packed_key: int, /) -> int:  # noqa: D102
+        return packed_key
+
+    def dump(self, value: Quote, /) -> tuple[tuple[int], tuple[str]]:
+        """Get the author id and the text of the quote."""
+        return (value.author_id,), (value.quote,)
+
+    def load(
+        self,
+        key: int,
+        ints: Sequence[int],
+        strs: Sequence[None | str],
+        value: None | Quote,
+        /,
+    ) -> Quote:
+        """Create or update a quote."""
+        if value is None:
+            # pylint: disable-next=too-many-function-args
+            return Quote(key, cast(str, strs[0]), ints[0])
+        value.author_id = ints[0]
+        value.quote = cast(str, strs[0])
+        return value
+
+
+class WrongQuoteStore(SharedColumnarStore[tuple[int, int], WrongQuote]):
+    """The store containing the wrong quotes."""
+
+    INT_COLUMNS = ("id", "rating")
+    STR_COLUMNS = ()
+
+    _rating_filter_ids: dict[str, RandomChoiceSet[tuple[int, int]]]
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Create the store and the indexes for the rating filters."""
+        self._rating_filter_ids = {
+            "w": RandomChoiceSet(),
+            "n": RandomChoiceSet(),
+            "rated": RandomChoiceSet(),
+        }
+        super().__init__(*args, **kwargs)
+
+    def get_rating_filter_ids(
+        self, rating_filter: Literal["w", "n", "rated"]
+    ) -> RandomChoiceSet[tuple[int, int]]:
+        """Get the ids of the wrong quotes that match the rating filter."""
+        self._sync()
+        return self._rating_filter_ids[rating_filter]
+
+    def on_change(
+        self, key: tuple[int, int], value: None | WrongQuote, /
+    ) -> None:
+        """Update the indexes for the rating filters."""
+        for rating_filter, matches in (
+            ("w", value is not None and value.rating > 0),
+            ("n", value is not None and value.rating < 0),
+            ("rated", value is not None and value.id != WRONGQUOTE_UNKNOWN),
+        ):
+            if matches:
+                self._rating_filter_ids[rating_filter].add(key)
+            else:
+                self._rating_filter_ids[rating_filter].discard(key)
+
+    def pack_key(self, key: tuple[int, int], /) -> int:
+        """Pack the quote id and the author id into one int."""
+        quote_id, author_id = key
+        if not (0 <= quote_id < 1 << 31 and 0 <= author_id < 1 << 32):
+            raise ValueError(f"Invalid wrong quote id: {key!r}")
+        return quote_id << 32 | author_id
+
+    def unpack_key(self, packed_key: int, /) -> tuple[int, int]:
+        """Unpack the quote id and the author id."""
+        return packed_key >> 32, packed_key & 0xFFFF_FFFF
+
+    def dump(self, value: WrongQuote, /) -> tuple[tuple[int, int], tuple[()]]:
+        """Get the id and the rating of the wrong quote."""
+        return (value.id, value.rating), ()
+
+    def load(
+        self,
+        key: tuple[int, int],
+        ints: Sequence[int],
+        strs: Sequence[None | str],
+        value: None | WrongQuote,
+        /,
+    ) -> WrongQuote:
+        """Create or update a wrong quote."""
+        if value is None:
+            return WrongQuote(  # pylint: disable=unexpected-keyword-arg
+                id=ints[0],
+                quote_id=key[0],
+                author_id=key[1],
+                rating=ints[1],
+            )
+        value.id, value.rating = ints
+        return value
+
+
+QUOTES_CACHE: Final = QuoteStore(arena_capacity=1024**2)
+AUTHORS_CACHE: Final = AuthorStore()
+WRONG_QUOTES_CACHE: Final = WrongQuoteStore(row_capacity=16 * 1024)
+
+SNAPSHOT_STORES: Final[Mapping[str, SharedColumnarStore[Any, Any]]] = {
+    "authors": AUTHORS_CACHE,
+    "quotes": QUOTES_CACHE,
+    "wrongquotes": WRONG_QUOTES_CACHE,
+}
+SNAPSHOT_PATH: Final = CACHE_DIR / f"{NAME}-quotes.snapshot"
+
+
 def get_wrong_quotes(
     filter_fun: None | Callable[[WrongQuote], bool] = None,
     *,
@@ -368,6 +534,20 @@ def get_wrong_quotes(
     return wqs
 
 
+def choose_wrong_quote_id(
+    ids: RandomChoiceSet[tuple[int, int]], tries: int = 8
+) -> None | tuple[int, int]:
+    """Choose a random id of a wrong quote that isn't a real quote."""
+    for _ in range(tries):
+        if not ids:
+            break
+        quote_id, author_id = key = ids.choice()
+        quote = QUOTES_CACHE.get(quote_id)
+        if quote is not None and quote.author_id != author_id:
+            return key
+    return None
+
+
 def get_quotes(
     filter_fun: None | Callable[[Quote], bool] = None,
     shuffle: bool = False,
@@ -546,13 +726,52 @@ async def parse_list_of_quote_data[Q: QuotesObjBase](  # noqa: D103
     if isinstance(json_list, str):
         json_list = cast(list[dict[str, Any]], json.loads(json_list))
     return_list = []
-    for json_data in json_list:
-        _ = parse_fun(json_data)
-        await asyncio.sleep(0)
-        return_list.append(_)
+    for i, json_data in enumerate(json_list, 1):
+        return_list.append(parse_fun(json_data))
+        if not i % PARSE_BATCH_SIZE:
+            await asyncio.sleep(0)
     return tuple(return_list)
 
 
+async def save_snapshot(redis: Redis[str], prefix: str) -> None:
+    """Save a binary snapshot of the quotes caches to Redis and to disk."""
+    snapshot = dump_snapshot(SNAPSHOT_STORES)
+    await asyncio.to_thread(_write_snapshot_file, snapshot)
+    if EVENT_REDIS.is_set():
+        await redis.setex(
+            f"{prefix}:cached-quote-data:snapshot",
+            60 * 60 * 24 * 30,
+            base64.b64encode(snapshot).decode("ASCII"),
+        )
+    LOGGER.debug("Saved quotes snapshot (%d bytes)", len(snapshot))
+
+
+def _write_snapshot_file(snapshot: bytes) -> None:
+    """Atomically replace the snapshot file."""
+    SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = SNAPSHOT_PATH.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_bytes(snapshot)
+    os.replace(temp_path, SNAPSHOT_PATH)
+
+
+async def load_snapshot_from_redis(redis: Redis[str], prefix: str) -> bool:
+    """Load the quotes caches from the snapshot stored in Redis."""
+    snapshot = await redis.get(f"{prefix}:cached-quote-data:snapshot")
+    if not snapshot:
+        return False
+    return load_snapshot(SNAPSHOT_STORES, base64.b64decode(snapshot))
+
+
+async def load_snapshot_from_file() -> bool:
+    """Load the quotes caches from the snapshot file."""
+    try:
+        snapshot = await asyncio.to_thread(SNAPSHOT_PATH.read_bytes)
+    except FileNotFoundError:
+        return False
+    # the stores are loaded in the event loop, as they are read without a lock
+    return load_snapshot(SNAPSHOT_STORES, snapshot)
+
+
 async def update_cache_periodically(
     app: Application, worker: int | None
 ) -> None:
@@ -570,18 +789,21 @@ async def update_cache_periodically(
     prefix: str = app.settings.get("REDIS_PREFIX", NAME).removesuffix("-dev")
     apm: None | elasticapm.Client
     if EVENT_REDIS.is_set():  # pylint: disable=too-many-nested-blocks
-        await parse_list_of_quote_data(
-            await redis.get(f"{prefix}:cached-quote-data:authors"),  # type: ignore[arg-type]  # noqa: B950
-            parse_author,
-        )
-        await parse_list_of_quote_data(
-            await redis.get(f"{prefix}:cached-quote-data:quotes"),  # type: ignore[arg-type]  # noqa: B950
-            parse_quote,
-        )
-        await parse_list_of_quote_data(
-            await redis.get(f"{prefix}:cached-quote-data:wrongquotes"),  # type: ignore[arg-type]  # noqa: B950
-            parse_wrong_quote,
-        )
+        if await load_snapshot_from_redis(redis, prefix):
+            LOGGER.info("Loaded quotes caches from snapshot in Redis")
+        else:
+            await parse_list_of_quote_data(
+                await redis.get(f"{prefix}:cached-quote-data:authors"),  # type: ignore[arg-type]  # noqa: B950
+                parse_author,
+            )
+            await parse_list_of_quote_data(
+                await redis.get(f"{prefix}:cached-quote-data:quotes"),  # type: ignore[arg-type]  # noqa: B950
+                parse_quote,
+            )
+            await parse_list_of_quote_data(
+                await redis.get(f"{prefix}:cached-quote-data:wrongquotes"),  # type: ignore[arg-type]  # noqa: B950
+                parse_wrong_quote,
+            )
         if QUOTES_CACHE and AUTHORS_CACHE and WRONG_QUOTES_CACHE:
             last_update = await redis.get(
                 f"{prefix}:cached-quote-data:last-update"
@@ -612,6 +834,8 @@ async def update_cache_periodically(
                         update_cache_in,
                     )
                     await asyncio.sleep(update_cache_in)
+    elif await load_snapshot_from_file():
+        LOGGER.info("Loaded quotes caches from snapshot file")
 
     # update the cache every hour
     failed = 0
@@ -635,75 +859,130 @@ async def update_cache(  # pylint: disable=too-complex,too-many-branches,too-man
     update_wrong_quotes: bool = True,
     update_quotes: bool = True,
     update_authors: bool = True,
-) -> None:
-    """Fill the cache with all data from the API."""
+) -> tuple[SyncReport, ...]:
+    """Fill the cache with the data from the API."""
     LOGGER.info("Updating quotes cache")
     redis: Redis[str] = cast("Redis[str]", app.settings.get("REDIS"))
     prefix: str = app.settings.get("REDIS_PREFIX", NAME).removesuffix("-dev")
     redis_available = EVENT_REDIS.is_set()
     exceptions: list[Exception] = []
+    reports: list[SyncReport] = []
 
     if update_wrong_quotes:
         try:
-            await _update_cache(WrongQuote, parse_wrong_quote, redis, prefix)
+            report = await _update_cache(
+                WrongQuote,
+                parse_wrong_quote,
+                lambda data: (
+                    int(data["quote"]["id"]),
+                    int(data["author"]["id"]),
+                )
+                in WRONG_QUOTES_CACHE,
+                redis,
+                prefix,
+            )
         except Exception as err:  # pylint: disable=broad-exception-caught
             exceptions.append(err)
+        else:
+            reports.append(report)
+            if report.ids:
+                with WRONG_QUOTES_CACHE.lock:
+                    max_id = max(report.ids)
+                    report.deleted = WRONG_QUOTES_CACHE.delete_many(
+                        key
+                        for key, wq in WRONG_QUOTES_CACHE.items()
+                        if (0 <= wq.id <= max_id and wq.id not in report.ids)
+                        or wq.id in report.removed
+                    )
 
     deleted_quotes: set[int] = set()
 
     if update_quotes:
         try:
-            quotes = await _update_cache(Quote, parse_quote, redis, prefix)
+            report = await _update_cache(
+                Quote,
+                parse_quote,
+                lambda data: int(data["id"]) in QUOTES_CACHE,
+                redis,
+                prefix,
+            )
         except Exception as err:  # pylint: disable=broad-exception-caught
             exceptions.append(err)
         else:
-            with QUOTES_CACHE.lock:
-                all_quote_ids = {q.id for q in quotes}
-                max_quote_id = max(all_quote_ids)
-                old_ids_in_cache = {
-                    _id for _id in QUOTES_CACHE if _id <= max_quote_id
-                }
-                deleted_quotes = old_ids_in_cache - all_quote_ids
-                for _id in deleted_quotes:
-                    del QUOTES_CACHE[_id]
-
-                if len(QUOTES_CACHE) < len(quotes):
-                    LOGGER.error("Cache has less elements than just fetched")
+            reports.append(report)
+            if report.ids:
+                with QUOTES_CACHE.lock:
+                    max_quote_id = max(report.ids)
+                    old_ids_in_cache = {
+                        _id for _id in QUOTES_CACHE if _id <= max_quote_id
+                    }
+                    deleted_quotes = (
+                        old_ids_in_cache - report.ids
+                    ) | report.removed
+                    report.deleted = QUOTES_CACHE.delete_many(deleted_quotes)
+
+                    if len(QUOTES_CACHE) < len(report.ids):
+                        LOGGER.error(
+                            "Cache has less elements than just fetched"
+                        )
 
     deleted_authors: set[int] = set()
 
     if update_authors:
         try:
-            authors = await _update_cache(Author, parse_author, redis, prefix)
+            report = await _update_cache(
+                Author,
+                parse_author,
+                lambda data: int(data["id"]) in AUTHORS_CACHE,
+                redis,
+                prefix,
+            )
         except Exception as err:  # pylint: disable=broad-exception-caught
             exceptions.append(err)
         else:
-            with AUTHORS_CACHE.lock:
-                all_author_ids = {q.id for q in authors}
-                max_author_id = max(all_author_ids)
-                old_ids_in_cache = {
-                    _id for _id in AUTHORS_CACHE if _id <= max_author_id
-                }
-                deleted_authors = old_ids_in_cache - all_author_ids
-                for _id in deleted_authors:
-                    del AUTHORS_CACHE[_id]
-
-                if len(AUTHORS_CACHE) < len(authors):
-                    LOGGER.error("Cache has less elements than just fetched")
+            reports.append(report)
+            if report.ids:
+                with AUTHORS_CACHE.lock:
+                    max_author_id = max(report.ids)
+                    old_ids_in_cache = {
+                        _id for _id in AUTHORS_CACHE if _id <= max_author_id
+                    }
+                    deleted_authors = (
+                        old_ids_in_cache - report.ids
+                    ) | report.removed
+                    report.deleted = AUTHORS_CACHE.delete_many(deleted_authors)
+
+                    if len(AUTHORS_CACHE) < len(report.ids):
+                        LOGGER.error(
+                            "Cache has less elements than just fetched"
+                        )
 
     if deleted_authors or deleted_quotes:
-        deleted_wrong_quotes: set[tuple[int, int]] = set()
         with WRONG_QUOTES_CACHE.lock:
-            for qid, aid in tuple(WRONG_QUOTES_CACHE):
-                if qid in deleted_quotes or aid in deleted_authors:
-                    deleted_wrong_quotes.add((qid, aid))
-                    del WRONG_QUOTES_CACHE[(qid, aid)]
+            deleted_wrong_quotes = {
+                (qid, aid)
+                for qid, aid in WRONG_QUOTES_CACHE
+                if qid in deleted_quotes or aid in deleted_authors
+            }
+            WRONG_QUOTES_CACHE.delete_many(deleted_wrong_quotes)
         LOGGER.warning(
             "Deleted %d wrong quotes: %r",
             len(deleted_wrong_quotes),
             deleted_wrong_quotes,
         )
 
+    for report in reports:
+        LOGGER.info(
+            "%s synchronisation of %s took %.3fs "
+            "(fetched: %d, changed: %d, deleted: %d)",
+            "Full" if report.full else "Incremental",
+            report.endpoint,
+            report.duration,
+            report.fetched,
+            report.changed,
+            report.deleted,
+        )
+
     if exceptions:
         raise ExceptionGroup("Cache could not be updated", exceptions)
 
@@ -719,30 +998,69 @@ async def update_cache(  # pylint: disable=too-complex,too-many-branches,too-man
             int(time.time()),
         )
 
+    if any(report.changed or report.deleted for report in reports):
+        try:
+            await save_snapshot(redis, prefix)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Saving quotes snapshot failed")
+
+    return tuple(reports)
+
 
-async def _update_cache[Q: QuotesObjBase](
+async def _update_cache[Q: QuotesObjBase](  # pylint: disable=too-many-arguments
     klass: type[Q],
     parse: Callable[[Mapping[str, Any]], Q],
+    is_cached: Callable[[Mapping[str, Any]], bool],
     redis: Redis[str],
     redis_prefix: str,
-) -> tuple[Q, ...]:
-    wq_data = await make_api_request(
-        klass.fetch_all_endpoint(), entity_should_exist=True
-    )
-    if wq_data is None:
-        LOGGER.error("%s returned 404", klass.fetch_all_endpoint())
-        return ()
-    parsed_data = await parse_list_of_quote_data(
-        wq_data,
-        parse,
-    )
-    if wq_data and EVENT_REDIS.is_set():
+) -> SyncReport:
+    endpoint = klass.fetch_all_endpoint()
+    state = SYNC_STATES.setdefault(endpoint, SyncState())
+    start = time.perf_counter()
+    report, data = await _fetch_all(endpoint, parse, is_cached, state)
+    if data and (report.changed or report.removed) and EVENT_REDIS.is_set():
         await redis.setex(
-            f"{redis_prefix}:cached-quote-data:{klass.fetch_all_endpoint()}",
+            f"{redis_prefix}:cached-quote-data:{endpoint}",
             60 * 60 * 24 * 30,
-            json.dumps(wq_data, option=ORJSON_OPTIONS),
+            json.dumps(data, option=ORJSON_OPTIONS),
         )
-    return parsed_data
+    report.duration = time.perf_counter() - start
+    return report
+
+
+async def _fetch_all[Q: QuotesObjBase](
+    endpoint: str,
+    parse: Callable[[Mapping[str, Any]], Q],
+    is_cached: Callable[[Mapping[str, Any]], bool],
+    state: SyncState,
+) -> tuple[SyncReport, None | list[dict[str, Any]]]:
+    """Fetch all items and parse the ones that changed since the last time.
+
+    The API can't list the changes, so all items are downloaded every time
+    and only parsing them is incremental: the items are compared with the
+    fingerprints of the last synchronisation.
+    """
+    report = SyncReport(endpoint, full=not state.fingerprints)
+    data = await make_api_request(endpoint, entity_should_exist=True)
+    if data is None:
+        LOGGER.error("%s returned 404", endpoint)
+        return report, None
+    fingerprints: dict[int, int] = {}
+    for i, json_data in enumerate(data, 1):
+        id_ = int(json_data["id"])
+        fingerprints[id_] = hash(json.dumps(json_data))
+        if state.fingerprints.get(id_) != fingerprints[id_] or not is_cached(
+            json_data
+        ):
+            parse(json_data)
+            report.changed += 1
+        if not i % PARSE_BATCH_SIZE:
+            await asyncio.sleep(0)
+    report.fetched = len(data)
+    report.ids = frozenset(fingerprints)
+    report.removed = frozenset(state.fingerprints.keys() - fingerprints.keys())
+    state.fingerprints = fingerprints
+    return report, data
 
 
 async def get_author_by_id(author_id: int) -> Author | None:
@@ -812,12 +1130,12 @@ async def get_rating_by_id(quote_id: int, author_id: int) -> int | None:
 
 def get_random_quote_id() -> int:
     """Get random quote id."""
-    return random.choice(tuple(QUOTES_CACHE))
+    return QUOTES_CACHE.random_key()
 
 
 def get_random_author_id() -> int:
     """Get random author id."""
-    return random.choice(tuple(AUTHORS_CACHE))
+    return AUTHORS_CACHE.random_key()
 
 
 def get_random_id() -> tuple[int, int]:
@@ -13,22 +13,37 @@
 
 """The Reporting API™️ of the website."""
 
+import asyncio
+import contextlib
 import logging
+import time
+from collections.abc import AsyncIterator, Iterable
 from datetime import timedelta
 from typing import Any, ClassVar, Final, cast
 
 import orjson as json
+from elasticapm.metrics.base_metrics import MetricSet
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import NotFoundError
 from elasticsearch.helpers import async_bulk
-from tornado.web import HTTPError
+from tornado.web import Application, HTTPError
 
-from .. import EVENT_ELASTICSEARCH, ORJSON_OPTIONS
+from .. import EVENT_ELASTICSEARCH, EVENT_SHUTDOWN, ORJSON_OPTIONS
 from ..utils.request_handler import APIRequestHandler
 from ..utils.utils import ModuleInfo, Permission
 
 LOGGER: Final = logging.getLogger(__name__)
 
+# reports get indexed when this many are buffered or the oldest is this old
+BULK_SIZE: Final = 500
+FLUSH_INTERVAL: Final = 5
+# reports get dropped when this many are buffered
+MAX_BUFFERED_REPORTS: Final = 20_000
+
+# reports fetched per search request when streaming them
+EXPORT_PAGE_SIZE: Final = 1000
+EXPORT_KEEP_ALIVE: Final = "1m"
+
 
 def get_module_info() -> ModuleInfo:
     """Create and return the ModuleInfo for this module."""
@@ -43,18 +58,111 @@ def get_module_info() -> ModuleInfo:
         ),
         path="/api/reports",
         hidden=True,
+        required_background_tasks=(flush_reports_periodically,),
     )
 
 
-async def get_reports(  # pylint: disable=too-many-arguments
-    elasticsearch: AsyncElasticsearch,
-    prefix: str,
-    domain: None | str = None,
-    type_: None | str = None,
-    from_: int = 0,
-    size: int = 10,
-) -> list[dict[str, Any]]:
-    """Get the reports from Elasticsearch."""
+class ReportBuffer:
+    """Buffer reports and index them in bulk requests."""
+
+    __slots__ = (
+        "_elasticsearch",
+        "_oldest",
+        "_tasks",
+        "dropped",
+        "failed",
+        "indexed",
+        "reports",
+    )
+
+    _elasticsearch: None | AsyncElasticsearch
+    _tasks: set[asyncio.Task[None]]
+    reports: list[dict[str, Any]]
+
+    def __init__(self) -> None:
+        """Initialize an empty buffer."""
+        self._elasticsearch = None
+        self._oldest = 0.0
+        self._tasks = set()
+        self.dropped = 0
+        self.failed = 0
+        self.indexed = 0
+        self.reports = []
+
+    def add(
+        self,
+        elasticsearch: AsyncElasticsearch,
+        reports: Iterable[dict[str, Any]],
+    ) -> None:
+        """Add reports and start indexing if enough are buffered."""
+        self._elasticsearch = elasticsearch
+        if not self.reports:
+            self._oldest = time.monotonic()
+        for report in reports:
+            if len(self.reports) >= MAX_BUFFERED_REPORTS:
+                self.dropped += 1
+            else:
+                self.reports.append(report)
+        if len(self.reports) >= BULK_SIZE:
+            task = asyncio.create_task(self.flush())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def get_time_until_due(self) -> float:
+        """Return the seconds until the oldest report is FLUSH_INTERVAL old."""
+        if not self.reports:
+            return FLUSH_INTERVAL
+        return max(0.0, self._oldest + FLUSH_INTERVAL - time.monotonic())
+
+    async def flush(self) -> None:
+        """Index all buffered reports in one bulk request."""
+        if not (self.reports and self._elasticsearch):
+            return
+        reports, self.reports = self.reports, []
+        try:
+            indexed, errors = await async_bulk(
+                self._elasticsearch, reports, raise_on_error=False
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            LOGGER.exception("Indexing %d reports failed", len(reports))
+            self.failed += len(reports)
+        else:
+            self.indexed += indexed
+            self.failed += len(cast(list[Any], errors))
+
+
+REPORT_BUFFER: Final = ReportBuffer()
+
+
+class ReportBufferMetricSet(MetricSet):  # type: ignore[misc]
+    """Report the state of the report buffer to Elastic APM."""
+
+    def before_collect(self) -> None:
+        """Update the gauges before the metrics get collected."""
+        self.gauge("reporting.buffer.size").val = len(REPORT_BUFFER.reports)
+        for name in ("dropped", "failed", "indexed"):
+            self.gauge(f"reporting.buffer.{name}").val = getattr(
+                REPORT_BUFFER, name
+            )
+
+
+async def flush_reports_periodically(
+    app: Application, worker: int | None
+) -> None:
+    """Index the buffered reports regularly and when shutting down."""
+    del app, worker
+    while not EVENT_SHUTDOWN.is_set():  # pylint: disable=while-used
+        # sleep until the oldest report is due, but check for the shutdown
+        await asyncio.sleep(min(REPORT_BUFFER.get_time_until_due(), 1))
+        if not REPORT_BUFFER.get_time_until_due():
+            await REPORT_BUFFER.flush()
+    await REPORT_BUFFER.flush()
+
+
+def get_reports_query(
+    domain: None | str = None, type_: None | str = None
+) -> dict[str, Any]:
+    """Get the query to filter the reports with."""
     query: dict[str, dict[str, list[dict[str, dict[str, Any]]]]]
     query = {"bool": {"filter": [{"range": {"@timestamp": {"gte": "now-1M"}}}]}}
     query["bool"]["must_not"] = [
@@ -95,16 +203,70 @@ async def get_reports(  # pylint: disable=too-many-arguments
                 }
             }
         )
+    return query
+
+
+async def get_reports(  # pylint: disable=too-many-arguments
+    elasticsearch: AsyncElasticsearch,
+    prefix: str,
+    domain: None | str = None,
+    type_: None | str = None,
+    from_: int = 0,
+    size: int = 10,
+) -> list[dict[str, Any]]:
+    """Get the reports from Elasticsearch."""
     reports = await elasticsearch.search(
         index=f"{prefix}-reports",
         sort=[{"@timestamp": {"order": "desc"}}],
-        query=query,
+        query=get_reports_query(domain, type_),
         from_=from_,
         size=size,
     )
     return [report["_source"] for report in reports["hits"]["hits"]]
 
 
+async def stream_reports(
+    elasticsearch: AsyncElasticsearch,
+    prefix: str,
+    domain: None | str = None,
+    type_: None | str = None,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Get all the reports from a point in time in pages.
+
+    The pages are fetched with search_after instead of from_ offsets,
+    so every page is as cheap as the first one.
+    """
+    pit = await elasticsearch.open_point_in_time(
+        index=f"{prefix}-reports", keep_alive=EXPORT_KEEP_ALIVE
+    )
+    pit_id: str = pit["id"]
+    query = get_reports_query(domain, type_)
+    search_after: None | list[Any] = None
+    try:
+        while True:  # pylint: disable=while-used
+            response = await elasticsearch.search(
+                pit={"id": pit_id, "keep_alive": EXPORT_KEEP_ALIVE},
+                sort=[
+                    {"@timestamp": {"order": "desc"}},
+                    {"_shard_doc": {"order": "desc"}},
+                ],
+                query=query,
+                search_after=search_after,
+                size=EXPORT_PAGE_SIZE,
+                track_total_hits=False,
+            )
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if not hits:
+                return
+            yield [hit["_source"] for hit in hits]
+            if len(hits) < EXPORT_PAGE_SIZE:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        await elasticsearch.close_point_in_time(id=pit_id)
+
+
 class ReportingAPI(APIRequestHandler):
     """The request handler for the Reporting API™️."""
 
@@ -138,6 +300,11 @@ class ReportingAPI(APIRequestHandler):
         if not self.is_authorized(Permission.REPORTING):
             from_ = 0
             size = min(1000, size)
+        elif self.content_type == "application/x-ndjson" and (
+            self.get_bool_argument("stream", False)
+        ):
+            await self.stream_reports(domain, type_)
+            return
 
         try:
             reports = await get_reports(
@@ -161,6 +328,32 @@ class ReportingAPI(APIRequestHandler):
         else:
             await self.finish(self.dump(reports))
 
+    async def stream_reports(
+        self, domain: None | str, type_: None | str
+    ) -> None:
+        """Write all the reports as NDJSON while they are being fetched."""
+        try:
+            # close the point in time even if the client disconnects
+            async with contextlib.aclosing(
+                stream_reports(
+                    self.elasticsearch, self.elasticsearch_prefix, domain, type_
+                )
+            ) as pages:
+                async for reports in pages:
+                    self.write(
+                        b"".join(
+                            json.dumps(
+                                report,
+                                option=ORJSON_OPTIONS | json.OPT_APPEND_NEWLINE,
+                            )
+                            for report in reports
+                        )
+                    )
+                    await self.flush()
+        except NotFoundError:  # data stream doesn't exist
+            raise HTTPError(404) from None
+        await self.finish()
+
     async def post(self) -> None:
         """Handle POST requests to the Reporting API™️."""
         # pylint: disable=too-complex, too-many-branches
@@ -236,9 +429,5 @@ class ReportingAPI(APIRequestHandler):
             )
             report["ecs"] = {"version": "8.17.0"}
             report["_op_type"] = "create"
-            report.pop("_index", None)  # DO NOT REMOVE
-        await async_bulk(
-            self.elasticsearch,
-            reports,
-            index=f"{self.elasticsearch_prefix}-reports",
-        )
+            report["_index"] = f"{self.elasticsearch_prefix}-reports"
+        REPORT_BUFFER.add(self.elasticsearch, reports)
@@ -13,24 +13,19 @@
 
 """The search page used to search the website."""
 
-import asyncio
 import logging
-from typing import Any, Final, Literal, TypeAlias, cast
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any, Final, Literal, TypeAlias
 
 import orjson as json
+from tornado.web import HTTPError
 from typed_stream import Stream
 
 from .. import NAME
-from ..quotes.utils import (
-    Author,
-    Quote,
-    WrongQuote,
-    get_authors,
-    get_quotes,
-    get_wrong_quotes,
-)
-from ..soundboard.data import ALL_SOUNDS, SoundInfo
+from ..quotes.utils import AUTHORS_CACHE, QUOTES_CACHE, WRONG_QUOTES_CACHE
+from ..soundboard.data import ALL_SOUNDS
 from ..utils import search
+from ..utils.app_search import AppSearchClient
 from ..utils.decorators import get_setting_or_default, requires_settings
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
 from ..utils.utils import AwaitableValue, ModuleInfo, PageInfo
@@ -43,6 +38,9 @@ UnscoredPageInfo: TypeAlias = tuple[
     tuple[Literal["description"], str],
 ]
 OldSearchPageInfo: TypeAlias = search.ScoredValue[UnscoredPageInfo]
+DocumentKey: TypeAlias = tuple[
+    Literal["page", "sound", "author", "quote", "wrong_quote"], Any
+]
 
 
 def get_module_info() -> ModuleInfo:
@@ -60,6 +58,110 @@ def get_module_info() -> ModuleInfo:
     )
 
 
+class SearchIndex:
+    """The inverted index of everything the old search engine can find.
+
+    Changes of the quotes caches are applied before the next search.
+    """
+
+    __slots__ = ("_dependents", "_dirty", "_index", "_pages")
+
+    _dependents: dict[DocumentKey, set[DocumentKey]]
+    _dirty: set[DocumentKey]
+    _index: search.InvertedIndex[DocumentKey]
+    _pages: None | tuple[PageInfo, ...]
+
+    def __init__(self) -> None:
+        """Initialize the search index."""
+        self._dependents = {}
+        self._dirty = set()
+        self._index = search.InvertedIndex()
+        self._pages = None
+
+    def _build(self, pages: Iterable[PageInfo]) -> None:
+        """Index everything and listen for changes of the quotes caches."""
+        self._pages = tuple(pages)
+        self._dirty.update(("page", index) for index in range(len(self._pages)))
+        self._dirty.update(("sound", index) for index in range(len(ALL_SOUNDS)))
+        self._dirty.update(("author", key) for key in AUTHORS_CACHE)
+        self._dirty.update(("quote", key) for key in QUOTES_CACHE)
+        self._dirty.update(("wrong_quote", key) for key in WRONG_QUOTES_CACHE)
+        AUTHORS_CACHE.add_listener(
+            lambda key, _: self._dirty.add(("author", key))
+        )
+        QUOTES_CACHE.add_listener(
+            lambda key, _: self._dirty.add(("quote", key))
+        )
+        WRONG_QUOTES_CACHE.add_listener(
+            lambda key, _: self._dirty.add(("wrong_quote", key))
+        )
+
+    def _get_fields(self, key: DocumentKey) -> None | tuple[str, ...]:
+        """Get the fields of a document or None if it shouldn't be found."""
+        match key:
+            case "page", int(index):
+                page = self.get_page(index)
+                return page.name, page.description, *page.keywords
+            case "sound", int(index):
+                sound = ALL_SOUNDS[index]
+                return sound.text, sound.person.value
+            case "author", int(author_id):
+                if author := AUTHORS_CACHE.get(author_id):
+                    return (author.name,)
+            case "quote", int(quote_id):
+                if quote := QUOTES_CACHE.get(quote_id):
+                    self._depend_on(("author", quote.author_id), key)
+                    return quote.quote, quote.author.name
+            case "wrong_quote", (int(quote_id), int(author_id)):
+                self._depend_on(("quote", quote_id), key)
+                self._depend_on(("author", author_id), key)
+                wrong_quote = WRONG_QUOTES_CACHE.get((quote_id, author_id))
+                if (
+                    wrong_quote
+                    and wrong_quote.rating > 0
+                    and wrong_quote.quote.author_id != author_id  # not real
+                ):
+                    return wrong_quote.quote.quote, wrong_quote.author.name
+        return None
+
+    def _depend_on(self, key: DocumentKey, dependent: DocumentKey) -> None:
+        """Update the dependent document if the document changes."""
+        self._dependents.setdefault(key, set()).add(dependent)
+
+    def get_page(self, index: int) -> PageInfo:
+        """Get an indexed page."""
+        assert self._pages is not None
+        return self._pages[index]
+
+    def refresh(self, get_pages: Callable[[], Iterable[PageInfo]]) -> None:
+        """Build the index or apply the changes since the last refresh."""
+        if self._pages is None:
+            self._build(get_pages())
+        for cache in (AUTHORS_CACHE, QUOTES_CACHE, WRONG_QUOTES_CACHE):
+            cache.sync()
+        while self._dirty:  # pylint: disable=while-used
+            dirty, self._dirty = self._dirty, set()
+            for key in dirty:
+                self._dirty.update(self._dependents.get(key, ()))
+                try:
+                    fields = self._get_fields(key)
+                except HTTPError:  # the author of a quote is missing
+                    fields = None
+                if fields is None:
+                    self._index.discard(key)
+                else:
+                    self._index.add(key, fields)
+
+    def search(
+        self, query: search.Query
+    ) -> Iterator[search.ScoredValue[DocumentKey]]:
+        """Search the index."""
+        return self._index.search(query)
+
+
+SEARCH_INDEX: Final = SearchIndex()
+
+
 class Search(HTMLRequestHandler):
     """The request handler for the search page."""
 
@@ -116,7 +218,7 @@ class Search(HTMLRequestHandler):
         self,
         query: str,
         *,
-        app_search: Any = ...,
+        app_search: AppSearchClient = ...,  # type: ignore[assignment]
         app_search_engine: str = ...,  # type: ignore[assignment]
     ) -> list[dict[str, str | float]] | None:
         """Search the website using Elastic App Search."""
@@ -128,8 +230,7 @@ class Search(HTMLRequestHandler):
                 "score": result["_meta"]["score"],
             }
             for result in (
-                await asyncio.to_thread(
-                    app_search.search,
+                await app_search.search(
                     app_search_engine,
                     body={
                         "query": query,
@@ -183,25 +284,26 @@ class Search(HTMLRequestHandler):
                 .map(self.convert_page_info_to_simple_tuple)
                 .map(lambda unscored: search.ScoredValue(1, unscored))
             )
-        pages: search.DataProvider[PageInfo, UnscoredPageInfo] = (
-            search.DataProvider(
-                self.get_all_page_info,
-                lambda page_info: (
-                    page_info.name,
-                    page_info.description,
-                    *page_info.keywords,
-                ),
-                self.convert_page_info_to_simple_tuple,
-            )
+        SEARCH_INDEX.refresh(self.get_all_page_info)
+        return sorted(
+            (
+                search.ScoredValue(scored_key.score, value)
+                for scored_key in SEARCH_INDEX.search(query_object)
+                if (value := self.convert_document(scored_key.value))
+            ),
+            key=lambda sv: sv.score,
         )
-        soundboard: search.DataProvider[SoundInfo, UnscoredPageInfo] = (
-            search.DataProvider(
-                ALL_SOUNDS,
-                lambda sound_info: (
-                    sound_info.text,
-                    sound_info.person.value,
-                ),
-                lambda sound_info: (
+
+    def convert_document(self, key: DocumentKey) -> None | UnscoredPageInfo:
+        """Convert a document of the search index to a tuple of tuples."""
+        match key:
+            case "page", int(index):
+                return self.convert_page_info_to_simple_tuple(
+                    SEARCH_INDEX.get_page(index)
+                )
+            case "sound", int(index):
+                sound_info = ALL_SOUNDS[index]
+                return (
                     (
                         "url",
                         self.fix_url(
@@ -210,50 +312,29 @@ class Search(HTMLRequestHandler):
                     ),
                     ("title", f"Soundboard ({sound_info.person.value})"),
                     ("description", sound_info.text),
-                ),
-            )
-        )
-        authors: search.DataProvider[Author, UnscoredPageInfo] = (
-            search.DataProvider(
-                get_authors,
-                lambda author: author.name,
-                lambda author: (
-                    ("url", self.fix_url(author.get_path())),
-                    ("title", "Autoren-Info"),
-                    ("description", author.name),
-                ),
-            )
-        )
-        quotes: search.DataProvider[Quote, UnscoredPageInfo] = (
-            search.DataProvider(
-                get_quotes,
-                lambda quote: (quote.quote, quote.author.name),
-                lambda q: (
-                    ("url", self.fix_url(q.get_path())),
-                    ("title", "Zitat-Info"),
-                    ("description", str(q)),
-                ),
-            )
-        )
-        wrong_quotes: search.DataProvider[WrongQuote, UnscoredPageInfo] = (
-            search.DataProvider(
-                lambda: get_wrong_quotes(lambda wq: wq.rating > 0),
-                lambda wq: (wq.quote.quote, wq.author.name),
-                lambda wq: (
-                    ("url", self.fix_url(wq.get_path())),
-                    ("title", "Falsches Zitat"),
-                    ("description", str(wq)),
-                ),
-            )
-        )
-        return search.search(
-            query_object,
-            cast(search.DataProvider[object, UnscoredPageInfo], pages),
-            cast(search.DataProvider[object, UnscoredPageInfo], soundboard),
-            cast(search.DataProvider[object, UnscoredPageInfo], authors),
-            cast(search.DataProvider[object, UnscoredPageInfo], quotes),
-            cast(search.DataProvider[object, UnscoredPageInfo], wrong_quotes),
-        )
+                )
+            case "author", int(author_id):
+                if author := AUTHORS_CACHE.get(author_id):
+                    return (
+                        ("url", self.fix_url(author.get_path())),
+                        ("title", "Autoren-Info"),
+                        ("description", author.name),
+                    )
+            case "quote", int(quote_id):
+                if quote := QUOTES_CACHE.get(quote_id):
+                    return (
+                        ("url", self.fix_url(quote.get_path())),
+                        ("title", "Zitat-Info"),
+                        ("description", str(quote)),
+                    )
+            case "wrong_quote", (int(quote_id), int(author_id)):
+                if wrong_quote := WRONG_QUOTES_CACHE.get((quote_id, author_id)):
+                    return (
+                        ("url", self.fix_url(wrong_quote.get_path())),
+                        ("title", "Falsches Zitat"),
+                        ("description", str(wrong_quote)),
+                    )
+        return None
 
 
 class SearchAPIHandler(APIRequestHandler, Search):
@@ -15,7 +15,7 @@
 
 from .. import GH_ORG_URL
 from ..utils.utils import ModuleInfo, PageInfo
-from .swap import SwappedWords, SwappedWordsAPI
+from .swap import SwappedWords, SwappedWordsAPI, SwappedWordsStreamAPI
 
 
 def get_module_info() -> ModuleInfo:
@@ -24,6 +24,7 @@ def get_module_info() -> ModuleInfo:
         handlers=(
             (r"/vertauschte-woerter", SwappedWords),
             (r"/api/vertauschte-woerter", SwappedWordsAPI),
+            (r"/api/vertauschte-woerter/stream", SwappedWordsStreamAPI),
         ),
         name="Vertauschte Wörter",
         description="Eine Seite, die Wörter vertauscht",
@@ -15,7 +15,7 @@
 
 from dataclasses import dataclass, field
 from functools import lru_cache
-from typing import TypeAlias
+from typing import ClassVar, TypeAlias
 
 import regex
 from regex import Match, Pattern
@@ -279,6 +279,10 @@ class InvalidConfigError(Exception):
 class SwappedWordsConfig:  # pylint: disable=eq-without-hash
     """SwappedWordsConfig class used to swap words in strings."""
 
+    __slots__ = ("_pattern", "_word_pairs", "lines")
+
+    _pattern: None | Pattern[str]
+
     def __eq__(self, other: object) -> bool:
         """Check equality based on the lines."""
         if not isinstance(other, SwappedWordsConfig):
@@ -294,22 +298,30 @@ class SwappedWordsConfig:  # pylint: disable=eq-without-hash
             )
             if line
         )
+        self._word_pairs: dict[str, WordPair] = {
+            f"n{i}": word_pair
+            for i, word_pair in enumerate(self.lines)
+            if isinstance(word_pair, WordPair)
+        }
+        self._pattern = None
 
     def get_regex(self) -> Pattern[str]:
         """Get the regex that matches every word in this."""
-        return regex.compile(
-            "|".join(
-                tuple(
-                    f"(?P<n{i}>{word_pair.to_pattern_str()})"
-                    for i, word_pair in enumerate(self.lines)
-                    if isinstance(word_pair, WordPair)
-                )
-            ),
-            regex.IGNORECASE,
-        )
+        if self._pattern is None:
+            self._pattern = regex.compile(
+                "|".join(
+                    f"(?P<{group_name}>{word_pair.to_pattern_str()})"
+                    for group_name, word_pair in self._word_pairs.items()
+                ),
+                regex.IGNORECASE,
+            )
+        return self._pattern
 
     def get_replaced_word(self, match: Match[str]) -> str:
         """Get the replaced word with the same case as the match."""
+        # the group of the word pair is the outermost, so it closes last
+        if word_pair := self._word_pairs.get(match.lastgroup or ""):
+            return word_pair.get_replacement(match[0])
         for key, word in match.groupdict().items():
             if isinstance(word, str) and key.startswith("n"):
                 return self.get_replacement_by_group_name(key, word)
@@ -318,13 +330,8 @@ class SwappedWordsConfig:  # pylint: disable=eq-without-hash
 
     def get_replacement_by_group_name(self, group_name: str, word: str) -> str:
         """Get the replacement of a word by the group name it matched."""
-        if not group_name.startswith("n") or group_name == "n":
-            return word
-        index = int(group_name[1:])
-        config_line = self.lines[index]
-        if isinstance(config_line, WordPair):
-            return config_line.get_replacement(word)
-
+        if word_pair := self._word_pairs.get(group_name):
+            return word_pair.get_replacement(word)
         return word
 
     def swap_words(self, text: str) -> str:
@@ -354,11 +361,78 @@ class SwappedWordsConfig:  # pylint: disable=eq-without-hash
         )
 
 
+class SwappedWordsStream:
+    """Swap the words in a text that is given in chunks.
+
+    Matches that could continue in the next chunk are kept back until more
+    text is fed. A bit of the original (unswapped) text before the current
+    position is kept as context, so look-behinds and word boundaries work
+    across chunks.
+    """
+
+    __slots__ = ("_buffer", "_pos", "config", "max_buffer_size")
+
+    CONTEXT_SIZE: ClassVar[int] = 64
+
+    def __init__(
+        self, config: SwappedWordsConfig, max_buffer_size: int = 2**15
+    ) -> None:
+        """Initialize the stream with an empty buffer."""
+        self.config = config
+        self.max_buffer_size = max_buffer_size
+        self._buffer = ""
+        self._pos = 0
+
+    def _swap(self, text: str, pos: int, *, final: bool) -> tuple[str, int]:
+        """Swap the words after pos and return where the kept text starts."""
+        parts: list[str] = []
+        end = pos
+        for match in self.config.get_regex().finditer(
+            text, pos, partial=not final
+        ):
+            if not final and (match.partial or match.end() == len(text)):
+                parts.append(text[end : match.start()])
+                return "".join(parts), match.start()
+            parts.append(text[end : match.start()])
+            parts.append(self.config.get_replaced_word(match))
+            end = match.end()
+        parts.append(text[end:])
+        return "".join(parts), len(text)
+
+    def feed(self, chunk: str) -> str:
+        """Feed a chunk of the text and return the swapped text."""
+        text = self._buffer + chunk
+        output, kept = self._swap(text, self._pos, final=False)
+        if len(text) - kept > self.max_buffer_size:
+            rest, kept = self._swap(text, kept, final=True)
+            output += rest
+        context_start = max(0, kept - self.CONTEXT_SIZE)
+        self._buffer = text[context_start:]
+        self._pos = kept - context_start
+        return output
+
+    def finish(self) -> str:
+        """Return the swapped rest of the text."""
+        output, _ = self._swap(self._buffer, self._pos, final=True)
+        self._buffer = ""
+        self._pos = 0
+        return output
+
+
+@lru_cache(64)
+def parse_config(config: str) -> SwappedWordsConfig:
+    """Parse a config string, reusing the result for the same config.
+
+    The result must not be modified.
+    """
+    return SwappedWordsConfig(config)
+
+
 def minify(config: str) -> str:
     """Minify a config string."""
-    return SwappedWordsConfig(config).to_config_str(True)
+    return parse_config(config).to_config_str(True)
 
 
 def beautify(config: str) -> str:
     """Beautify a config string."""
-    return SwappedWordsConfig(config).to_config_str()
+    return parse_config(config).to_config_str()
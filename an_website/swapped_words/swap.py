@@ -13,17 +13,24 @@
 
 """A page that swaps words."""
 
+import codecs
 from asyncio import Future
+from collections.abc import Awaitable
 from base64 import b64decode, b64encode
 from dataclasses import dataclass
 from typing import ClassVar, Final
 
-from tornado.web import HTTPError, MissingArgumentError
+from tornado.web import HTTPError, MissingArgumentError, stream_request_body
 
 from .. import DIR as ROOT_DIR
 from ..utils.data_parsing import parse_args
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
-from .config_file import InvalidConfigError, SwappedWordsConfig
+from .config_file import (
+    InvalidConfigError,
+    SwappedWordsConfig,
+    SwappedWordsStream,
+    parse_config,
+)
 
 # the max char count of the text to process
 MAX_CHAR_COUNT: Final[int] = 32769 - 1
@@ -105,7 +112,7 @@ class SwappedWords(HTMLRequestHandler):
             sw_config = (
                 DEFAULT_CONFIG
                 if args.config is None or args.reset
-                else SwappedWordsConfig(args.config)
+                else parse_config(args.config)
             )
         except InvalidConfigError as exc:
             self.set_status(400)
@@ -146,7 +153,7 @@ class SwappedWordsAPI(APIRequestHandler):
             sw_config = (
                 DEFAULT_CONFIG
                 if args.config is None
-                else SwappedWordsConfig(args.config)
+                else parse_config(args.config)
             )
 
             if args.return_config:
@@ -173,3 +180,60 @@ class SwappedWordsAPI(APIRequestHandler):
     async def post(self) -> None:
         """Handle POST requests to the swapped words API."""
         return await self.get()  # pylint: disable=missing-kwoa
+
+
+@stream_request_body
+class SwappedWordsStreamAPI(APIRequestHandler):
+    """The request handler for the streaming swapped words API.
+
+    The text is the request body and can be arbitrarily long. The swapped
+    text gets written while the body is still being received.
+    """
+
+    ALLOWED_METHODS: ClassVar[tuple[str, ...]] = ("POST",)
+    POSSIBLE_CONTENT_TYPES: ClassVar[tuple[str, ...]] = ("text/plain",)
+
+    decoder: codecs.IncrementalDecoder
+    stream: SwappedWordsStream
+
+    def data_received(  # noqa: D102
+        self, chunk: bytes
+    ) -> None | Awaitable[None]:
+        if not hasattr(self, "stream"):
+            return None
+        if output := self.stream.feed(self.decoder.decode(chunk)):
+            self.write(output)
+            return self.flush()
+        return None
+
+    async def prepare(self) -> None:  # noqa: D102
+        await super().prepare()
+        if self._finished:
+            return
+
+        config = self.get_argument("config", None)
+        try:
+            sw_config = (
+                DEFAULT_CONFIG
+                if config is None
+                else parse_config(config.strip())
+            )
+        except InvalidConfigError as exc:
+            self.set_status(400)
+            await self.finish_dict(
+                error=exc.reason,
+                line=exc.line,
+                line_num=exc.line_num,
+            )
+            return
+
+        self.set_header("X-Accel-Buffering", "no")
+        self.decoder = codecs.getincrementaldecoder("UTF-8")("replace")
+        self.stream = SwappedWordsStream(sw_config, MAX_CHAR_COUNT)
+
+    async def post(self) -> None:
+        """Handle POST requests to the streaming swapped words API."""
+        await self.finish(
+            self.stream.feed(self.decoder.decode(b"", final=True))
+            + self.stream.finish()
+        )
@@ -13,22 +13,37 @@
 
 """The uptime page that shows the time the website is running."""
 
+import asyncio
 import logging
 import math
 import time
-from typing import Final, TypedDict
+from dataclasses import dataclass
+from typing import Final, TypedDict, cast
 
 import regex
 from elasticsearch import AsyncElasticsearch
-from tornado.web import HTTPError, RedirectHandler
-
-from .. import EPOCH, EVENT_ELASTICSEARCH, NAME, UPTIME
+from redis.asyncio import Redis
+from tornado.web import Application, HTTPError, RedirectHandler
+
+from .. import (
+    EPOCH,
+    EVENT_ELASTICSEARCH,
+    EVENT_REDIS,
+    EVENT_SHUTDOWN,
+    NAME,
+    UPTIME,
+)
 from ..utils.base_request_handler import BaseRequestHandler
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
 from ..utils.utils import ModuleInfo, time_to_str
 
 LOGGER: Final = logging.getLogger(__name__)
 
+# the availability data gets refreshed when it is older than this
+AVAILABILITY_REFRESH_INTERVAL: Final = 60
+# how often every worker checks whether the availability data is stale
+AVAILABILITY_CHECK_INTERVAL: Final = 5
+
 
 class AvailabilityDict(TypedDict):  # noqa: D101
     # pylint: disable=missing-class-docstring
@@ -52,6 +67,7 @@ def get_module_info() -> ModuleInfo:
         path="/betriebszeit",
         aliases=("/uptime",),
         keywords=("Uptime", "Betriebszeit", "Zeit"),
+        required_background_tasks=(update_availability_periodically,),
     )
 
 
@@ -103,6 +119,105 @@ async def get_availability_data(
     )
 
 
+@dataclass(slots=True, frozen=True)
+class AvailabilitySnapshot:
+    """The availability data at a point in time."""
+
+    up: int
+    down: int
+    timestamp: float
+
+    def is_fresh(self, now: float) -> bool:
+        """Return whether the snapshot doesn't need to be refreshed."""
+        return 0 <= now - self.timestamp < AVAILABILITY_REFRESH_INTERVAL
+
+    def serialize(self) -> str:
+        """Serialize the snapshot to be stored in Redis."""
+        return f"{self.up},{self.down},{self.timestamp}"
+
+
+def parse_availability_snapshot(
+    value: None | str,
+) -> None | AvailabilitySnapshot:
+    """Parse a snapshot stored in Redis."""
+    if not value:
+        return None
+    try:
+        up, down, timestamp = value.split(",")
+        return AvailabilitySnapshot(int(up), int(down), float(timestamp))
+    except ValueError:
+        LOGGER.warning("Invalid availability snapshot: %r", value)
+        return None
+
+
+AVAILABILITY_SNAPSHOT: None | AvailabilitySnapshot = None
+
+
+def get_cached_availability_data() -> None | tuple[int, int]:  # (up, down)
+    """Get the last availability data without waiting for Elasticsearch."""
+    if AVAILABILITY_SNAPSHOT is None:
+        return None
+    return AVAILABILITY_SNAPSHOT.up, AVAILABILITY_SNAPSHOT.down
+
+
+async def refresh_availability_snapshot(
+    app: Application,
+) -> None | AvailabilitySnapshot:
+    """Get a fresh availability snapshot, preferably from Redis.
+
+    Only one worker queries Elasticsearch and stores the result in Redis,
+    the others take the result from there.
+    """
+    redis = cast("Redis[str]", app.settings.get("REDIS"))
+    prefix: str = app.settings.get("REDIS_PREFIX", NAME).removesuffix("-dev")
+    key = f"{prefix}:availability"
+    now = time.time()
+    if EVENT_REDIS.is_set():
+        snapshot = parse_availability_snapshot(await redis.get(key))
+        if snapshot and snapshot.is_fresh(now):
+            return snapshot
+        if not await redis.set(
+            f"{key}:lock", "", ex=AVAILABILITY_REFRESH_INTERVAL, nx=True
+        ):
+            return snapshot  # another worker is refreshing it
+    if not EVENT_ELASTICSEARCH.is_set():
+        return None
+    data = await get_availability_data(
+        cast(AsyncElasticsearch, app.settings.get("ELASTICSEARCH"))
+    )
+    if not data:
+        return None
+    snapshot = AvailabilitySnapshot(*data, now)
+    if EVENT_REDIS.is_set():
+        await redis.set(key, snapshot.serialize())
+        await redis.delete(f"{key}:lock")
+    return snapshot
+
+
+async def update_availability_periodically(
+    app: Application, worker: int | None
+) -> None:
+    """Keep the availability snapshot of this worker up to date."""
+    # pylint: disable=global-statement
+    global AVAILABILITY_SNAPSHOT
+    del worker
+    while not EVENT_SHUTDOWN.is_set():  # pylint: disable=while-used
+        if AVAILABILITY_SNAPSHOT is None or not AVAILABILITY_SNAPSHOT.is_fresh(
+            time.time()
+        ):
+            try:
+                snapshot = await refresh_availability_snapshot(app)
+            except Exception:  # pylint: disable=broad-exception-caught
+                LOGGER.exception("Refreshing availability snapshot failed")
+            else:
+                if snapshot and (
+                    AVAILABILITY_SNAPSHOT is None
+                    or snapshot.timestamp > AVAILABILITY_SNAPSHOT.timestamp
+                ):
+                    AVAILABILITY_SNAPSHOT = snapshot
+        await asyncio.sleep(AVAILABILITY_CHECK_INTERVAL)
+
+
 def get_availability_dict(up: int, down: int) -> AvailabilityDict:
     """Get the availability data as a dict."""
     return {
@@ -154,11 +269,7 @@ class UptimeHandler(HTMLRequestHandler):
         self,
     ) -> dict[str, str | float | AvailabilityDict]:
         """Get uptime data."""
-        availability_data = (
-            await get_availability_data(self.elasticsearch)
-            if EVENT_ELASTICSEARCH.is_set()
-            else None
-        ) or (0, 0)
+        availability_data = get_cached_availability_data() or (0, 0)
         return {
             "uptime": (uptime := UPTIME.get()),
             "uptime_str": time_to_str(uptime),
@@ -176,9 +287,7 @@ class AvailabilityChartHandler(BaseRequestHandler):
     async def get(self, *, head: bool = False) -> None:
         """Handle GET requests."""
         if not (availability := self.get_argument("a", None)):
-            if not EVENT_ELASTICSEARCH.is_set():
-                raise HTTPError(503)
-            availability_data = await get_availability_data(self.elasticsearch)
+            availability_data = get_cached_availability_data()
             if not availability_data:
                 raise HTTPError(503)
             self.redirect(
@@ -0,0 +1,133 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A minimal asynchronous client for the search API of Elastic App Search."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any
+from urllib.parse import quote
+
+import orjson as json
+from tornado.httpclient import AsyncHTTPClient
+
+from .. import CA_BUNDLE_PATH
+
+
+class AppSearchClient:
+    """Search App Search engines without blocking the event loop.
+
+    The requests share the pooled keep-alive connections of the
+    AsyncHTTPClient. At most max_concurrency requests run at the same time,
+    identical requests running at the same time are combined and the results
+    are cached for cache_ttl seconds.
+    """
+
+    __slots__ = (
+        "_cache",
+        "_in_flight",
+        "_semaphore",
+        "bearer_auth",
+        "cache_size",
+        "cache_ttl",
+        "host",
+        "timeout",
+        "verify_certs",
+    )
+
+    _cache: OrderedDict[tuple[str, bytes], tuple[float, dict[str, Any]]]
+    _in_flight: dict[tuple[str, bytes], asyncio.Future[dict[str, Any]]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        host: str,
+        *,
+        bearer_auth: None | str = None,
+        verify_certs: bool = True,
+        max_concurrency: int = 8,
+        timeout: float = 5,
+        cache_ttl: float = 60,
+        cache_size: int = 256,
+    ) -> None:
+        """Initialize the client."""
+        self.host = host.rstrip("/")
+        self.bearer_auth = bearer_auth
+        self.verify_certs = verify_certs
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _request(self, engine_name: str, body: bytes) -> dict[str, Any]:
+        """Send a search request, waiting at most timeout seconds in total."""
+        async with asyncio.timeout(self.timeout), self._semaphore:
+            response = await AsyncHTTPClient().fetch(
+                f"{self.host}/api/as/v1/engines/{quote(engine_name)}/search",
+                method="POST",
+                headers={
+                    "Content-Type": "application/json",
+                    **(
+                        {"Authorization": f"Bearer {self.bearer_auth}"}
+                        if self.bearer_auth
+                        else {}
+                    ),
+                },
+                body=body,
+                ca_certs=CA_BUNDLE_PATH,
+                validate_cert=self.verify_certs,
+                connect_timeout=self.timeout,
+                request_timeout=self.timeout,
+            )
+        return json.loads(response.body)  # type: ignore[no-any-return]
+
+    async def search(
+        self, engine_name: str, body: Mapping[str, Any]
+    ) -> dict[str, Any]:
+        """Search an engine, the result must not be modified."""
+        key = engine_name, json.dumps(body, option=json.OPT_SORT_KEYS)
+        now = time.monotonic()
+        if (cached := self._cache.get(key)) and cached[0] > now:
+            self._cache.move_to_end(key)
+            return cached[1]
+        if future := self._in_flight.get(key):
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._request(engine_name, key[1])
+        except asyncio.CancelledError:
+            # don't cancel the requests waiting for this one
+            future.set_exception(ConnectionAbortedError(engine_name))
+            future.exception()  # don't warn if nobody else is waiting
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._in_flight[key]
+
+        if self.cache_ttl > 0:
+            cache = self._cache
+            cache[key] = now + self.cache_ttl, result
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:  # pylint: disable=while-used
+                cache.popitem(last=False)
+        return result
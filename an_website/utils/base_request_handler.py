@@ -29,6 +29,7 @@ from asyncio import Future
 from base64 import b64decode
 from collections.abc import Awaitable, Callable, Coroutine, Mapping
 from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone, tzinfo
 from functools import cached_property, partial, reduce
 from random import Random, choice as random_choice
@@ -74,10 +75,12 @@ from .. import (
 from .decorators import is_authorized
 from .options import ColourScheme, Options
 from .static_file_handling import FILE_HASHES_DICT, fix_static_path
+from .template_loader import LazyNamespace, TemplateLoader, get_template_names
 from .themes import THEMES
 from .utils import (
     ModuleInfo,
     Permission,
+    RatelimitRule,
     add_args_to_url,
     ansi_replace,
     apply,
@@ -87,7 +90,7 @@ from .utils import (
     geoip,
     hash_bytes,
     is_prime,
-    ratelimit,
+    ratelimit_many,
     str_to_bool,
 )
 
@@ -111,6 +114,31 @@ CLACKS_OVERHEADS = (
 
 request_ctx_var: ContextVar[HTTPServerRequest] = ContextVar("current_request")
 
+ANSI2HTML: Final[Callable[[str], str]] = partial(
+    reduce,
+    apply,
+    (
+        partial(
+            Ansi2HTMLConverter(inline=True, scheme="xterm").convert, full=False
+        ),
+        ansi_replace,
+        backspace_replace,
+    ),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class HeaderTemplate:
+    """The default headers that are the same for similar requests."""
+
+    # the Content-Security-Policy before and after the nonce
+    csp: tuple[str, str]
+    headers: tuple[tuple[str, str], ...]
+
+
+HEADER_TEMPLATES_MAX_COUNT: Final = 2**10
+HEADER_TEMPLATES: Final[dict[tuple[Any, ...], HeaderTemplate]] = {}
+
 
 class _RequestHandler(tornado.web.RequestHandler):
     """Base for Tornado request handlers."""
@@ -258,11 +286,42 @@ class _RequestHandler(tornado.web.RequestHandler):
         ):
             return
 
-        if self.request.method != "OPTIONS" and not await self.ratelimit(True):
-            await self.ratelimit()
+        if self.request.method != "OPTIONS":
+            await self.ratelimit(True, True)
+
+    def get_ratelimit_rule(self) -> None | RatelimitRule:
+        """Get the ratelimit of the bucket of this request handler."""
+        method = "GET" if self.request.method == "HEAD" else self.request.method
+        if not (limit := getattr(self, f"RATELIMIT_{method}_LIMIT", 0)):
+            return None
+        return RatelimitRule(
+            bucket=getattr(
+                self,
+                f"RATELIMIT_{method}_BUCKET",
+                self.__class__.__name__.lower(),
+            ),
+            max_burst=limit - 1,
+            count_per_period=getattr(  # request count per period
+                self,
+                f"RATELIMIT_{method}_COUNT_PER_PERIOD",
+                30,
+            ),
+            period=getattr(
+                self, f"RATELIMIT_{method}_PERIOD", 60  # period in seconds
+            ),
+            tokens=1 if self.request.method != "HEAD" else 0,
+        )
 
-    async def ratelimit(self, global_ratelimit: bool = False) -> bool:
-        """Take b1nzy to space using Redis."""
+    async def ratelimit(
+        self,
+        global_ratelimit: bool = False,
+        bucket_ratelimit: None | bool = None,
+    ) -> bool:
+        """Take b1nzy to space using Redis.
+
+        Without bucket_ratelimit only one of the ratelimits gets checked,
+        with both they get checked in one go.
+        """
         if (
             not self.settings.get("RATELIMITS")
             or self.request.method == "OPTIONS"
@@ -280,46 +339,32 @@ class _RequestHandler(tornado.web.RequestHandler):
             )
             raise HTTPError(503)
 
+        rules: list[RatelimitRule] = []
         if global_ratelimit:  # TODO: add to _RequestHandler
-            ratelimited, headers = await ratelimit(
-                self.redis,
-                self.redis_prefix,
-                str(self.request.remote_ip),
-                bucket=None,
-                max_burst=99,  # limit = 100
-                count_per_period=20,  # 20 requests per second
-                period=1,
-                tokens=10 if self.settings.get("UNDER_ATTACK") else 1,
-            )
-        else:
-            method = (
-                "GET" if self.request.method == "HEAD" else self.request.method
-            )
-            if not (limit := getattr(self, f"RATELIMIT_{method}_LIMIT", 0)):
-                return False
-            ratelimited, headers = await ratelimit(
-                self.redis,
-                self.redis_prefix,
-                str(self.request.remote_ip),
-                bucket=getattr(
-                    self,
-                    f"RATELIMIT_{method}_BUCKET",
-                    self.__class__.__name__.lower(),
-                ),
-                max_burst=limit - 1,
-                count_per_period=getattr(  # request count per period
-                    self,
-                    f"RATELIMIT_{method}_COUNT_PER_PERIOD",
-                    30,
-                ),
-                period=getattr(
-                    self, f"RATELIMIT_{method}_PERIOD", 60  # period in seconds
-                ),
-                tokens=1 if self.request.method != "HEAD" else 0,
+            rules.append(
+                RatelimitRule(
+                    bucket=None,
+                    max_burst=99,  # limit = 100
+                    count_per_period=20,  # 20 requests per second
+                    period=1,
+                    tokens=10 if self.settings.get("UNDER_ATTACK") else 1,
+                )
             )
+        if bucket_ratelimit is None:
+            bucket_ratelimit = not global_ratelimit
+        if bucket_ratelimit and (rule := self.get_ratelimit_rule()):
+            rules.append(rule)
+        if not rules:
+            return False
 
-        for header, value in headers.items():
-            self.set_header(header, value)
+        ratelimited = False
+        for ratelimited, headers in await ratelimit_many(
+            self.redis, self.redis_prefix, str(self.request.remote_ip), rules
+        ):
+            for header, value in headers.items():
+                self.set_header(header, value)
+            if ratelimited:
+                break
 
         if ratelimited:
             if self.now.date() == date(self.now.year, 4, 20):
@@ -730,31 +775,47 @@ class BaseRequestHandler(_RequestHandler):
         return f"{self.request.protocol}://{self.request.host}{endpoint}"
 
     @override
-    def get_template_namespace(self) -> dict[str, Any]:
+    def get_template_namespace(self) -> LazyNamespace:  # type: ignore[override]
         """
         Add useful things to the template namespace and return it.
 
         They are mostly needed by most of the pages (like title,
-        description and no_3rd_party).
+        description and no_3rd_party). Most of them are only computed
+        when a template uses them.
         """
-        namespace = super().get_template_namespace()
-        ansi2html = partial(
-            Ansi2HTMLConverter(inline=True, scheme="xterm").convert, full=False
+        namespace = LazyNamespace(super().get_template_namespace())
+        namespace.add_lazy(
+            **{
+                option.name: partial(option.get_value, self)
+                for option in self.user_settings.iter_options()
+            }
         )
-        namespace.update(self.user_settings.as_dict())
         namespace.update(
-            ansi2html=partial(
-                reduce, apply, (ansi2html, ansi_replace, backspace_replace)
-            ),
-            apm_script=(
+            ansi2html=ANSI2HTML,
+            description=self.description,
+            elastic_rum_url=self.ELASTIC_RUM_URL,
+            fix_static=lambda path: self.fix_url(fix_static_path(path)),
+            fix_url=self.fix_url,
+            GH_ORG_URL=GH_ORG_URL,
+            GH_PAGES_URL=GH_PAGES_URL,
+            GH_REPO_URL=GH_REPO_URL,
+            lang="de",  # TODO: add language support
+            nonce=self.nonce,
+            openmoji_version=OPENMOJI_VERSION,
+            settings=self.settings,
+            short_title=self.short_title,
+            title=self.title,
+        )
+        namespace.add_lazy(
+            apm_script=lambda: (
                 self.settings["ELASTIC_APM"].get("INLINE_SCRIPT")
                 if self.apm_enabled
                 else None
             ),
-            as_html=self.content_type == "text/html",
-            c=self.now.date() == date(self.now.year, 4, 1)
+            as_html=lambda: self.content_type == "text/html",
+            c=lambda: self.now.date() == date(self.now.year, 4, 1)
             or str_to_bool(self.get_cookie("c", "f") or "f", False),
-            canonical_url=self.request.protocol
+            canonical_url=lambda: self.request.protocol
             + "://"
             + (self.settings["DOMAIN"] or self.request.host)
             + self.fix_url(
@@ -764,13 +825,9 @@ class BaseRequestHandler(_RequestHandler):
             )
             .split("?")[0]
             .removesuffix("/"),
-            description=self.description,
-            display_theme=self.get_display_theme(),
-            display_scheme=self.get_display_scheme(),
-            elastic_rum_url=self.ELASTIC_RUM_URL,
-            fix_static=lambda path: self.fix_url(fix_static_path(path)),
-            fix_url=self.fix_url,
-            emoji2html=(
+            display_theme=self.get_display_theme,
+            display_scheme=self.get_display_scheme,
+            emoji2html=lambda: (
                 emoji2html
                 if self.user_settings.openmoji == "img"
                 else (
@@ -779,31 +836,22 @@ class BaseRequestHandler(_RequestHandler):
                     else (lambda emoji: f"<span>{emoji}</span>")
                 )
             ),
-            form_appendix=self.user_settings.get_form_appendix(),
-            GH_ORG_URL=GH_ORG_URL,
-            GH_PAGES_URL=GH_PAGES_URL,
-            GH_REPO_URL=GH_REPO_URL,
-            keywords="Asoziales Netzwerk, Känguru-Chroniken"
+            form_appendix=self.user_settings.get_form_appendix,
+            keywords=lambda: "Asoziales Netzwerk, Känguru-Chroniken"
             + (
                 f", {self.module_info.get_keywords_as_str(self.request.path)}"
                 if self.module_info  # type: ignore[truthy-bool]
                 else ""
             ),
-            lang="de",  # TODO: add language support
-            nonce=self.nonce,
-            now=self.now,
-            openmoji_version=OPENMOJI_VERSION,
-            settings=self.settings,
-            short_title=self.short_title,
-            testing=pytest_is_running(),
-            title=self.title,
+            now=lambda: self.now,
+            testing=pytest_is_running,
         )
-        namespace.update(
-            {
-                "🥚": timedelta()
+        namespace.add_lazy(
+            **{
+                "🥚": lambda: timedelta()
                 <= self.now.date() - easter(self.now.year)
                 < timedelta(days=2),
-                "🦘": is_prime(self.now.microsecond),
+                "🦘": lambda: is_prime(self.now.microsecond),
             }
         )
         return namespace
@@ -972,6 +1020,22 @@ class BaseRequestHandler(_RequestHandler):
 
     render.__doc__ = _RequestHandler.render.__doc__
 
+    @override
+    def render_string(self, template_name: str, **kwargs: Any) -> bytes:
+        """Generate the template with only the names it could use.
+
+        The values of the other names in the namespace aren't computed.
+        """
+        loader = self.settings.get("template_loader")
+        if not isinstance(loader, TemplateLoader):
+            return super().render_string(template_name, **kwargs)
+        template = loader.load(template_name)
+        namespace = self.get_template_namespace()
+        namespace.update(kwargs)
+        return template.generate(
+            **namespace.resolve(get_template_names(template))
+        )
+
     def set_content_type_header(self) -> None:
         """Set the Content-Type header based on `self.content_type`."""
         if str(self.content_type).startswith("text/"):  # RFC 2616 (3.7.1)
@@ -1015,11 +1079,9 @@ class BaseRequestHandler(_RequestHandler):
 
     set_cookie.__doc__ = _RequestHandler.set_cookie.__doc__
 
-    def set_csp_header(self) -> None:
-        """Set the Content-Security-Policy header."""
-        self.nonce = secrets.token_urlsafe(16)
-
-        script_src = ["'self'", f"'nonce-{self.nonce}'"]
+    def build_header_template(self) -> HeaderTemplate:
+        """Build the default headers that don't change between requests."""
+        script_src = ["'self'", "'nonce-'"]
 
         if (
             self.apm_enabled
@@ -1048,8 +1110,7 @@ class BaseRequestHandler(_RequestHandler):
             + f"://{self.request.host}"
         )
 
-        self.set_header(
-            "Content-Security-Policy",
+        csp_before_nonce, nonce_source, csp_after_nonce = (
             "default-src 'self';"
             f"script-src {' '.join(script_src)};"
             f"connect-src {' '.join(connect_src)};"
@@ -1065,66 +1126,132 @@ class BaseRequestHandler(_RequestHandler):
                 f"report-uri {self.get_reporting_api_endpoint()};"
                 if self.settings.get("REPORTING")
                 else ""
-            ),
-        )
+            )
+        ).partition("'nonce-")
 
-    @override
-    def set_default_headers(self) -> None:
-        """Set default headers."""
-        self.set_csp_header()
-        self.active_origin_trials = set()
+        headers: list[tuple[str, str | bytes]] = []
         if self.settings.get("REPORTING"):
             endpoint = self.get_reporting_api_endpoint()
-            self.set_header(
-                "Reporting-Endpoints",
-                f'default="{endpoint}"',  # noqa: B907
+            headers.append(
+                ("Reporting-Endpoints", f'default="{endpoint}"')  # noqa: B907
             )
-            self.set_header(
-                "Report-To",
-                json.dumps(
-                    {
-                        "group": "default",
-                        "max_age": 2592000,
-                        "endpoints": [{"url": endpoint}],
-                    },
-                    option=ORJSON_OPTIONS,
+            headers.append(
+                (
+                    "Report-To",
+                    json.dumps(
+                        {
+                            "group": "default",
+                            "max_age": 2592000,
+                            "endpoints": [{"url": endpoint}],
+                        },
+                        option=ORJSON_OPTIONS,
+                    ),
+                )
+            )
+            headers.append(("NEL", '{"report_to":"default","max_age":2592000}'))
+        headers.extend(
+            (
+                ("X-Content-Type-Options", "nosniff"),
+                ("Access-Control-Max-Age", "7200"),
+                ("Access-Control-Allow-Origin", "*"),
+                ("Access-Control-Allow-Headers", "*"),
+                (
+                    "Access-Control-Allow-Methods",
+                    ", ".join(self.get_allowed_methods()),
+                ),
+                ("Cross-Origin-Resource-Policy", "cross-origin"),
+                (
+                    "Permissions-Policy",
+                    "browsing-topics=(),"
+                    "identity-credentials-get=(),"
+                    "join-ad-interest-group=(),"
+                    "private-state-token-issuance=(),"
+                    "private-state-token-redemption=(),"
+                    "run-ad-auction=()",
+                ),
+                ("Referrer-Policy", "same-origin"),
+                (
+                    "Cross-Origin-Opener-Policy",
+                    "same-origin;report-to=default",
                 ),
             )
-            self.set_header("NEL", '{"report_to":"default","max_age":2592000}')
-        self.set_header("X-Content-Type-Options", "nosniff")
-        self.set_header("Access-Control-Max-Age", "7200")
-        self.set_header("Access-Control-Allow-Origin", "*")
-        self.set_header("Access-Control-Allow-Headers", "*")
-        self.set_header(
-            "Access-Control-Allow-Methods",
-            ", ".join(self.get_allowed_methods()),
-        )
-        self.set_header("Cross-Origin-Resource-Policy", "cross-origin")
-        self.set_header(
-            "Permissions-Policy",
-            "browsing-topics=(),"
-            "identity-credentials-get=(),"
-            "join-ad-interest-group=(),"
-            "private-state-token-issuance=(),"
-            "private-state-token-redemption=(),"
-            "run-ad-auction=()",
-        )
-        self.set_header("Referrer-Policy", "same-origin")
-        self.set_header(
-            "Cross-Origin-Opener-Policy", "same-origin;report-to=default"
         )
         if self.request.path == "/kaenguru-comics-alt":  # TODO: improve this
-            self.set_header(
-                "Cross-Origin-Embedder-Policy",
-                "credentialless;report-to=default",
+            headers.append(
+                (
+                    "Cross-Origin-Embedder-Policy",
+                    "credentialless;report-to=default",
+                )
             )
         else:
-            self.set_header(
-                "Cross-Origin-Embedder-Policy",
-                "require-corp;report-to=default",
+            headers.append(
+                (
+                    "Cross-Origin-Embedder-Policy",
+                    "require-corp;report-to=default",
+                )
             )
         if self.settings.get("HSTS"):
-            self.set_header("Strict-Transport-Security", "max-age=63072000")
+            headers.append(("Strict-Transport-Security", "max-age=63072000"))
+        headers.extend(
+            (
+                ("Accept-CH", "Sec-CH-Prefers-Reduced-Motion"),
+                ("Critical-CH", "Sec-CH-Prefers-Reduced-Motion"),
+                (
+                    "Vary",
+                    "Accept,Authorization,Cookie,Sec-CH-Prefers-Reduced-Motion",
+                ),
+            )
+        )
+
+        return HeaderTemplate(
+            (csp_before_nonce + nonce_source, csp_after_nonce),
+            tuple(
+                # pylint: disable-next=protected-access
+                (name, self._convert_header_value(value))
+                for name, value in headers
+            ),
+        )
+
+    def get_header_template(self) -> HeaderTemplate:
+        """Get the default headers that don't change between requests."""
+        apm_settings = self.settings.get("ELASTIC_APM", {})
+        key = (
+            type(self),
+            self.request.protocol,
+            self.request.host,
+            self.request.path == "/kaenguru-comics-alt",
+            self.settings.get("REPORTING"),
+            self.settings.get("REPORTING_ENDPOINT"),
+            self.settings.get("HSTS"),
+            apm_settings.get("ENABLED"),
+            apm_settings.get("INLINE_SCRIPT_HASH"),
+            apm_settings.get("SERVER_URL"),
+            apm_settings.get("RUM_SERVER_URL"),
+        )
+        if template := HEADER_TEMPLATES.get(key):
+            return template
+        if len(HEADER_TEMPLATES) >= HEADER_TEMPLATES_MAX_COUNT:
+            del HEADER_TEMPLATES[next(iter(HEADER_TEMPLATES))]
+        template = HEADER_TEMPLATES[key] = self.build_header_template()
+        return template
+
+    def set_csp_header(self) -> None:
+        """Set the Content-Security-Policy header."""
+        self.nonce = secrets.token_urlsafe(16)
+        csp_before_nonce, csp_after_nonce = self.get_header_template().csp
+        self.set_header(
+            "Content-Security-Policy",
+            f"{csp_before_nonce}{self.nonce}{csp_after_nonce}",
+        )
+
+    @override
+    def set_default_headers(self) -> None:
+        """Set default headers."""
+        self.set_csp_header()
+        self.active_origin_trials = set()
+        self._headers.update(  # pylint: disable=protected-access
+            self.get_header_template().headers
+        )
         if (
             onion_address := self.settings.get("ONION_ADDRESS")
         ) and not self.request.host_name.endswith(".onion"):
@@ -1148,11 +1275,6 @@ class BaseRequestHandler(_RequestHandler):
                 int(self.now_utc.microsecond) % len(CLACKS_OVERHEADS)
             ],
         )
-        self.set_header("Accept-CH", "Sec-CH-Prefers-Reduced-Motion")
-        self.set_header("Critical-CH", "Sec-CH-Prefers-Reduced-Motion")
-        self.set_header(
-            "Vary", "Accept,Authorization,Cookie,Sec-CH-Prefers-Reduced-Motion"
-        )
 
     set_default_headers.__doc__ = _RequestHandler.set_default_headers.__doc__
 
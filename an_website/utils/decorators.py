@@ -13,12 +13,14 @@
 
 """A module with useful decorators."""
 
-import contextlib
 import logging
+import time
 from base64 import b64decode
 from collections.abc import Callable, Mapping
 from functools import wraps
+from hashlib import blake2b
 from typing import Any, Final, ParamSpec, TypeVar, cast, overload
+from weakref import WeakKeyDictionary
 
 from tornado.web import RequestHandler
 
@@ -29,6 +31,43 @@ Default = TypeVar("Default")
 Args = ParamSpec("Args")
 Ret = TypeVar("Ret")
 
+VERIFIED_TOKENS_MAX_COUNT: Final = 2**12
+# (secret, digest of token) -> (permissions, valid until)
+VERIFIED_TOKENS: Final[
+    dict[tuple[str | bytes, bytes], tuple[Permission, float]]
+] = {}
+
+# handler -> allow_cookie_auth -> permissions
+REQUEST_PERMISSIONS: Final[
+    WeakKeyDictionary[RequestHandler, dict[bool, None | Permission]]
+] = WeakKeyDictionary()
+
+
+def get_token_permissions(
+    token: str, token_secret: str | bytes
+) -> None | Permission:
+    """Get the permissions of a valid token.
+
+    Verified tokens are cached until they expire.
+    """
+    key = (
+        token_secret,
+        blake2b(token.encode("UTF-8"), digest_size=16).digest(),
+    )
+    if cached := VERIFIED_TOKENS.get(key):
+        permissions, valid_until = cached
+        if time.time() <= valid_until:
+            return permissions
+        del VERIFIED_TOKENS[key]
+    try:
+        result = parse_token(token, secret=token_secret)
+    except InvalidTokenError:
+        return None
+    if len(VERIFIED_TOKENS) >= VERIFIED_TOKENS_MAX_COUNT:
+        del VERIFIED_TOKENS[next(iter(VERIFIED_TOKENS))]
+    VERIFIED_TOKENS[key] = result.permissions, result.valid_until.timestamp()
+    return result.permissions
+
 
 def keydecode(
     token: str,
@@ -46,8 +85,10 @@ def keydecode(
         tokens.append(decoded)
     if token_secret:
         for _ in tokens:
-            with contextlib.suppress(InvalidTokenError):
-                return parse_token(_, secret=token_secret).permissions
+            if (
+                permissions := get_token_permissions(_, token_secret)
+            ) is not None:
+                return permissions
     if decoded is None:
         return None
     return api_secrets.get(decoded)
@@ -59,6 +100,20 @@ def is_authorized(
     allow_cookie_auth: bool = True,
 ) -> None | bool:
     """Check whether the request is authorized."""
+    permissions = REQUEST_PERMISSIONS.setdefault(inst, {})
+    if allow_cookie_auth not in permissions:
+        permissions[allow_cookie_auth] = get_permissions(
+            inst, allow_cookie_auth
+        )
+    if (result := permissions[allow_cookie_auth]) is None:
+        return None
+    return permission in result
+
+
+def get_permissions(
+    inst: RequestHandler, allow_cookie_auth: bool = True
+) -> None | Permission:
+    """Get the permissions of the request, None if it has no credentials."""
     keys: dict[str | None, Permission] = inst.settings.get(
         "TRUSTED_API_SECRETS", {}
     )
@@ -98,7 +153,7 @@ def is_authorized(
         if perm:
             result |= perm
 
-    return permission in result
+    return result
 
 
 _DEFAULT_VALUE: Final = object()
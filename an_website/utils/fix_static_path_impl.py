@@ -16,11 +16,14 @@
 import logging
 import os
 from collections.abc import Callable, Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from importlib.resources.abc import Traversable
 from pathlib import Path
 from types import MappingProxyType
 from typing import Final
 
+import orjson as json
 from blake3 import blake3
 from openmoji_dist import VERSION as OPENMOJI_VERSION
 
@@ -29,6 +32,11 @@ if "STATIC_DIR" not in locals():
 
 LOGGER: Final = logging.getLogger(__name__)
 
+HASH_CHUNK_SIZE: Final = 1024**2
+
+# path -> (size, mtime in ns, hash)
+type HashManifest = Mapping[str, tuple[int, int, str]]
+
 
 def recurse_directory(
     root: Traversable,
@@ -51,25 +59,101 @@ def recurse_directory(
                 yield current
 
 
+def read_chunks(path: Traversable) -> Iterable[bytes]:
+    """Read a file in big chunks."""
+    with path.open("rb") as file:
+        yield from iter(partial(file.read, HASH_CHUNK_SIZE), b"")
+
+
 def hash_file(path: Traversable) -> str:
     """Hash a file with BLAKE3."""
     hasher = blake3()
-    with path.open("rb") as file:
-        for data in file:
-            hasher.update(data)
+    for data in read_chunks(path):
+        hasher.update(data)
     return hasher.hexdigest(8)
 
 
+def load_hash_manifest(manifest_path: Path) -> HashManifest:
+    """Load the hashes of a previous run."""
+    try:
+        manifest = json.loads(manifest_path.read_bytes())
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        LOGGER.warning("Ignoring invalid hash manifest %s", manifest_path)
+        return {}
+    return {path: tuple(entry) for path, entry in manifest.items()}
+
+
+def save_hash_manifest(manifest_path: Path, manifest: HashManifest) -> None:
+    """Atomically replace the hash manifest."""
+    try:
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(json.dumps(manifest))
+        os.replace(temp_path, manifest_path)
+    except OSError:
+        LOGGER.exception("Saving hash manifest %s failed", manifest_path)
+
+
+def hash_files(
+    root: Traversable,
+    paths: Iterable[str],
+    hash_fun: Callable[[Traversable], str],
+    manifest_path: Path | None = None,
+) -> dict[str, str]:
+    """Hash files in a thread pool.
+
+    If a manifest is given, the hashes of files whose size and mtime
+    didn't change since the last run are taken from it.
+    """
+    old_manifest = load_hash_manifest(manifest_path) if manifest_path else {}
+
+    def hash_path(path: str) -> tuple[int, int, str]:
+        file = root / path
+        if not isinstance(file, Path):
+            return -1, -1, hash_fun(file)
+        stat = file.stat()
+        entry = old_manifest.get(path)
+        if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            return entry
+        return stat.st_size, stat.st_mtime_ns, hash_fun(file)
+
+    paths = tuple(paths)
+    with ThreadPoolExecutor(thread_name_prefix="hash_files") as executor:
+        manifest = dict(zip(paths, executor.map(hash_path, paths)))
+
+    if manifest_path:
+        new_manifest = {
+            path: entry for path, entry in manifest.items() if entry[0] >= 0
+        }
+        if new_manifest != old_manifest:
+            save_hash_manifest(manifest_path, new_manifest)
+
+    return {path: entry[2] for path, entry in manifest.items()}
+
+
 def create_file_hashes_dict(
     filter_path_fun: Callable[[str], bool] | None = None,
+    manifest_path: Path | None = None,
 ) -> Mapping[str, str]:
     """Create a dict of file hashes."""
     static = Path("/static")
     file_hashes_dict = {
-        f"{(static / path).as_posix()}": hash_file(STATIC_DIR / path)
-        for path in recurse_directory(STATIC_DIR, lambda path: path.is_file())
-        if not path.endswith((".map", ".gz", ".zst"))
-        if filter_path_fun is None or filter_path_fun(path)
+        f"{(static / path).as_posix()}": hash_
+        for path, hash_ in hash_files(
+            STATIC_DIR,
+            (
+                path
+                for path in recurse_directory(
+                    STATIC_DIR, lambda path: path.is_file()
+                )
+                if not path.endswith((".map", ".gz", ".zst"))
+                if filter_path_fun is None or filter_path_fun(path)
+            ),
+            hash_file,
+            manifest_path,
+        ).items()
     }
     if filter_path_fun is None:
         file_hashes_dict["/favicon.png"] = file_hashes_dict[
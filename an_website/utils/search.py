@@ -11,11 +11,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Module used for easy and simple searching in O(n) complexity."""
+"""Module used for easy and simple searching."""
 
 import dataclasses
 from collections.abc import Callable, Iterable, Iterator, Sequence
-from typing import Generic, NoReturn, TypeVar
+from typing import Final, Generic, NoReturn, TypeVar
 
 import regex as re
 from typed_stream import Stream
@@ -24,6 +24,25 @@ T = TypeVar("T")
 U = TypeVar("U")
 V = TypeVar("V")
 
+# the InvertedIndex maps all substrings with up to this many chars to tokens
+GRAM_SIZE: Final = 3
+
+
+def get_tokens(field: str) -> set[str]:
+    """Get the tokens of a lower cased field."""
+    return set(
+        filter(None, re.split(r"\W+", field))
+    )  # pylint: disable=bad-builtin
+
+
+def get_grams(token: str) -> set[str]:
+    """Get all substrings of a token with up to GRAM_SIZE chars."""
+    return {
+        token[start : start + size]
+        for size in range(1, GRAM_SIZE + 1)
+        for start in range(len(token) - size + 1)
+    }
+
 
 class Query:
     """Class representing a query."""
@@ -150,3 +169,113 @@ def search(
         Stream(providers).flat_map(lambda x: x.search(query, excl_min_score)),
         key=lambda sv: sv.score,
     )
+
+
+class InvertedIndex(Generic[T]):
+    """Index the tokens of documents to search them without looking at all.
+
+    A search yields the same scores as DataProvider.search, because a query
+    word is a substring of a field exactly if it is a substring of a token.
+    """
+
+    __slots__ = ("_documents", "_grams", "_postings")
+
+    _documents: dict[T, tuple[str, ...]]
+    # substrings with up to GRAM_SIZE chars -> the tokens containing them
+    _grams: dict[str, set[str]]
+    # token -> document -> bit mask of the fields containing the token
+    _postings: dict[str, dict[T, int]]
+
+    def __contains__(self, key: object) -> bool:
+        """Return whether a document is in the index."""
+        return key in self._documents
+
+    def __init__(self) -> None:
+        """Initialize this."""
+        self._documents = {}
+        self._grams = {}
+        self._postings = {}
+
+    def __len__(self) -> int:
+        """Return the number of documents."""
+        return len(self._documents)
+
+    def add(self, key: T, fields: str | tuple[str, ...]) -> None:
+        """Add a document or replace the fields of it."""
+        fields = (
+            (fields.lower(),)
+            if isinstance(fields, str)
+            else tuple(map(str.lower, fields))  # pylint: disable=bad-builtin
+        )
+        if self._documents.get(key) == fields:
+            return
+        self.discard(key)
+        self._documents[key] = fields
+        for index, field in enumerate(fields):
+            for token in get_tokens(field):
+                if (postings := self._postings.get(token)) is None:
+                    postings = self._postings[token] = {}
+                    for gram in get_grams(token):
+                        self._grams.setdefault(gram, set()).add(token)
+                postings[key] = postings.get(key, 0) | 1 << index
+
+    def discard(self, key: T) -> None:
+        """Remove a document if it is in the index."""
+        if (fields := self._documents.pop(key, None)) is None:
+            return
+        for token in set().union(*map(get_tokens, fields)):
+            postings = self._postings[token]
+            del postings[key]
+            if postings:
+                continue
+            del self._postings[token]
+            for gram in get_grams(token):
+                tokens = self._grams[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self._grams[gram]
+
+    def get_matching_tokens(self, word: str) -> Iterable[str]:
+        """Get all tokens containing the word."""
+        if len(word) <= GRAM_SIZE:
+            return self._grams.get(word, ())
+        candidates = min(
+            (
+                self._grams.get(word[start : start + GRAM_SIZE], set())
+                for start in range(len(word) - GRAM_SIZE + 1)
+            ),
+            key=len,
+        )
+        return [token for token in candidates if word in token]
+
+    def search(
+        self, query: Query, excl_min_score: float = 0.0
+    ) -> Iterator[ScoredValue[T]]:
+        """Search the documents containing at least one word of the query."""
+        masks_by_word: dict[str, dict[T, int]] = {}
+        for word in query.words:
+            if word in masks_by_word:
+                continue
+            masks: dict[T, int] = {}
+            for token in self.get_matching_tokens(word):
+                for key, mask in self._postings[token].items():
+                    masks[key] = masks.get(key, 0) | mask
+            masks_by_word[word] = masks
+
+        for key in set().union(*masks_by_word.values()):
+            fields = self._documents[key]
+            score: float
+            if all(key in masks for masks in masks_by_word.values()) and any(
+                query.query in field for field in fields
+            ):
+                score = 1.0
+            else:
+                score = sum(
+                    (
+                        masks_by_word[word].get(key, 0).bit_count()
+                        * (len(word) / query.words_len)
+                    )
+                    for word in query.words
+                ) / len(fields)
+            if score > excl_min_score:
+                yield ScoredValue(score, key)
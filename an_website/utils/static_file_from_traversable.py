@@ -18,7 +18,10 @@ import contextlib
 import logging
 import sys
 from collections.abc import Awaitable, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from functools import lru_cache
 from importlib.resources.abc import Traversable
+from pathlib import Path
 from types import MappingProxyType
 from typing import Any, Final, Literal, override
 from urllib.parse import urlsplit, urlunsplit
@@ -27,8 +30,6 @@ from tornado import httputil, iostream
 from tornado.web import GZipContentEncoding, HTTPError
 from typed_stream import Stream
 
-from an_website.utils.utils import size_of_file
-
 from .base_request_handler import _RequestHandler
 from .static_file_handling import content_type_from_path
 
@@ -45,11 +46,95 @@ REVERSE_ENCODINGS_MAP: Mapping[Encoding, str] = {
     value: key for key, value in ENCODINGS
 }
 
+# files up to this size are kept in memory
+MAX_CACHED_CONTENT_SIZE: Final = 64 * 1024
+# bigger files are read in chunks of this size
+CHUNK_SIZE: Final = 256 * 1024
+
+
+@dataclass(frozen=True, slots=True)
+class StaticFile:
+    """A file with its size and, if it is small, its content."""
+
+    file: Traversable
+    size: int
+    content: None | bytes = None
+
+
+@dataclass(frozen=True, slots=True)
+class StaticAsset:
+    """A static file with its content type and its compressed variants."""
+
+    content_type: None | str
+    files: Mapping[None | Encoding, StaticFile]
+
+
+def load_static_file(file: Traversable) -> StaticFile:
+    """Load the size and, if it is small, the content of a file."""
+    if isinstance(file, Path):
+        size = file.stat().st_size
+        if size > MAX_CACHED_CONTENT_SIZE:
+            return StaticFile(file, size)
+    content = file.read_bytes()
+    if len(content) > MAX_CACHED_CONTENT_SIZE:
+        return StaticFile(file, len(content))
+    return StaticFile(file, len(content), content)
+
+
+def load_static_asset(root: Traversable, path: str) -> None | StaticAsset:
+    """Load a static file and its compressed variants."""
+    file = root / path
+    if not file.is_file():
+        return None
+    files: dict[None | Encoding, StaticFile] = {None: load_static_file(file)}
+    for _, encoding in ENCODINGS:
+        if (compressed := root / f"{path}.{encoding}").is_file():
+            files[encoding] = load_static_file(compressed)
+    return StaticAsset(
+        content_type_from_path(path, file), MappingProxyType(files)
+    )
+
+
+STATIC_ASSETS_MAX_COUNT: Final = 2**14
+# only existing assets are cached, so requests for random paths can't
+# push them out of the cache
+STATIC_ASSETS: Final[dict[tuple[Traversable, str], StaticAsset]] = {}
+
+
+def get_static_asset(root: Traversable, path: str) -> None | StaticAsset:
+    """Get a static asset, caching it if it exists."""
+    key = (root, path)
+    if asset := STATIC_ASSETS.pop(key, None):
+        # move it to the end, so the least recently used asset gets removed
+        STATIC_ASSETS[key] = asset
+        return asset
+    if not (asset := load_static_asset(root, path)):
+        return None
+    if len(STATIC_ASSETS) >= STATIC_ASSETS_MAX_COUNT:
+        del STATIC_ASSETS[next(iter(STATIC_ASSETS))]
+    STATIC_ASSETS[key] = asset
+    return asset
+
+
+@lru_cache(2**8)
+def parse_accept_encoding(header: str) -> tuple[Encoding, ...]:
+    """Get the supported encodings accepted by the client, better first."""
+    accepted_encodings: frozenset[str] = (
+        Stream(header.split(","))
+        .map(lambda string: string.split(";")[0])  # ignore quality specs
+        .map(str.strip)
+        .collect(frozenset)
+    )
+    return tuple(
+        encoding for key, encoding in ENCODINGS if key in accepted_encodings
+    )
+
 
 class TraversableStaticFileHandler(_RequestHandler):
     """A static file handler for the Traversable abc."""
 
     root: Traversable
+    cache: bool = True
     file_hashes: Mapping[str, str] = {}
     headers: Iterable[tuple[str, str]] = ()
 
@@ -68,10 +153,10 @@ class TraversableStaticFileHandler(_RequestHandler):
         if path.startswith("/") or ".." in path.split("/") or "//" in path:
             raise HTTPError(404)
 
-        absolute_path, encoding = self.get_absolute_path_encoded(path)
+        asset = self.get_asset(path)
 
-        if not absolute_path.is_file():
-            if self.get_absolute_path(path.lower()).is_file():
+        if not asset:
+            if self.get_asset(path.lower()):
                 if self.request.path.endswith(path):
                     self.replace_path_with_redirect(
                         self.request.path.removesuffix(path) + path.lower()
@@ -84,12 +169,12 @@ class TraversableStaticFileHandler(_RequestHandler):
 
         self.set_header("Accept-Ranges", "bytes")
 
+        encoding, file = self.get_encoded_file(asset)
+
         if encoding:
             self.set_header("Content-Encoding", REVERSE_ENCODINGS_MAP[encoding])
-        if content_type := self.get_content_type(
-            path, self.get_absolute_path(path)
-        ):
-            self.set_header("Content-Type", content_type)
+        if asset.content_type:
+            self.set_header("Content-Type", asset.content_type)
         del path
 
         request_range = None
@@ -100,7 +185,7 @@ class TraversableStaticFileHandler(_RequestHandler):
             # pylint: disable-next=protected-access
             request_range = httputil._parse_request_range(range_header)
 
-        size: int = size_of_file(absolute_path)
+        size = file.size
 
         if request_range:
             start, end = request_range
@@ -147,7 +232,13 @@ class TraversableStaticFileHandler(_RequestHandler):
             await self.finish()
             return
 
-        for chunk in self.get_content(absolute_path, start=start, end=end):
+        if file.content is not None:
+            self.write(file.content[start:end])
+            with contextlib.suppress(iostream.StreamClosedError):
+                await self.finish()
+            return
+
+        for chunk in self.get_content(file.file, start=start, end=end):
             self.write(chunk)
             try:
                 await self.flush()
@@ -164,39 +255,28 @@ class TraversableStaticFileHandler(_RequestHandler):
         with contextlib.suppress(iostream.StreamClosedError):
             await self.finish()
 
-    def get_absolute_path(self, path: str) -> Traversable:
-        """Get the absolute path of a file."""
-        return self.root / path
+    def get_asset(self, path: str) -> None | StaticAsset:
+        """Get the static asset at the path."""
+        if self.cache and not sys.flags.dev_mode:
+            return get_static_asset(self.root, path)
+        return load_static_asset(self.root, path)
 
-    def get_absolute_path_encoded(
-        self, path: str
-    ) -> tuple[Traversable, Encoding | None]:
-        """Get the absolute path and the encoding."""
+    def get_encoded_file(
+        self, asset: StaticAsset
+    ) -> tuple[Encoding | None, StaticFile]:
+        """Get the best variant of the asset accepted by the client."""
         for transform in self._transforms:
             if isinstance(transform, GZipContentEncoding):
                 # pylint: disable=protected-access
                 transform._gzipping = False
 
-        accepted_encodings: frozenset[str] = (
-            Stream(self.request.headers.get_list("Accept-Encoding"))
-            .flat_map(str.split, ",")
-            .map(lambda string: string.split(";")[0])  # ignore quality specs
-            .map(str.strip)
-            .collect(frozenset)
-        )
-
-        absolute_path = self.get_absolute_path(path)
-        encoding: Encoding | None = None
-
-        for key, encoding in ENCODINGS:
-            if key in accepted_encodings:
-                compressed_path = self.get_absolute_path(f"{path}.{encoding}")
-                if compressed_path.is_file():
-                    absolute_path = compressed_path
-                    break
-            encoding = None  # pylint: disable=redefined-loop-name
+        for encoding in parse_accept_encoding(
+            ",".join(self.request.headers.get_list("Accept-Encoding"))
+        ):
+            if file := asset.files.get(encoding):
+                return encoding, file
 
-        return absolute_path, encoding
+        return None, asset.files[None]
 
     @classmethod
     def get_content(
@@ -214,7 +294,7 @@ class TraversableStaticFileHandler(_RequestHandler):
             )
 
             while True:  # pylint: disable=while-used
-                chunk_size = 64 * 1024
+                chunk_size = CHUNK_SIZE
                 if remaining is not None and remaining < chunk_size:
                     chunk_size = remaining
                 chunk = file.read(chunk_size)
@@ -226,13 +306,6 @@ class TraversableStaticFileHandler(_RequestHandler):
                     assert not remaining
                     return
 
-    @classmethod
-    def get_content_type(
-        cls, path: str, absolute_path: Traversable
-    ) -> str | None:
-        """Get the content-type of a file."""
-        return content_type_from_path(path, absolute_path)
-
     def head(self, path: str) -> Awaitable[None]:
         """Handle HEAD requests for files in the static file directory."""
         return self.get(path, head=True)
@@ -242,9 +315,11 @@ class TraversableStaticFileHandler(_RequestHandler):
         root: Traversable,
         hashes: Mapping[str, str] = MappingProxyType({}),
         headers: Iterable[tuple[str, str]] = (),
+        cache: bool = True,
     ) -> None:
         """Initialize this handler with a root directory and file hashes."""
         self.root = root
+        self.cache = cache
         self.file_hashes = hashes
         self.headers = headers
         for name, value in headers:
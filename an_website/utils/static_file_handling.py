@@ -27,7 +27,7 @@ import orjson as json
 import tornado.web
 from openmoji_dist import get_openmoji_data
 
-from .. import DIR as ROOT_DIR, STATIC_DIR
+from .. import CACHE_DIR, DIR as ROOT_DIR, STATIC_DIR
 from .fix_static_path_impl import (
     create_file_hashes_dict,
     fix_static_path_impl,
@@ -36,7 +36,9 @@ from .utils import Handler
 
 LOGGER: Final = logging.getLogger(__name__)
 
-FILE_HASHES_DICT: Final[Mapping[str, str]] = create_file_hashes_dict()
+FILE_HASHES_DICT: Final[Mapping[str, str]] = create_file_hashes_dict(
+    manifest_path=CACHE_DIR / "static-file-hashes-blake3.json"
+)
 
 CONTENT_TYPES: Final[Mapping[str, str]] = json.loads(
     (ROOT_DIR / "vendored" / "media-types.json").read_bytes()
@@ -14,12 +14,95 @@
 """A Tornado template loader."""
 
 import os.path
+from collections.abc import (
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+)
+from functools import lru_cache
 from importlib.resources.abc import Traversable
-from typing import override
+from types import CodeType, MappingProxyType
+from typing import Any, override
 
 from tornado.template import BaseLoader, Template
 
 
+class LazyNamespace(MutableMapping[str, Any]):
+    """A template namespace with values computed on first access."""
+
+    __slots__ = ("_factories", "_values")
+
+    _factories: dict[str, Callable[[], Any]]
+    _values: dict[str, Any]
+
+    def __init__(
+        self, values: Mapping[str, Any] = MappingProxyType({})
+    ) -> None:
+        """Initialize the namespace with already computed values."""
+        self._factories = {}
+        self._values = dict(values)
+
+    def __contains__(self, key: object) -> bool:
+        """Check whether the name is in the namespace without computing it."""
+        return key in self._values or key in self._factories
+
+    def __delitem__(self, key: str) -> None:
+        """Remove a value or its factory."""
+        if key in self._factories:
+            del self._factories[key]
+        else:
+            del self._values[key]
+
+    def __getitem__(self, key: str) -> Any:
+        """Get a value and compute it if needed."""
+        if key in self._values:
+            return self._values[key]
+        value = self._values[key] = self._factories.pop(key)()
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names in the namespace."""
+        yield from self._values
+        yield from self._factories
+
+    def __len__(self) -> int:
+        """Return the number of names in the namespace."""
+        return len(self._values) + len(self._factories)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        """Set a value."""
+        self._factories.pop(key, None)
+        self._values[key] = value
+
+    def add_lazy(self, **factories: Callable[[], Any]) -> None:
+        """Add values that get computed when they're needed."""
+        for key in factories:
+            self._values.pop(key, None)
+        self._factories.update(factories)
+
+    def resolve(self, names: Iterable[str]) -> dict[str, Any]:
+        """Compute the values of the names that are in this namespace."""
+        return {name: self[name] for name in names if name in self}
+
+
+def get_code_names(code: CodeType) -> Iterable[str]:
+    """Get the names and string constants used in compiled code."""
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, str):
+            yield const  # for things like globals()["🦘"]
+        elif isinstance(const, CodeType):
+            yield from get_code_names(const)
+
+
+@lru_cache(2**8)
+def get_template_names(template: Template) -> frozenset[str]:
+    """Get the names that could be used by a template."""
+    return frozenset(get_code_names(template.compiled))
+
+
 class TemplateLoader(BaseLoader):
     """A Tornado template loader."""
 
@@ -18,6 +18,7 @@ import asyncio
 import bisect
 import contextlib
 import logging
+import math
 import random
 import sys
 import time
@@ -29,12 +30,13 @@ from collections.abc import (
     Generator,
     Iterable,
     Mapping,
+    Sequence,
     Set,
 )
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import IntFlag
-from functools import cache, partial
+from functools import cache, lru_cache, partial
 from hashlib import sha1
 from importlib.resources.abc import Traversable
 from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
@@ -584,13 +586,25 @@ def hash_ip(
     address: None | str | IPv4Address | IPv6Address, size: int = 32
 ) -> str:
     """Hash an IP address."""
-    if isinstance(address, str):
-        address = ip_address(address)
     if IP_HASH_SALT["date"] != (date := datetime.now(timezone.utc).date()):
         IP_HASH_SALT["hasher"] = blake3(
             blake3(date.isoformat().encode("ASCII")).digest()
         )
         IP_HASH_SALT["date"] = date
+        hash_ip_with_salt.cache_clear()
+    return hash_ip_with_salt(address, size)
+
+
+@lru_cache(2**12)
+def hash_ip_with_salt(
+    address: None | str | IPv4Address | IPv6Address, size: int
+) -> str:
+    """Hash an IP address with the current salt.
+
+    The cache has to be cleared when the salt changes.
+    """
+    if isinstance(address, str):
+        address = ip_address(address)
     return hash_bytes(
         address.packed if address else b"",
         hasher=IP_HASH_SALT["hasher"].copy(),  # type: ignore[attr-defined]
@@ -598,6 +612,12 @@ def hash_ip(
     )
 
 
+@lru_cache(2**14)
+def hash_ratelimit_key(key: str) -> str:
+    """Hash an IP address or a bucket name for the ratelimits."""
+    return hash_bytes(key.encode("ASCII"))
+
+
 def is_in_european_union(ip: None | str) -> None | bool:
     """Return whether the specified address is in the EU."""
     if not (ip and (info := geolite2.lookup(ip))):
@@ -679,39 +699,203 @@ async def ratelimit(
     tokens: int,
 ) -> tuple[bool, dict[str, str]]:
     """Take b1nzy to space using Redis."""
-    remote_ip = hash_bytes(remote_ip.encode("ASCII"))
-    key = f"{redis_prefix}:ratelimit:{remote_ip}"
-    if bucket:
-        key = f"{key}:{bucket}"
+    [result] = await ratelimit_many(
+        redis,
+        redis_prefix,
+        remote_ip,
+        (RatelimitRule(bucket, max_burst, count_per_period, period, tokens),),
+    )
+    return result
 
-    # see: https://github.com/brandur/redis-cell#usage
-    result = await redis.execute_command(
-        # type: ignore[no-untyped-call]
-        "CL.THROTTLE",
-        key,
-        max_burst,
-        count_per_period,
-        period,
-        tokens,
+
+type ThrottleResult = tuple[int, int, int, int, int]
+
+
+@dataclass(frozen=True, slots=True)
+class RatelimitRule:
+    """The arguments of CL.THROTTLE for one ratelimit."""
+
+    bucket: None | str
+    max_burst: int
+    count_per_period: int
+    period: int
+    tokens: int
+
+
+@dataclass(slots=True)
+class RatelimitLease:
+    """Tokens taken from Redis in advance and the last state of a ratelimit."""
+
+    tokens: int
+    limit: int
+    remaining: int
+    reset_after: int
+    synced: float
+    blocked_until: float = 0
+
+    def take(
+        self, tokens: int, now: float, max_age: float
+    ) -> None | ThrottleResult:
+        """Take tokens without Redis, return None if Redis is needed."""
+        elapsed = now - self.synced
+        reset_after = max(0, math.ceil(self.reset_after - elapsed))
+        if tokens and now < self.blocked_until:
+            retry_after = math.ceil(self.blocked_until - now)
+            return 1, self.limit, 0, retry_after, reset_after
+        if elapsed > max_age or tokens > self.tokens:
+            return None
+        self.tokens -= tokens
+        return 0, self.limit, self.remaining + self.tokens, -1, reset_after
+
+    def get_tokens_to_lease(self) -> int:
+        """Get how many tokens to take from Redis in advance."""
+        if self.blocked_until or self.remaining <= self.limit // 2:
+            return 0
+        return min(RATELIMIT_LEASE_MAX_TOKENS, self.remaining // 4)
+
+
+RATELIMIT_LEASE_MAX_AGE: Final = 60
+RATELIMIT_LEASE_MAX_TOKENS: Final = 10
+RATELIMIT_LEASES_MAX_COUNT: Final = 2**16
+RATELIMIT_LEASES: Final[dict[str, RatelimitLease]] = {}
+
+
+def store_ratelimit_lease(
+    key: str, result: ThrottleResult, leased: int, now: float
+) -> ThrottleResult:
+    """Store the result of CL.THROTTLE and return it for the request."""
+    limited, limit, remaining, retry_after, reset_after = result
+    if len(RATELIMIT_LEASES) >= RATELIMIT_LEASES_MAX_COUNT:
+        for old_key, lease in tuple(RATELIMIT_LEASES.items()):
+            if now - lease.synced > RATELIMIT_LEASE_MAX_AGE:
+                del RATELIMIT_LEASES[old_key]
+        if len(RATELIMIT_LEASES) >= RATELIMIT_LEASES_MAX_COUNT:
+            RATELIMIT_LEASES.clear()
+    RATELIMIT_LEASES[key] = RatelimitLease(
+        tokens=0 if limited else leased,
+        limit=limit,
+        remaining=remaining,
+        reset_after=reset_after,
+        synced=now,
+        blocked_until=now + retry_after if limited else 0,
     )
+    if limited:
+        return result
+    return limited, limit, remaining + leased, retry_after, reset_after
 
-    now = time.time()
 
-    headers: dict[str, str] = {}
+async def throttle(
+    redis: Redis[str], commands: Iterable[tuple[str, RatelimitRule, int]]
+) -> list[ThrottleResult]:
+    """Call CL.THROTTLE with (key, rule, tokens), pipelined if needed."""
+    # see: https://github.com/brandur/redis-cell#usage
+    arguments = [
+        (
+            "CL.THROTTLE",
+            key,
+            rule.max_burst,
+            rule.count_per_period,
+            rule.period,
+            tokens,
+        )
+        for key, rule, tokens in commands
+    ]
+    if len(arguments) == 1:
+        return [await redis.execute_command(*arguments[0])]
+    async with redis.pipeline(transaction=False) as pipe:
+        for args in arguments:
+            pipe.execute_command(*args)
+        return await pipe.execute()  # type: ignore[no-any-return]
 
-    if result[0]:
-        headers["Retry-After"] = str(result[3])
-        if not bucket:
-            headers["X-RateLimit-Global"] = "true"
 
-    if bucket:
-        headers["X-RateLimit-Limit"] = str(result[1])
-        headers["X-RateLimit-Remaining"] = str(result[2])
-        headers["X-RateLimit-Reset"] = str(now + result[4])
-        headers["X-RateLimit-Reset-After"] = str(result[4])
-        headers["X-RateLimit-Bucket"] = hash_bytes(bucket.encode("ASCII"))
+async def ratelimit_many(
+    redis: Redis[str],
+    redis_prefix: str,
+    remote_ip: str,
+    rules: Sequence[RatelimitRule],
+) -> list[tuple[bool, dict[str, str]]]:
+    """Take b1nzy to space, only using Redis if needed.
+
+    While a client is far away from a limit, a few tokens are taken from Redis
+    in advance and used by the following requests of the client to this
+    worker. Redis already counted them, so no limit can be exceeded.
+    """
+    remote_ip = hash_ratelimit_key(remote_ip)
+    keys = [
+        (
+            f"{redis_prefix}:ratelimit:{remote_ip}:{rule.bucket}"
+            if rule.bucket
+            else f"{redis_prefix}:ratelimit:{remote_ip}"
+        )
+        for rule in rules
+    ]
+    now = time.monotonic()
+    results: list[None | ThrottleResult] = [
+        (
+            lease.take(
+                rule.tokens, now, min(rule.period, RATELIMIT_LEASE_MAX_AGE)
+            )
+            if (lease := RATELIMIT_LEASES.get(key))
+            else None
+        )
+        for key, rule in zip(keys, rules, strict=True)
+    ]
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    leased = {
+        index: (
+            lease.get_tokens_to_lease()
+            if (lease := RATELIMIT_LEASES.get(keys[index]))
+            else 0
+        )
+        for index in missing
+    }
+    retry: list[int] = []
+    if missing:
+        responses = await throttle(
+            redis,
+            [
+                (keys[index], rules[index], rules[index].tokens + leased[index])
+                for index in missing
+            ],
+        )
+        for index, response in zip(missing, responses, strict=True):
+            if response[0] and leased[index]:
+                retry.append(index)  # it may work without the extra tokens
+            else:
+                results[index] = store_ratelimit_lease(
+                    keys[index], response, leased[index], now
+                )
+    if retry:
+        responses = await throttle(
+            redis,
+            [
+                (keys[index], rules[index], rules[index].tokens)
+                for index in retry
+            ],
+        )
+        for index, response in zip(retry, responses, strict=True):
+            results[index] = store_ratelimit_lease(
+                keys[index], response, 0, now
+            )
 
-    return bool(result[0]), headers
+    timestamp = time.time()
+    return_value: list[tuple[bool, dict[str, str]]] = []
+    for rule, result in zip(rules, results, strict=True):
+        assert result
+        headers: dict[str, str] = {}
+        if result[0]:
+            headers["Retry-After"] = str(result[3])
+            if not rule.bucket:
+                headers["X-RateLimit-Global"] = "true"
+        if rule.bucket:
+            headers["X-RateLimit-Limit"] = str(result[1])
+            headers["X-RateLimit-Remaining"] = str(result[2])
+            headers["X-RateLimit-Reset"] = str(timestamp + result[4])
+            headers["X-RateLimit-Reset-After"] = str(result[4])
+            headers["X-RateLimit-Bucket"] = hash_ratelimit_key(rule.bucket)
+        return_value.append((bool(result[0]), headers))
+    return return_value
 
 
 def remove_suffix_ignore_case(string: str, suffix: str) -> str:
@@ -14,12 +14,17 @@
 """The version page of the website."""
 
 from ctypes import c_char
+from importlib.resources.abc import Traversable
 from multiprocessing import Array
 
 from Crypto.Hash import RIPEMD160
 
-from .. import DIR as ROOT_DIR, VERSION
-from ..utils.fix_static_path_impl import recurse_directory
+from .. import CACHE_DIR, DIR as ROOT_DIR, VERSION
+from ..utils.fix_static_path_impl import (
+    hash_files,
+    read_chunks,
+    recurse_directory,
+)
 from ..utils.request_handler import APIRequestHandler, HTMLRequestHandler
 from ..utils.utils import ModuleInfo
 
@@ -47,14 +52,30 @@ def hash_bytes(data: bytes) -> str:
     return RIPEMD160.new(data).digest().decode("BRAILLE")
 
 
+def hash_file(path: Traversable) -> str:
+    """Hash a file with BRAILLEMD-160."""
+    hasher = RIPEMD160.new()
+    for data in read_chunks(path):
+        hasher.update(data)
+    return hasher.digest().decode("BRAILLE")
+
+
 def hash_all_files() -> str:
     """Hash all files."""
     return "\n".join(
-        f"{hash_bytes((ROOT_DIR / path).read_bytes())} {path}"
-        for path in sorted(
-            recurse_directory(ROOT_DIR, lambda path: path.is_file())
-        )
-        if "__pycache__" not in path.split("/")
+        f"{hash_} {path}"
+        for path, hash_ in hash_files(
+            ROOT_DIR,
+            (
+                path
+                for path in sorted(
+                    recurse_directory(ROOT_DIR, lambda path: path.is_file())
+                )
+                if "__pycache__" not in path.split("/")
+            ),
+            hash_file,
+            CACHE_DIR / "file-hashes-ripemd160.json",
+        ).items()
     )
 
 
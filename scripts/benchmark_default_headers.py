@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Measure setting the default headers of every request.
+
+Usage: benchmark_default_headers.py [request count]
+"""
+
+import sys
+import time
+from collections.abc import Callable, Sequence
+from os.path import dirname, normpath
+from typing import Final
+
+from tornado.httputil import HTTPHeaders, HTTPServerRequest
+from tornado.web import Application
+
+REPO_ROOT: Final[str] = dirname(dirname(normpath(__file__)))
+
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable-next=wrong-import-position
+from an_website.utils.base_request_handler import (  # noqa: E402
+    HEADER_TEMPLATES,
+    BaseRequestHandler,
+)
+
+# pylint: disable-next=wrong-import-position
+from an_website.utils.utils import ModuleInfo  # noqa: E402
+
+PATHS: Final = ("/", "/zitate", "/api/zitate", "/suche", "/betriebszeit")
+
+
+class Connection:
+    """A connection that doesn't send anything."""
+
+    def set_close_callback(self, callback: None | Callable[[], None]) -> None:
+        """Ignore the callback."""
+
+
+def create_handlers(
+    app: Application, request_count: int
+) -> Sequence[BaseRequestHandler]:
+    """Create a handler for every request."""
+    module_info = ModuleInfo("Benchmark", "Benchmark")
+    return [
+        BaseRequestHandler(
+            app,
+            HTTPServerRequest(
+                "GET",
+                PATHS[i % len(PATHS)],
+                headers=HTTPHeaders({"Host": "asozial.org"}),
+                connection=Connection(),
+            ),
+            module_info=module_info,
+        )
+        for i in range(request_count)
+    ]
+
+
+def benchmark(handlers: Sequence[BaseRequestHandler], *, cached: bool) -> float:
+    """Set the default headers for all requests and return the mean time."""
+    start = time.perf_counter()
+    for handler in handlers:
+        if not cached:
+            HEADER_TEMPLATES.clear()
+        handler.clear()  # calls set_default_headers
+    return (time.perf_counter() - start) / len(handlers)
+
+
+def main() -> int | str:
+    """Run the benchmark."""
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    if request_count < 1:
+        return "The request count has to be positive"
+
+    app = Application(
+        REPORTING=True,
+        REPORTING_ENDPOINT="/api/reports",
+        HSTS=True,
+        ONION_ADDRESS="http://example.onion",
+        ELASTIC_APM={"ENABLED": False},
+    )
+    handlers = create_handlers(app, request_count)
+
+    uncached = benchmark(handlers, cached=False)
+    cached = benchmark(handlers, cached=True)
+
+    print(f"requests:  {request_count}")
+    print(f"uncached:  {uncached * 1e6:.2f}µs per request")
+    print(f"cached:    {cached * 1e6:.2f}µs per request")
+    print(f"templates: {len(HEADER_TEMPLATES)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Measure the ratelimits checked by prepare() of every request.
+
+Usage: benchmark_ip_hashing.py [request count] [client count]
+
+The requests come from random clients, so some clients repeat. Redis is
+replaced by a fake that never limits, so mostly the work done by the
+website is measured.
+"""
+
+import asyncio
+import random
+import sys
+import time
+from collections.abc import Callable, Sequence
+from ipaddress import IPv4Address
+from os.path import dirname, normpath
+from typing import Any, Final, Self
+
+from tornado.httputil import HTTPHeaders, HTTPServerRequest
+from tornado.web import Application
+
+REPO_ROOT: Final[str] = dirname(dirname(normpath(__file__)))
+
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable-next=wrong-import-position
+from an_website import EVENT_REDIS  # noqa: E402
+
+# pylint: disable-next=wrong-import-position
+from an_website.utils import utils  # noqa: E402
+
+# pylint: disable-next=wrong-import-position
+from an_website.utils.base_request_handler import (  # noqa: E402
+    BaseRequestHandler,
+)
+
+# pylint: disable-next=wrong-import-position
+from an_website.utils.utils import ModuleInfo  # noqa: E402
+
+BUCKETS: Final = ("quotes", "hangman", "emoji-chat-get-messages", "search")
+
+
+def throttle(*args: Any) -> list[int]:
+    """Answer CL.THROTTLE without limiting."""
+    max_burst = args[2]
+    return [0, max_burst + 1, max_burst, -1, 0]
+
+
+class FakePipeline:
+    """A Redis pipeline that answers CL.THROTTLE."""
+
+    def __init__(self) -> None:
+        """Initialize the pipeline without commands."""
+        self.results: list[list[int]] = []
+
+    async def __aenter__(self) -> Self:
+        """Start the pipeline."""
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        """End the pipeline."""
+
+    def execute_command(self, *args: Any) -> None:
+        """Queue a command."""
+        self.results.append(throttle(*args))
+
+    async def execute(self) -> list[list[int]]:
+        """Return the results of the queued commands."""
+        return self.results
+
+
+class FakeRedis:
+    """A Redis client that answers CL.THROTTLE."""
+
+    async def execute_command(self, *args: Any) -> list[int]:
+        """Execute a command."""
+        return throttle(*args)
+
+    def pipeline(self, *, transaction: bool) -> FakePipeline:
+        """Create a pipeline."""
+        assert not transaction
+        return FakePipeline()
+
+
+class Connection:
+    """A connection that doesn't send anything."""
+
+    def set_close_callback(self, callback: None | Callable[[], None]) -> None:
+        """Ignore the callback."""
+
+
+def create_handlers(
+    app: Application, requests: Sequence[tuple[str, str]]
+) -> Sequence[BaseRequestHandler]:
+    """Create a handler for every request."""
+    module_info = ModuleInfo("Benchmark", "Benchmark")
+    handler_classes = {
+        bucket: type(
+            "Handler",
+            (BaseRequestHandler,),
+            {"RATELIMIT_GET_LIMIT": 20, "RATELIMIT_GET_BUCKET": bucket},
+        )
+        for bucket in BUCKETS
+    }
+    return [
+        handler_classes[bucket](
+            app,
+            HTTPServerRequest(
+                "GET",
+                "/",
+                headers=HTTPHeaders({"Host": "asozial.org"}),
+                connection=Connection(),
+                remote_ip=remote_ip,
+            ),
+            module_info=module_info,
+        )
+        for remote_ip, bucket in requests
+    ]
+
+
+async def benchmark(
+    handlers: Sequence[BaseRequestHandler], *, cached: bool
+) -> float:
+    """Check the ratelimits of all requests and return the mean time."""
+    hash_ratelimit_key = utils.hash_ratelimit_key
+    hash_ratelimit_key.cache_clear()
+    utils.RATELIMIT_LEASES.clear()
+    if not cached:
+        utils.hash_ratelimit_key = (  # type: ignore[assignment]
+            hash_ratelimit_key.__wrapped__
+        )
+    try:
+        start = time.perf_counter()
+        for handler in handlers:
+            assert not await handler.ratelimit(True, True)
+        return (time.perf_counter() - start) / len(handlers)
+    finally:
+        utils.hash_ratelimit_key = hash_ratelimit_key
+
+
+async def main() -> int | str:
+    """Run the benchmark."""
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    client_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    if request_count < 1 or client_count < 1:
+        return "The counts have to be positive"
+
+    clients = [
+        str(IPv4Address(random.getrandbits(32)))  # nosec: B311
+        for _ in range(client_count)
+    ]
+    requests = [
+        (random.choice(clients), random.choice(BUCKETS))  # nosec: B311
+        for _ in range(request_count)
+    ]
+
+    app = Application(
+        RATELIMITS=True,
+        REDIS=FakeRedis(),
+        REDIS_PREFIX="benchmark",
+        ELASTIC_APM={"ENABLED": False},
+    )
+    EVENT_REDIS.set()
+    uncached = await benchmark(create_handlers(app, requests), cached=False)
+    cached = await benchmark(create_handlers(app, requests), cached=True)
+
+    print(f"requests:  {request_count}")
+    print(f"clients:   {client_count}")
+    print(f"uncached:  {uncached * 1e6:.2f}µs per request")
+    print(f"cached:    {cached * 1e6:.2f}µs per request")
+    print(f"hits:      {utils.hash_ratelimit_key.cache_info().hits}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
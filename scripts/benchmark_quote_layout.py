@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Compare the line wrapping of the quote images with the old textwrap loop.
+
+Usage: benchmark_quote_layout.py [wrongquotes.json]
+
+Without an argument the wrong quotes are fetched from the quotes API.
+"""
+
+import sys
+import textwrap
+import time
+from collections.abc import Callable, Sequence
+from os.path import dirname, normpath
+from pathlib import Path
+from typing import Final
+from urllib.request import urlopen
+
+import orjson as json
+from PIL.ImageFont import FreeTypeFont as Font
+
+REPO_ROOT: Final[str] = dirname(dirname(normpath(__file__)))
+
+sys.path.insert(0, REPO_ROOT)
+
+# pylint: disable-next=wrong-import-position
+from an_website.quotes.rendering import (  # noqa: E402
+    AUTHOR_MAX_WIDTH,
+    FONT,
+    FONT_SMALLER,
+    FONT_SMALLEST,
+    IMAGE_WIDTH,
+    QUOTE_MAX_WIDTH,
+    get_text_length,
+    wrap_text,
+)
+
+# Same as in ../an_website/quotes/utils.py, which isn't imported, as it
+# creates the shared memory of the quotes caches
+API_URL: Final[str] = "https://zitate.prapsschnalinen.de/api"
+
+
+def textwrap_loop(text: str, max_width: int, font: Font) -> list[str]:
+    """Wrap the text like get_lines_and_max_height did before."""
+    column_count = 80
+    lines: list[str] = []
+
+    max_line_length: float = max_width + 1
+    while max_line_length > max_width:  # pylint: disable=while-used
+        lines = textwrap.wrap(text, width=column_count)
+        max_line_length = max(font.getlength(line) for line in lines)
+        column_count -= 1
+
+    return lines
+
+
+def get_texts(argv: Sequence[str]) -> list[tuple[str, int, Font]]:
+    """Get the texts that get wrapped when rendering the quote images."""
+    if len(argv) > 1:
+        data = json.loads(Path(argv[1]).read_bytes())
+    else:
+        with urlopen(f"{API_URL}/wrongquotes") as response:  # nosec: B310
+            data = json.loads(response.read())
+    texts: list[tuple[str, int, Font]] = []
+    for wrong_quote in data:
+        for font in (FONT, FONT_SMALLER, FONT_SMALLEST):
+            max_width = (
+                IMAGE_WIDTH if font is FONT_SMALLEST else QUOTE_MAX_WIDTH
+            )
+            quote = f"»{wrong_quote['quote']['quote']}«"
+            if font.getbbox(quote)[2] > AUTHOR_MAX_WIDTH:
+                texts.append((quote, max_width, font))
+            author = f"- {wrong_quote['author']['author']}"
+            if font.getbbox(author)[2] > AUTHOR_MAX_WIDTH:
+                texts.append((author, AUTHOR_MAX_WIDTH, font))
+    return texts
+
+
+def benchmark(
+    wrap: Callable[[str, int, Font], list[str]],
+    texts: Sequence[tuple[str, int, Font]],
+) -> tuple[float, list[list[str]]]:
+    """Wrap all texts and return the duration and the lines."""
+    start = time.perf_counter()
+    results = [wrap(text, max_width, font) for text, max_width, font in texts]
+    return time.perf_counter() - start, results
+
+
+def main() -> int | str:
+    """Run the benchmark."""
+    texts = get_texts(sys.argv)
+    if not texts:
+        return "No texts to wrap"
+
+    old_time, old_results = benchmark(textwrap_loop, texts)
+    get_text_length.cache_clear()
+    cold_time, new_results = benchmark(wrap_text, texts)
+    warm_time, _ = benchmark(wrap_text, texts)
+
+    identical = fewer_lines = more_lines = too_wide = 0
+    for (_, max_width, font), old, new in zip(
+        texts, old_results, new_results, strict=True
+    ):
+        if old == new:
+            identical += 1
+        elif len(new) < len(old):
+            fewer_lines += 1
+        elif len(new) > len(old):
+            more_lines += 1
+        too_wide += any(font.getlength(line) > max_width for line in new)
+
+    print(f"texts:        {len(texts)}")
+    print(f"textwrap:     {old_time * 1000:.1f}ms")
+    print(f"cold cache:   {cold_time * 1000:.1f}ms")
+    print(f"warm cache:   {warm_time * 1000:.1f}ms")
+    print(f"identical:    {identical}")
+    print(f"fewer lines:  {fewer_lines}")
+    print(f"more lines:   {more_lines}")
+    print(f"too wide:     {too_wide}")
+
+    return 1 if more_lines or too_wide else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The tests for the App Search client."""
+
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Self
+
+import orjson as json
+
+from an_website.utils import app_search
+from an_website.utils.app_search import AppSearchClient
+
+
+class FakeHTTPClient:
+    """Answer the search requests once they are released."""
+
+    def __init__(self, *, released: bool = True) -> None:
+        """Initialize the client without requests."""
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+        self.requests: list[tuple[str, dict[str, Any]]] = []
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self) -> Self:
+        """Return the client like AsyncHTTPClient() does."""
+        return self
+
+    async def fetch(
+        self, url: str, *, body: bytes, **kwargs: Any
+    ) -> SimpleNamespace:
+        """Answer a search request with the request."""
+        assert kwargs["method"] == "POST"
+        self.requests.append((url, json.loads(body)))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+        finally:
+            self.running -= 1
+        return SimpleNamespace(
+            body=json.dumps({"url": url, "body": json.loads(body)})
+        )
+
+
+@contextmanager
+def patch_http_client(http_client: FakeHTTPClient) -> Iterator[None]:
+    """Patch the HTTP client used by the App Search client."""
+    original = app_search.AsyncHTTPClient
+    app_search.AsyncHTTPClient = http_client  # type: ignore[misc]
+    try:
+        yield None
+    finally:
+        app_search.AsyncHTTPClient = original  # type: ignore[misc]
+
+
+async def test_combining_requests() -> None:
+    """Test that identical searches running together send one request."""
+    http_client = FakeHTTPClient(released=False)
+    client = AppSearchClient("https://search.example/", max_concurrency=1)
+    with patch_http_client(http_client):
+        searches = [
+            asyncio.create_task(client.search("engine", {"query": "🦘"}))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        assert http_client.requests == [
+            (
+                "https://search.example/api/as/v1/engines/engine/search",
+                {"query": "🦘"},
+            )
+        ]
+
+        http_client.release.set()
+        results = await asyncio.gather(*searches)
+        assert all(result is results[0] for result in results)
+
+        assert await client.search("engine", {"query": "🦘"}) is results[0]
+        assert len(http_client.requests) == 1
+
+
+async def test_max_concurrency() -> None:
+    """Test that at most max_concurrency requests run at the same time."""
+    http_client = FakeHTTPClient(released=False)
+    client = AppSearchClient("https://search.example", max_concurrency=2)
+    with patch_http_client(http_client):
+        searches = [
+            asyncio.create_task(client.search("engine", {"query": query}))
+            for query in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        assert http_client.running == 2
+        assert len(http_client.requests) == 2
+
+        http_client.release.set()
+        await asyncio.gather(*searches)
+        assert len(http_client.requests) == 5
+        assert http_client.max_running == 2
+
+
+async def test_search_cache() -> None:
+    """Test that cached results expire and the least recently used go."""
+    http_client = FakeHTTPClient()
+    client = AppSearchClient(
+        "https://search.example", cache_ttl=0.1, cache_size=2
+    )
+    with patch_http_client(http_client):
+        result = await client.search("engine", {"query": "a"})
+        assert await client.search("engine", {"query": "a"}) is result
+        assert len(http_client.requests) == 1
+
+        await asyncio.sleep(0.15)
+        assert await client.search("engine", {"query": "a"}) is not result
+        assert len(http_client.requests) == 2
+
+        await client.search("engine", {"query": "b"})
+        await client.search("engine", {"query": "a"})  # a is used last
+        await client.search("engine", {"query": "c"})  # b gets removed
+        assert len(http_client.requests) == 4
+        await client.search("engine", {"query": "a"})
+        assert len(http_client.requests) == 4
+        await client.search("engine", {"query": "b"})
+        assert len(http_client.requests) == 5
+
+    client = AppSearchClient("https://search.example", cache_ttl=0)
+    with patch_http_client(http_client):
+        await client.search("engine", {"query": "a"})
+        await client.search("engine", {"query": "a"})
+        assert len(http_client.requests) == 7
+
+
+if __name__ == "__main__":
+    asyncio.run(test_combining_requests())
+    asyncio.run(test_max_concurrency())
+    asyncio.run(test_search_cache())
@@ -0,0 +1,233 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The tests for the emoji chat."""
+
+import asyncio
+from typing import Any, Self, cast
+
+from redis.asyncio import Redis
+
+from an_website.emoji_chat.chat import (
+    MAX_MESSAGE_SAVE_COUNT,
+    REDIS_CHANNEL,
+    SEND_QUEUE_SIZE,
+    ChatHub,
+    ChatWebSocketHandler,
+    MessageBatcher,
+    MessageHistory,
+    write_messages,
+)
+
+MESSAGE_LIST_KEY = "prefix:emoji-chat:message-list"
+
+
+class FakePipeline:
+    """Record the commands of a Redis transaction."""
+
+    def __init__(self, redis: "FakeRedis") -> None:
+        """Initialize the pipeline without commands."""
+        self.redis = redis
+        self.commands: list[tuple[Any, ...]] = []
+
+    async def __aenter__(self) -> Self:
+        """Start the transaction."""
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        """End the transaction."""
+
+    def rpush(self, key: str, *values: bytes) -> None:
+        """Record an RPUSH command."""
+        self.commands.append(("rpush", key, *values))
+
+    def ltrim(self, key: str, start: int, end: int) -> None:
+        """Record an LTRIM command."""
+        self.commands.append(("ltrim", key, start, end))
+
+    def publish(self, channel: str, message: bytes) -> None:
+        """Record a PUBLISH command."""
+        self.commands.append(("publish", channel, message))
+
+    async def execute(self) -> None:
+        """Execute the transaction."""
+        self.redis.transactions.append(self.commands)
+
+
+class FakeRedis:
+    """Record the executed Redis transactions."""
+
+    def __init__(self) -> None:
+        """Initialize without transactions."""
+        self.transactions: list[list[tuple[Any, ...]]] = []
+
+    def pipeline(self, *, transaction: bool) -> FakePipeline:
+        """Create a pipeline."""
+        assert transaction
+        return FakePipeline(self)
+
+
+def get_expected_transaction(*messages: bytes) -> list[tuple[Any, ...]]:
+    """Get the commands that should be executed to save the messages."""
+    return [
+        ("rpush", MESSAGE_LIST_KEY, *messages),
+        ("ltrim", MESSAGE_LIST_KEY, -MAX_MESSAGE_SAVE_COUNT, -1),
+        *(
+            (
+                "publish",
+                REDIS_CHANNEL,
+                b'{"type":"message","message":%b}' % message,
+            )
+            for message in messages
+        ),
+    ]
+
+
+async def test_write_messages() -> None:
+    """Test saving and publishing messages in one transaction."""
+    redis = FakeRedis()
+    await write_messages(
+        cast("Redis[str]", redis), "prefix", (b'{"a":1}', b'{"b":2}')
+    )
+    assert redis.transactions == [
+        get_expected_transaction(b'{"a":1}', b'{"b":2}')
+    ]
+
+
+async def test_message_batcher() -> None:
+    """Test writing the messages saved within the delay together."""
+    fake_redis = FakeRedis()
+    redis = cast("Redis[str]", fake_redis)
+    batcher = MessageBatcher()
+    writes = [
+        asyncio.create_task(batcher.write(redis, "prefix", message, 0.1))
+        for message in (b"1", b"2", b"3")
+    ]
+    await asyncio.sleep(0.05)
+    assert not fake_redis.transactions
+    assert not any(write.done() for write in writes)
+
+    await asyncio.wait_for(asyncio.gather(*writes), 1)
+    assert fake_redis.transactions == [
+        get_expected_transaction(b"1", b"2", b"3")
+    ]
+
+    await batcher.write(redis, "prefix", b"4", 0)
+    assert fake_redis.transactions == [
+        get_expected_transaction(b"1", b"2", b"3"),
+        get_expected_transaction(b"4"),
+    ]
+
+
+class FakeConnection:
+    """Record the frames sent to a WebSocket connection."""
+
+    def __init__(self, *, slow: bool = False) -> None:
+        """Initialize the connection without frames."""
+        self.slow = slow
+        self.name = "🦘"
+        self.connection_time = 0
+        self.frames: list[bytes] = []
+        self.close_reason: None | tuple[int, str] = None
+
+    def write_message(self, frame: bytes) -> asyncio.Future[None]:
+        """Write a frame, slow connections never finish writing."""
+        self.frames.append(frame)
+        future = asyncio.get_running_loop().create_future()
+        if not self.slow:
+            future.set_result(None)
+        return future
+
+    def close(self, code: int, reason: str) -> None:
+        """Close the connection."""
+        self.close_reason = code, reason
+
+
+async def test_chat_hub() -> None:
+    """Test sending frames to all connections, but not to slow ones."""
+    hub = ChatHub()
+    connections = [FakeConnection() for _ in range(3)]
+    slow_connection = FakeConnection(slow=True)
+    for conn in (*connections, slow_connection):
+        hub.add(cast(ChatWebSocketHandler, conn))
+    assert len(hub) == 4
+
+    frames = [b"%d" % i for i in range(SEND_QUEUE_SIZE + 2)]
+    for frame in frames:
+        hub.broadcast(frame)
+        await asyncio.sleep(0)
+
+    for conn in connections:
+        assert conn.frames == frames
+        assert conn.close_reason is None
+
+    # the first frame is being written, the next ones are queued
+    assert slow_connection.frames == frames[:1]
+    assert slow_connection.close_reason == (1013, "Too slow")
+    assert len(hub) == 3
+
+    hub.broadcast(b"after")
+    await asyncio.sleep(0)
+    for conn in connections:
+        assert conn.frames == [*frames, b"after"]
+    assert slow_connection.frames == frames[:1]
+
+    hub.remove(cast(ChatWebSocketHandler, connections[0]))
+    hub.broadcast(b"removed")
+    await asyncio.sleep(0)
+    assert connections[0].frames[-1] == b"after"
+    assert connections[1].frames[-1] == b"removed"
+
+
+def test_message_history() -> None:
+    """Test deduplicating and ordering the messages of the history."""
+    messages = [
+        {"author": ["🦘"], "content": ["👍"], "timestamp": timestamp}
+        for timestamp in range(MAX_MESSAGE_SAVE_COUNT + 2)
+    ]
+    history = MessageHistory()
+    history.add(messages[1])
+    history.add(messages[3])
+    history.add(messages[1])
+    history.add(dict(messages[3]))
+    assert list(history.messages) == [messages[1], messages[3]]
+    assert not history.seeded
+
+    frame = history.get_messages_frame()
+    assert history.get_messages_frame() is frame
+
+    # a message from another worker arrived late
+    history.add(messages[2])
+    assert list(history.messages) == messages[1:4]
+    assert history.get_messages_frame() != frame
+    assert not history.seeded
+
+    history.seed(reversed(messages[2:]))
+    assert list(history.messages) == messages[2:]
+    assert history.seeded
+
+    # too old for the history
+    history.add(messages[0])
+    assert list(history.messages) == messages[2:]
+    history.add(messages[1])
+    assert list(history.messages) == messages[2:]
+
+    history.add(new_message := {**messages[-1], "timestamp": 10**6})
+    assert list(history.messages) == [*messages[3:], new_message]
+
+
+if __name__ == "__main__":
+    asyncio.run(test_write_messages())
+    asyncio.run(test_message_batcher())
+    asyncio.run(test_chat_hub())
+    test_message_history()
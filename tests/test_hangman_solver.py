@@ -18,6 +18,8 @@ from hangman_solver import HangmanResult
 from tornado.web import HTTPError
 
 from an_website.hangman_solver import hangman_solver as solver
+from an_website.hangman_solver import wordgame_solver
+from an_website.utils.utils import bounded_edit_distance
 
 
 def test_solving_hangman() -> None:
@@ -119,5 +121,47 @@ def test_solving_hangman() -> None:
         )
 
 
+def test_neighbour_graph() -> None:
+    """Test the neighbour graph of the wordgame solver."""
+    words = ("a", "ab", "abc", "abd", "bbc", "xyz", "äbc", "abcd", "abc")
+    graph = wordgame_solver.NeighbourGraph(
+        wordgame_solver.build_neighbour_graph(words)
+    )
+
+    assert len(graph) == 8
+    assert graph.alphabet == "abcdxyzä"
+    assert graph.index("abc") is not None
+    assert graph.index("abe") is None
+
+    for word in (*words, "", "b", "abe", "bbcd", "äb"):
+        expected = sorted(
+            other
+            for other in set(words)
+            if bounded_edit_distance(word, other, 2) == 1
+        )
+        assert sorted(map(graph.get_word, graph.find_neighbours(word))) == (
+            expected
+        )
+
+
+def test_wordgame_solver() -> None:
+    """Test finding and ranking solutions of the wordgame solver."""
+    solutions = wordgame_solver.find_solutions("test", ()).collect(list)
+    assert "fest" in solutions
+    assert "test" not in solutions
+    assert "fest" not in wordgame_solver.find_solutions("test", ("fest",))
+
+    ranked = wordgame_solver.get_ranked_solutions("test", ("fest",))
+    assert ranked == sorted(ranked, reverse=True)
+    assert {word for _, word in ranked} == {*solutions} - {"fest"}
+    for count, word in ranked:
+        assert (
+            count
+            == wordgame_solver.find_solutions(word, ("test", "fest")).count()
+        )
+
+
 if __name__ == "__main__":
     test_solving_hangman()
+    test_neighbour_graph()
+    test_wordgame_solver()
@@ -13,15 +13,37 @@
 
 """The tests for the quotes pages."""
 
+import asyncio
+import copy
+import os
 import urllib.parse
+from collections.abc import Iterator
+from contextlib import contextmanager
 from io import BytesIO
+from pathlib import Path
+from typing import Any
 
 import orjson as json
 import qoi_rs
 from PIL import Image
+from tornado.web import Application
 
 from an_website.quotes import create, utils as quotes
-from an_website.quotes.image import CONTENT_TYPES, FILE_EXTENSIONS
+from an_website.quotes.image import (
+    CONTENT_TYPES,
+    FILE_EXTENSIONS,
+    ImageRenderer,
+    RenderedImageCache,
+    RenderQueueFullError,
+    get_image_cache_key,
+)
+from an_website.quotes.rendering import (
+    FONT,
+    FONT_SMALLEST,
+    QUOTE_MAX_WIDTH,
+    wrap_text,
+)
+from an_website.quotes.shared_store import dump_snapshot, load_snapshot
 
 from . import (  # noqa: F401  # pylint: disable=unused-import
     WRONG_QUOTE_DATA,
@@ -67,6 +89,10 @@ async def test_parsing_wrong_quotes() -> None:
 
     assert await quotes.get_rating_by_id(1, 2) == 1
 
+    assert (1, 2) in quotes.WRONG_QUOTES_CACHE.get_rating_filter_ids("w")
+    assert (1, 2) in quotes.WRONG_QUOTES_CACHE.get_rating_filter_ids("rated")
+    assert (1, 2) not in quotes.WRONG_QUOTES_CACHE.get_rating_filter_ids("n")
+
     assert len(quotes.QUOTES_CACHE) == 1
     assert len(quotes.AUTHORS_CACHE) == 2
 
@@ -331,6 +357,100 @@ async def test_quote_image_handlers(
                 img.close()
 
 
+def test_wrap_text() -> None:
+    """Test wrapping the text of the quote images."""
+    text = "»Ich bin ein Bundes-Kanzler-Kandidat, der gerne Zitate liest.« " * 4
+    for font in (FONT, FONT_SMALLEST):
+        lines = wrap_text(text, QUOTE_MAX_WIDTH, font)
+        assert len(lines) > 1
+        assert all(font.getlength(line) <= QUOTE_MAX_WIDTH for line in lines)
+        assert "".join(lines).replace(" ", "") == text.replace(" ", "")
+
+    word = "Donaudampfschifffahrtsgesellschaftskapitänsmützenhalterung" * 2
+    lines = wrap_text(f"a {word} b", QUOTE_MAX_WIDTH, FONT)
+    assert lines[0].startswith("a D")
+    assert all(FONT.getlength(line) <= QUOTE_MAX_WIDTH for line in lines)
+    assert "".join(lines).replace(" ", "") == f"a{word}b"
+
+
+def test_rendered_image_cache(tmp_path: Path) -> None:
+    """Test the cache for rendered quote images."""
+    keys = [
+        get_image_cache_key(
+            "1-1", "Quote", "Author", rating, None, "png", include_kangaroo=True
+        )
+        for rating in (1, 2, -1)
+    ]
+    assert len(set(keys)) == 3
+    assert all(key.startswith("1-1-") for key in keys)
+
+    image_cache = RenderedImageCache(10, 20, tmp_path)
+    image_cache.check_rating("1-1", 1)
+    image_cache.put(keys[0], b"12345")
+    image_cache.put_on_disk(keys[0], b"12345")
+    image_cache.put(keys[1], b"123456")
+    image_cache.put_on_disk(keys[1], b"123456")
+    assert image_cache.get(keys[0]) is None  # evicted from memory
+    assert image_cache.get(keys[1]) == b"123456"
+    assert image_cache.get_from_disk(keys[0]) == b"12345"
+    assert image_cache.get(keys[0]) == b"12345"
+    image_cache.put_on_disk("2-2-spam", b"eggs and spam")
+    assert not (tmp_path / keys[1]).exists()  # evicted from disk
+    assert (tmp_path / keys[0]).exists()
+
+    # the images on disk survive a restart
+    assert RenderedImageCache(10, 20, tmp_path).get_from_disk(keys[0])
+
+    image_cache.check_rating("1-1", -1)
+    assert image_cache.get(keys[0]) is None
+    assert image_cache.get_from_disk(keys[0]) is None
+    assert image_cache.get_from_disk("2-2-spam") == b"eggs and spam"
+
+    # only the most recently checked ratings are remembered
+    image_cache = RenderedImageCache(10, max_ratings=2)
+    image_cache.check_rating("1-1", 1)
+    image_cache.put(keys[0], b"1")
+    image_cache.check_rating("2-2", 1)
+    image_cache.check_rating("1-1", 1)
+    image_cache.check_rating("3-3", 1)  # 2-2 is forgotten
+    image_cache.check_rating("1-1", 2)
+    assert image_cache.get(keys[0]) is None
+    image_cache.put(keys[1], b"2")
+    image_cache.check_rating("2-2", 1)
+    image_cache.check_rating("3-3", 1)  # 1-1 is forgotten
+    image_cache.check_rating("1-1", -1)
+    assert image_cache.get(keys[1]) == b"2"
+
+
+async def test_image_renderer() -> None:
+    """Test the bounded queue of the image renderer."""
+    renderer = ImageRenderer(0, 1)
+    render = renderer.render(
+        "Quote", "Author", 1, None, "png", include_kangaroo=False, wq_id="1-1"
+    )
+    task = asyncio.create_task(render)
+    await asyncio.sleep(0)
+    assert renderer.pending == 1
+    try:
+        await renderer.render(
+            "Quote",
+            "Author",
+            1,
+            None,
+            "bmp",
+            include_kangaroo=False,
+            wq_id="1-1",
+        )
+    except RenderQueueFullError as exc:
+        assert exc.retry_after >= 1
+    else:
+        raise AssertionError("the queue should be full")
+    assert (await task).startswith(b"\x89PNG")
+    assert renderer.pending == 0
+    assert renderer.rendered == 1
+    assert renderer.rejected == 1
+
+
 async def test_quote_redirect_api(fetch: FetchCallable) -> None:  # noqa: F811
     """Test the quote redirect API."""
     response = await fetch(
@@ -383,3 +503,266 @@ async def test_quote_apis(fetch: FetchCallable) -> None:  # noqa: F811
 
         for author in response["authors"]:
             assert author == quotes.AUTHORS_CACHE[author["id"]].to_json()
+
+
+def test_shared_store() -> None:
+    """Test the shared columnar store for the wrong quotes."""
+    store = quotes.WrongQuoteStore(row_capacity=4)
+    try:  # pylint: disable=too-many-try-statements
+        for quote_id in range(100):
+            for author_id in range(3):
+                store[(quote_id, author_id)] = quotes.WrongQuote(
+                    id=quote_id * 3 + author_id,
+                    quote_id=quote_id,
+                    author_id=author_id,
+                    rating=quote_id - 50,
+                )
+        assert len(store) == 300
+        assert store[(42, 1)].id == 127
+        assert store[(42, 1)].rating == -8
+        assert (100, 0) not in store
+
+        store[(42, 1)].rating = 69
+        store[(42, 1)] = store[(42, 1)]
+        assert store.delete_many([(0, 0), (0, 1), (1000, 0)]) == 2
+        assert (0, 0) not in store
+        assert store.random_key() in store
+        assert (0, 1) not in store.get_rating_filter_ids("n")
+        assert (42, 1) in store.get_rating_filter_ids("w")
+        assert len(store.get_rating_filter_ids("rated")) == 298
+
+        pid = os.fork()
+        if not pid:  # pragma: no cover
+            # the child process sees the same data and can change it
+            status = 0
+            if len(store) != 298 or store[(42, 1)].rating != 69:
+                status = 1
+            store[(42, 2)] = quotes.WrongQuote(
+                id=1337, quote_id=42, author_id=2, rating=420
+            )
+            os._exit(status)  # pylint: disable=protected-access
+        assert os.waitpid(pid, 0)[1] == 0
+        assert store[(42, 2)].id == 1337
+        assert store[(42, 2)].rating == 420
+
+        copy = quotes.WrongQuoteStore()
+        try:
+            snapshot = dump_snapshot({"wrongquotes": store})
+            assert not load_snapshot({"quotes": copy}, snapshot)
+            assert not load_snapshot({"wrongquotes": copy}, snapshot[:-1])
+            assert load_snapshot({"wrongquotes": copy}, snapshot)
+            assert len(copy) == 299
+            assert copy[(42, 1)].rating == 69
+            assert len(copy.get_rating_filter_ids("rated")) == 299
+        finally:
+            copy.close()
+    finally:
+        store.close()
+
+
+def test_load_snapshot() -> None:
+    """Test that no store is replaced if the snapshot doesn't fit all."""
+    quote_store, author_store = quotes.QuoteStore(), quotes.AuthorStore()
+    copy_store, wrong_store = quotes.QuoteStore(), quotes.QuoteStore()
+    try:  # pylint: disable=too-many-try-statements
+        quote_store[1] = quotes.Quote(1, "🦘", 2)
+        author_store[2] = quotes.Author(2, "Känguru", None)
+        snapshot = dump_snapshot(
+            {"quotes": quote_store, "authors": author_store}
+        )
+
+        # the authors can't be loaded into a store for quotes
+        assert not load_snapshot(
+            {"quotes": copy_store, "authors": wrong_store}, snapshot
+        )
+        assert 1 not in copy_store
+
+        assert load_snapshot(
+            {"quotes": copy_store, "authors": author_store}, snapshot
+        )
+        assert copy_store[1].quote == "🦘"
+    finally:
+        for store in (quote_store, author_store, copy_store, wrong_store):
+            store.close()
+
+
+def get_api_data() -> dict[str, list[dict[str, Any]]]:
+    """Get the data of the API used to test the synchronisation."""
+    marc_uwe = {"id": 1001, "author": "Marc-Uwe Kling"}
+    kangaroo = {"id": 1002, "author": "Das Känguru"}
+    quote = {"id": 1001, "author": kangaroo, "quote": "Ich bin ein Känguru."}
+    return {
+        "authors": [
+            WRONG_QUOTE_DATA["quote"]["author"],  # type: ignore[index]
+            WRONG_QUOTE_DATA["author"],  # type: ignore[list-item]
+            marc_uwe,
+            kangaroo,
+        ],
+        "quotes": [WRONG_QUOTE_DATA["quote"], quote],  # type: ignore[list-item]
+        "wrongquotes": [
+            WRONG_QUOTE_DATA,
+            {
+                "id": 1001,
+                "author": marc_uwe,
+                "quote": quote,
+                "rating": 3,
+                "showed": 0,
+                "voted": 0,
+            },
+        ],
+    }
+
+
+class FakeAPI:
+    """Answer the requests of the synchronisation with the API data."""
+
+    def __init__(self) -> None:
+        """Initialize the API data."""
+        self.data = get_api_data()
+        self.snapshots = 0
+
+    async def make_api_request(
+        self, endpoint: str, *, entity_should_exist: bool
+    ) -> list[dict[str, Any]]:
+        """Return a copy of the items of the endpoint."""
+        assert entity_should_exist
+        return copy.deepcopy(self.data[endpoint])
+
+    async def save_snapshot(self, redis: object, prefix: str) -> None:
+        """Count the saved snapshots."""
+        self.snapshots += 1
+
+
+class FakeRedis:
+    """Ignore the data saved in Redis."""
+
+    async def setex(self, name: str, time: int, value: object) -> None:
+        """Ignore the value."""
+
+
+@contextmanager
+def patch_api(api: FakeAPI) -> Iterator[None]:
+    """Synchronise the quotes caches with the fake API."""
+    old_values = {
+        "make_api_request": quotes.make_api_request,
+        "save_snapshot": quotes.save_snapshot,
+        "SYNC_STATES": quotes.SYNC_STATES,
+    }
+    quotes.make_api_request = api.make_api_request  # type: ignore[assignment]
+    quotes.save_snapshot = api.save_snapshot
+    quotes.SYNC_STATES = {}  # type: ignore[misc]
+    for store in quotes.SNAPSHOT_STORES.values():
+        store.delete_many(list(store))
+    try:
+        yield None
+    finally:
+        for name, value in old_values.items():
+            setattr(quotes, name, value)
+
+
+def get_report_counts(
+    reports: tuple[quotes.SyncReport, ...],
+) -> list[tuple[str, bool, int, int, int]]:
+    """Get the counts of the synchronisation reports."""
+    return [
+        (
+            report.endpoint,
+            report.full,
+            report.fetched,
+            report.changed,
+            report.deleted,
+        )
+        for report in reports
+    ]
+
+
+async def test_update_cache() -> None:
+    """Test synchronising only the changed items of the quotes caches."""
+    api = FakeAPI()
+    application = Application(REDIS=FakeRedis())
+    with patch_api(api):
+        reports = await quotes.update_cache(application)
+        assert get_report_counts(reports) == [
+            ("wrongquotes", True, 2, 2, 0),
+            ("quotes", True, 2, 2, 0),
+            ("authors", True, 4, 4, 0),
+        ]
+        assert reports[0].ids == {1, 1001}
+        assert reports[1].ids == {1, 1001}
+        assert reports[2].ids == {1, 2, 1001, 1002}
+        assert all(report.duration >= 0 for report in reports)
+        assert quotes.WRONG_QUOTES_CACHE[(1001, 1001)].rating == 3
+        assert quotes.QUOTES_CACHE[1001].author.name == "Das Känguru"
+        assert len(quotes.AUTHORS_CACHE) == 4
+        assert api.snapshots == 1
+
+        reports = await quotes.update_cache(application)
+        assert get_report_counts(reports) == [
+            ("wrongquotes", False, 2, 0, 0),
+            ("quotes", False, 2, 0, 0),
+            ("authors", False, 4, 0, 0),
+        ]
+        assert api.snapshots == 1
+
+        api.data["wrongquotes"][1]["rating"] = 4
+        # the wrong quote and the authors share the data of the author
+        api.data["authors"][2]["author"] = "Marc-Uwe"
+        reports = await quotes.update_cache(application)
+        assert get_report_counts(reports) == [
+            ("wrongquotes", False, 2, 1, 0),
+            ("quotes", False, 2, 0, 0),
+            ("authors", False, 4, 1, 0),
+        ]
+        assert quotes.WRONG_QUOTES_CACHE[(1001, 1001)].rating == 4
+        assert quotes.AUTHORS_CACHE[1001].name == "Marc-Uwe"
+        assert api.snapshots == 2
+
+
+async def test_update_cache_deletions() -> None:
+    """Test deleting the items that the API doesn't return anymore."""
+    api = FakeAPI()
+    api.data["wrongquotes"].append(
+        {
+            **api.data["wrongquotes"][1],
+            "id": 1002,
+            "author": WRONG_QUOTE_DATA["author"],
+        }
+    )
+    application = Application(REDIS=FakeRedis())
+    with patch_api(api):
+        await quotes.update_cache(application)
+        assert (1001, 2) in quotes.WRONG_QUOTES_CACHE
+        assert api.snapshots == 1
+
+        # the newest wrong quote was deleted
+        del api.data["wrongquotes"][2]
+        reports = await quotes.update_cache(application)
+        assert get_report_counts(reports) == [
+            ("wrongquotes", False, 2, 0, 1),
+            ("quotes", False, 2, 0, 0),
+            ("authors", False, 4, 0, 0),
+        ]
+        assert reports[0].removed == {1002}
+        assert (1001, 2) not in quotes.WRONG_QUOTES_CACHE
+        assert (1001, 1001) in quotes.WRONG_QUOTES_CACHE
+        assert api.snapshots == 2
+
+        # the newest quote and its author were deleted, the wrong quotes of
+        # them are deleted with them
+        del api.data["quotes"][1]
+        del api.data["authors"][3]
+        reports = await quotes.update_cache(
+            application, update_wrong_quotes=False
+        )
+        assert get_report_counts(reports) == [
+            ("quotes", False, 1, 0, 1),
+            ("authors", False, 3, 0, 1),
+        ]
+        assert reports[0].ids == {1}
+        assert reports[0].removed == {1001}
+        assert 1001 not in quotes.QUOTES_CACHE
+        assert 1002 not in quotes.AUTHORS_CACHE
+        assert 1001 in quotes.AUTHORS_CACHE
+        assert (1001, 1001) not in quotes.WRONG_QUOTES_CACHE
+        assert (1, 2) in quotes.WRONG_QUOTES_CACHE
+        assert api.snapshots == 3
@@ -0,0 +1,225 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The tests for the Reporting API™️."""
+
+import asyncio
+import contextlib
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Any, Final, cast
+
+from elasticsearch import AsyncElasticsearch
+from tornado.web import Application
+
+from an_website.reporting import reporting
+from an_website.reporting.reporting import (
+    BULK_SIZE,
+    EXPORT_KEEP_ALIVE,
+    EXPORT_PAGE_SIZE,
+    MAX_BUFFERED_REPORTS,
+    ReportBuffer,
+    flush_reports_periodically,
+    stream_reports,
+)
+
+ELASTICSEARCH: Final = cast(AsyncElasticsearch, object())
+
+
+class FakeBulk:
+    """Record the reports that would have been indexed."""
+
+    def __init__(self) -> None:
+        """Initialize the recorded calls."""
+        self.calls: list[list[dict[str, Any]]] = []
+
+    async def __call__(
+        self,
+        client: AsyncElasticsearch,
+        actions: Iterable[dict[str, Any]],
+        *,
+        raise_on_error: bool,
+    ) -> tuple[int, list[Any]]:
+        """Index the reports."""
+        assert client is ELASTICSEARCH
+        assert not raise_on_error
+        self.calls.append(list(actions))
+        return len(self.calls[-1]), []
+
+
+@contextlib.contextmanager
+def patch_reporting(**values: object) -> Iterator[None]:
+    """Patch attributes of the reporting module."""
+    old_values = {name: getattr(reporting, name) for name in values}
+    for name, value in values.items():
+        setattr(reporting, name, value)
+    try:
+        yield None
+    finally:
+        for name, value in old_values.items():
+            setattr(reporting, name, value)
+
+
+class FakeElasticsearch:
+    """Answer point in time searches from a list of reports."""
+
+    def __init__(self, report_count: int) -> None:
+        """Create the reports."""
+        self.reports = [{"n": n} for n in range(report_count)]
+        self.indices: list[str] = []
+        self.search_afters: list[None | list[Any]] = []
+        self.closed_pits: list[str] = []
+
+    async def open_point_in_time(
+        self, *, index: str, keep_alive: str
+    ) -> dict[str, Any]:
+        """Open a point in time."""
+        assert keep_alive == EXPORT_KEEP_ALIVE
+        self.indices.append(index)
+        return {"id": "pit-0"}
+
+    async def search(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        pit: dict[str, str],
+        sort: list[dict[str, Any]],
+        query: dict[str, Any],
+        search_after: None | list[Any],
+        size: int,
+        track_total_hits: bool,
+    ) -> dict[str, Any]:
+        """Return the page after search_after."""
+        assert pit == {
+            "id": f"pit-{len(self.search_afters)}",
+            "keep_alive": EXPORT_KEEP_ALIVE,
+        }
+        assert sort and query and not track_total_hits
+        self.search_afters.append(search_after)
+        start = 0 if search_after is None else search_after[0] + 1
+        return {
+            "pit_id": f"pit-{len(self.search_afters)}",
+            "hits": {
+                "hits": [
+                    {"_source": report, "sort": [report["n"]]}
+                    for report in self.reports[start : start + size]
+                ]
+            },
+        }
+
+    async def close_point_in_time(self, *, id: str) -> None:
+        """Close a point in time."""
+        # pylint: disable=redefined-builtin
+        self.closed_pits.append(id)
+
+
+async def test_stream_reports() -> None:
+    """Test streaming the reports with search_after."""
+    es = FakeElasticsearch(EXPORT_PAGE_SIZE * 2 + 1)
+    pages = [
+        page
+        async for page in stream_reports(cast(AsyncElasticsearch, es), "prefix")
+    ]
+    assert [len(page) for page in pages] == [
+        EXPORT_PAGE_SIZE,
+        EXPORT_PAGE_SIZE,
+        1,
+    ]
+    assert [report for page in pages for report in page] == es.reports
+    assert es.indices == ["prefix-reports"]
+    assert es.search_afters == [
+        None,
+        [EXPORT_PAGE_SIZE - 1],
+        [EXPORT_PAGE_SIZE * 2 - 1],
+    ]
+    assert es.closed_pits == ["pit-3"]
+
+    es = FakeElasticsearch(EXPORT_PAGE_SIZE)
+    pages = [
+        page
+        async for page in stream_reports(cast(AsyncElasticsearch, es), "prefix")
+    ]
+    assert pages == [es.reports]
+    assert es.search_afters == [None, [EXPORT_PAGE_SIZE - 1]]
+    assert es.closed_pits == ["pit-2"]
+
+    es = FakeElasticsearch(EXPORT_PAGE_SIZE * 3)
+    async with contextlib.aclosing(
+        stream_reports(cast(AsyncElasticsearch, es), "prefix")
+    ) as stream:
+        async for page in stream:
+            assert page == es.reports[:EXPORT_PAGE_SIZE]
+            break  # the client disconnected
+    assert es.search_afters == [None]
+    assert es.closed_pits == ["pit-1"]
+
+
+async def test_report_buffer() -> None:
+    """Test flushing the report buffer when it is full enough."""
+    bulk = FakeBulk()
+    buffer = ReportBuffer()
+    with patch_reporting(async_bulk=bulk):
+        buffer.add(ELASTICSEARCH, [{"n": n} for n in range(BULK_SIZE - 1)])
+        await asyncio.sleep(0)
+        assert not bulk.calls
+        assert len(buffer.reports) == BULK_SIZE - 1
+
+        buffer.add(ELASTICSEARCH, [{"n": BULK_SIZE - 1}])
+        await asyncio.sleep(0)
+        assert bulk.calls == [[{"n": n} for n in range(BULK_SIZE)]]
+        assert not buffer.reports
+        assert buffer.indexed == BULK_SIZE
+
+        buffer.add(
+            ELASTICSEARCH, ({"n": n} for n in range(MAX_BUFFERED_REPORTS + 10))
+        )
+        assert len(buffer.reports) == MAX_BUFFERED_REPORTS
+        assert buffer.dropped == 10
+        await asyncio.sleep(0)
+        assert len(bulk.calls) == 2
+        assert len(bulk.calls[-1]) == MAX_BUFFERED_REPORTS
+        assert not buffer.reports
+        assert buffer.indexed == BULK_SIZE + MAX_BUFFERED_REPORTS
+        assert not buffer.failed
+
+
+async def test_flush_reports_periodically() -> None:
+    """Test flushing the report buffer after the flush interval."""
+    bulk = FakeBulk()
+    buffer = ReportBuffer()
+    shutdown = threading.Event()
+    with patch_reporting(
+        async_bulk=bulk,
+        EVENT_SHUTDOWN=shutdown,
+        FLUSH_INTERVAL=0.1,
+        REPORT_BUFFER=buffer,
+    ):
+        assert buffer.get_time_until_due() == 0.1
+        task = asyncio.create_task(
+            flush_reports_periodically(Application(), None)
+        )
+        buffer.add(ELASTICSEARCH, [{"n": 0}])
+        assert 0 < buffer.get_time_until_due() <= 0.1
+        await asyncio.sleep(0.5)
+        assert bulk.calls == [[{"n": 0}]]
+
+        buffer.add(ELASTICSEARCH, [{"n": 1}])
+        shutdown.set()
+        await asyncio.wait_for(task, 1)
+        assert bulk.calls == [[{"n": 0}], [{"n": 1}]]
+        assert buffer.indexed == 2
+
+
+if __name__ == "__main__":
+    asyncio.run(test_stream_reports())
+    asyncio.run(test_report_buffer())
+    asyncio.run(test_flush_reports_periodically())
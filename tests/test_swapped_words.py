@@ -178,6 +178,36 @@ def test_one_way_word_pair() -> None:
     assert pair.get_replacement("Z") == "Z"
 
 
+def test_swapping_words() -> None:
+    """Test swapping words with a parsed config."""
+    config = sw_config.parse_config(
+        "# comment\nx <=> y\n(a)(b) => c\n(?:fo)(o)+ => bar"
+    )
+    assert config is sw_config.parse_config(
+        "# comment\nx <=> y\n(a)(b) => c\n(?:fo)(o)+ => bar"
+    )
+    assert config.get_regex() is config.get_regex()
+    assert config.swap_words("x Y ab AB fooo z") == "y X c C bar z"
+    assert config.swap_words("") == ""
+    assert sw_config.parse_config("# x").swap_words("x") == "x"
+
+
+def test_swapped_words_stream() -> None:
+    """Test swapping the words in a text given in chunks."""
+    config = sw_config.parse_config(r"\bab\b => c; fo+ => bar; x <=> y")
+    text = "xab ab AB fooo Xy " * 3
+    for size in (1, 2, 3, 5, len(text)):
+        stream = sw_config.SwappedWordsStream(config)
+        output = "".join(
+            stream.feed(text[i : i + size]) for i in range(0, len(text), size)
+        )
+        assert output + stream.finish() == config.swap_words(text)
+
+    stream = sw_config.SwappedWordsStream(config, max_buffer_size=2)
+    assert stream.feed("fooooo") == "bar"
+    assert stream.finish() == ""
+
+
 def test_check_text_too_long() -> None:
     """Test the check_text_too_long function."""
     swap.check_text_too_long("")
@@ -360,10 +390,35 @@ async def test_sw_json_request_handlers(
     assert response["line_num"] == 2
 
 
+async def test_sw_stream_request_handler(
+    fetch: FetchCallable,  # noqa: F811
+) -> None:
+    """Test the streaming swapped words API request handler."""
+    text = "x z o " * swap.MAX_CHAR_COUNT
+    response = await fetch(
+        "/api/vertauschte-woerter/stream?config=x%20=>%20y%3Bz%20<=>%20o",
+        method="POST",
+        headers={"Content-Type": "text/plain"},
+        body=text,
+    )
+    assert response.code == 200
+    assert response.body.decode("UTF-8") == "y o z " * swap.MAX_CHAR_COUNT
+
+    response = await fetch(
+        "/api/vertauschte-woerter/stream?config=z%20<>%20o",
+        method="POST",
+        headers={"Content-Type": "text/plain"},
+        body=text,
+    )
+    assert response.code == 400
+
+
 if __name__ == "__main__":
     test_copying_case_of_letters()
     test_copying_case()
     test_parsing_config()
     test_two_way_word_pair()
     test_one_way_word_pair()
+    test_swapping_words()
+    test_swapped_words_stream()
     test_check_text_too_long()
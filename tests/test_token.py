@@ -19,6 +19,7 @@ from datetime import datetime
 import pytest
 import time_machine
 
+from an_website.utils.decorators import VERIFIED_TOKENS, get_token_permissions
 from an_website.utils.token import (  # pylint: disable=import-private-name
     InvalidTokenError,
     InvalidTokenVersionError,
@@ -129,6 +130,29 @@ def test_token_v0() -> None:
         _parse_token_v0(" ", secret=b"empty")
 
 
+@time_machine.travel(67, tick=False)
+def test_get_token_permissions() -> None:
+    """Test getting the permissions of tokens with the cache."""
+    VERIFIED_TOKENS.clear()
+    token = create_token(Permission(4), secret=b"xyzzy", duration=2).token
+
+    assert get_token_permissions(token, b"xyzzy") == Permission(4)
+    assert len(VERIFIED_TOKENS) == 1
+    assert get_token_permissions(token, b"xyzzy") == Permission(4)
+    assert len(VERIFIED_TOKENS) == 1
+
+    assert get_token_permissions(token, b"hunter2") is None
+    assert get_token_permissions(token[:-1], b"xyzzy") is None
+    assert len(VERIFIED_TOKENS) == 1
+
+    with time_machine.travel(69, tick=False):
+        assert get_token_permissions(token, b"xyzzy") == Permission(4)
+
+    with time_machine.travel(70, tick=False):
+        assert get_token_permissions(token, b"xyzzy") is None  # expired
+        assert not VERIFIED_TOKENS
+
+
 def test_int_to_bytes() -> None:
     """Test the int to bytes conversion."""
     assert int_to_bytes(0, 2) == b"\0" * 2
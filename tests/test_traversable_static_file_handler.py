@@ -17,7 +17,15 @@ import gzip
 from compression import zstd
 
 from an_website import DIR as ROOT_DIR
+from an_website.utils import static_file_from_traversable
 from an_website.utils.fix_static_path_impl import recurse_directory
+from an_website.utils.static_file_from_traversable import (
+    MAX_CACHED_CONTENT_SIZE,
+    STATIC_ASSETS,
+    get_static_asset,
+    load_static_asset,
+    parse_accept_encoding,
+)
 
 from . import (  # noqa: F401  # pylint: disable=unused-import
     FetchCallable,
@@ -30,6 +38,62 @@ STATIC_DIR = ROOT_DIR / "static"
 CACHE_CONTROL = f"public,immutable,max-age={86400 * 365 * 10}"
 
 
+def test_parse_accept_encoding() -> None:
+    """Test parsing the Accept-Encoding header."""
+    assert parse_accept_encoding("") == ()
+    assert parse_accept_encoding("identity") == ()
+    assert parse_accept_encoding("gzip") == ("gz",)
+    assert parse_accept_encoding("gzip, zstd") == ("zst", "gz")
+    assert parse_accept_encoding("br;q=1.0, gzip;q=0.8, zstd;q=0.5") == (
+        "zst",
+        "gz",
+    )
+
+
+def test_load_static_asset() -> None:
+    """Test loading static assets."""
+    assert load_static_asset(STATIC_DIR, "does-not-exist.txt") is None
+    assert load_static_asset(STATIC_DIR, "img") is None
+
+    asset = load_static_asset(STATIC_DIR, "robots.txt")
+    assert asset
+    assert asset.content_type == "text/plain; charset=UTF-8"
+    file = asset.files[None]
+    assert file.content == (STATIC_DIR / "robots.txt").read_bytes()
+    assert file.size == len(file.content)
+
+    for file in asset.files.values():
+        assert file.size == len(file.file.read_bytes())
+        assert (file.content is None) == (file.size > MAX_CACHED_CONTENT_SIZE)
+
+
+def test_get_static_asset() -> None:
+    """Test caching the existing static assets that were used recently."""
+    STATIC_ASSETS.clear()
+    assert get_static_asset(STATIC_DIR, "does-not-exist.txt") is None
+    assert get_static_asset(STATIC_DIR, "ROBOTS.TXT") is None
+    assert not STATIC_ASSETS
+
+    asset = get_static_asset(STATIC_DIR, "robots.txt")
+    assert asset
+    assert STATIC_ASSETS == {(STATIC_DIR, "robots.txt"): asset}
+    assert get_static_asset(STATIC_DIR, "robots.txt") is asset
+
+    max_count = static_file_from_traversable.STATIC_ASSETS_MAX_COUNT
+    static_file_from_traversable.STATIC_ASSETS_MAX_COUNT = 2
+    try:
+        get_static_asset(STATIC_DIR, "humans.txt")
+        get_static_asset(STATIC_DIR, "robots.txt")  # robots.txt is used last
+        get_static_asset(STATIC_DIR, "llms.txt")  # humans.txt gets removed
+        assert list(STATIC_ASSETS) == [
+            (STATIC_DIR, "robots.txt"),
+            (STATIC_DIR, "llms.txt"),
+        ]
+    finally:
+        static_file_from_traversable.STATIC_ASSETS_MAX_COUNT = max_count
+        STATIC_ASSETS.clear()
+
+
 async def test_well_known(
     fetch: FetchCallable,  # noqa: F811
 ) -> None:
@@ -60,6 +60,22 @@ def test_get_availability_dict() -> None:
     }
 
 
+def test_availability_snapshot() -> None:
+    """Test serializing and parsing availability snapshots."""
+    snapshot = uptime.AvailabilitySnapshot(90, 10, 1000.5)
+    assert uptime.parse_availability_snapshot(snapshot.serialize()) == snapshot
+    assert uptime.parse_availability_snapshot(None) is None
+    assert uptime.parse_availability_snapshot("") is None
+    assert uptime.parse_availability_snapshot("1,2") is None
+    assert uptime.parse_availability_snapshot("a,b,c") is None
+
+    assert snapshot.is_fresh(1000.5)
+    assert snapshot.is_fresh(1000 + uptime.AVAILABILITY_REFRESH_INTERVAL)
+    assert not snapshot.is_fresh(1001 + uptime.AVAILABILITY_REFRESH_INTERVAL)
+    assert not snapshot.is_fresh(999)
+
+
 if __name__ == "__main__":
     test_calculate_uptime()
     test_get_availability_dict()
+    test_availability_snapshot()
@@ -13,11 +13,22 @@
 
 """The tests for the utils module."""
 
+import os
+from collections.abc import Callable
+from importlib.resources.abc import Traversable
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from urllib.parse import urlsplit
 
 import pytest
 
-from an_website.utils import utils
+from an_website import TEMPLATES_DIR
+from an_website.utils import fix_static_path_impl, search, utils
+from an_website.utils.template_loader import (
+    LazyNamespace,
+    TemplateLoader,
+    get_template_names,
+)
 
 
 def test_adding_stuff_to_url() -> None:
@@ -84,6 +95,33 @@ def test_country_code_to_flag() -> None:
     assert utils.country_code_to_flag("AQ") == "🇦🇶"
 
 
+def test_inverted_index() -> None:
+    """Test that the inverted index scores like the data provider."""
+    documents = {
+        1: ("Das Känguru", "Marc-Uwe Kling"),
+        2: ("Die Känguru-Chroniken",),
+        3: ("Schnapspralinen", "Der Bundeskanzler ist nicht witzig", "x"),
+        4: ("Kein Treffer",),
+    }
+    index: search.InvertedIndex[int] = search.InvertedIndex()
+    for key, fields in documents.items():
+        index.add(key, fields)
+    index.add(4, ("Ein Känguru",))
+    index.discard(2)
+    del documents[2]
+    documents[4] = ("Ein Känguru",)
+    provider = search.DataProvider(
+        documents.items, lambda item: item[1], lambda item: item[0]
+    )
+    for query in ("känguru", "kanzler nicht", "marc-uwe kling", "a", "xyz"):
+        query_object = search.Query(query)
+        assert sorted(index.search(query_object)) == sorted(
+            provider.search(query_object)
+        )
+    assert 2 not in index
+    assert len(index) == 3
+
+
 def test_n_from_set() -> None:
     """Test the n_from_set function."""
     set_ = {1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12}
@@ -141,6 +179,103 @@ def test_get_close_matches() -> None:
     assert utils.get_close_matches("a𓆗", "a") == ("a",)
 
 
+def test_ratelimit_lease() -> None:
+    """Test taking tokens from a ratelimit lease."""
+    lease = utils.RatelimitLease(
+        tokens=2, limit=10, remaining=7, reset_after=5, synced=100
+    )
+    assert lease.get_tokens_to_lease() == 1
+    assert lease.take(1, 101, 60) == (0, 10, 8, -1, 4)
+    assert lease.take(0, 101, 60) == (0, 10, 8, -1, 4)
+    assert lease.take(1, 102, 60) == (0, 10, 7, -1, 3)
+    assert lease.take(1, 102, 60) is None
+    assert lease.take(0, 161, 60) is None
+
+    lease = utils.RatelimitLease(
+        tokens=0, limit=10, remaining=0, reset_after=20, synced=0
+    )
+    lease.blocked_until = 2
+    assert lease.get_tokens_to_lease() == 0
+    assert lease.take(1, 0.5, 60) == (1, 10, 0, 2, 20)
+    assert lease.take(0, 0.5, 60) == (0, 10, 0, -1, 20)
+    assert lease.take(1, 2, 60) is None
+
+
+def test_hash_files() -> None:
+    """Test hashing files with a manifest."""
+    hashed: list[str] = []
+
+    def hash_file(path: Traversable) -> str:
+        hashed.append(path.name)
+        return fix_static_path_impl.hash_file(path)
+
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir, "root")
+        root.mkdir()
+        (root / "a").write_bytes(b"a")
+        (root / "b").write_bytes(b"b" * (3 * 1024**2))
+        manifest = Path(temp_dir, "manifest.json")
+
+        hashes = fix_static_path_impl.hash_files(
+            root, ("a", "b"), hash_file, manifest
+        )
+        assert tuple(hashes) == ("a", "b")
+        assert hashes["a"] != hashes["b"]
+        assert sorted(hashed) == ["a", "b"]
+        assert manifest.is_file()
+
+        hashed.clear()
+        assert hashes == fix_static_path_impl.hash_files(
+            root, ("a", "b"), hash_file, manifest
+        )
+        assert not hashed
+
+        (root / "a").write_bytes(b"c")
+        os.utime(root / "a", ns=(0, 0))
+        new_hashes = fix_static_path_impl.hash_files(
+            root, ("a", "b"), hash_file, manifest
+        )
+        assert hashed == ["a"]
+        assert new_hashes["a"] != hashes["a"]
+        assert new_hashes["b"] == hashes["b"]
+
+
+def test_lazy_namespace() -> None:
+    """Test computing the values of a template namespace lazily."""
+    calls: list[str] = []
+
+    def factory(name: str) -> Callable[[], str]:
+        return lambda: calls.append(name) or name.upper()
+
+    namespace = LazyNamespace({"a": 1})
+    namespace.add_lazy(b=factory("b"), c=factory("c"), d=factory("d"))
+    namespace["d"] = 4
+    assert len(namespace) == 4
+    assert set(namespace) == {"a", "b", "c", "d"}
+    assert "b" in namespace
+    assert "e" not in namespace
+    assert not calls
+
+    assert namespace.resolve(("a", "b", "d", "e")) == {"a": 1, "b": "B", "d": 4}
+    assert namespace["b"] == "B"
+    assert calls == ["b"]
+
+    del namespace["c"]
+    assert "c" not in namespace
+    assert dict(namespace) == {"a": 1, "b": "B", "d": 4}
+    assert calls == ["b"]
+
+
+def test_get_template_names() -> None:
+    """Test getting the names used by templates."""
+    loader = TemplateLoader(TEMPLATES_DIR, whitespace="oneline")
+    names = get_template_names(loader.load("footer.html"))
+    assert {"emoji2html", "🦘", "🥚"} <= names
+    assert "canonical_url" not in names
+    names = get_template_names(loader.load("base.html"))
+    assert {"canonical_url", "nonce", "title"} <= names
+
+
 if __name__ == "__main__":
     test_adding_stuff_to_url()
     test_anonomyze_ip()
@@ -151,3 +286,8 @@ if __name__ == "__main__":
     test_replace_umlauts()
     test_time_to_str()
     test_get_close_matches()
+    test_inverted_index()
+    test_ratelimit_lease()
+    test_hash_files()
+    test_lazy_namespace()
+    test_get_template_names()